@@ -0,0 +1 @@
+"""Shared building blocks used by the Instrit chatbot versions and scripts."""
@@ -0,0 +1,318 @@
+"""Vector indexes for the local retrieval path.
+
+Interchangeable backends share the same build/add/search/save/load API:
+
+- ``BruteForceIndex``: exact cosine search over the whole matrix.
+- ``IVFIndex``: inverted-file index. Vectors are grouped around k-means
+  centroids and a query only scans the ``nprobe`` closest groups, trading a
+  little recall for much less work on large collections.
+- ``ScalarQuantizedIndex`` (``sq8``) and ``PQIndex`` (``pq``): compact codes
+  in memory, re-ranked with the full-precision vectors (see
+  :mod:`instrit.quantization`).
+
+Vectors are identified by their row number in insertion order, which matches
+the rows of a :class:`~instrit.vector_file.VectorFile`.
+
+Build an index for an existing vector file with::
+
+    python -m instrit.ann_index documents_embeddings --backend ivf
+"""
+import argparse
+import hashlib
+import json
+import os
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from instrit.quantization import PQIndex, QuantizedIndex, ScalarQuantizedIndex
+from instrit.vector_search import normalize_query, normalize_rows, top_k_indices
+
+VECTOR_INDEX = os.getenv("VECTOR_INDEX", "bruteforce")  # "bruteforce", "ivf", "sq8" or "pq"
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", 8))
+IVF_LISTS = int(os.getenv("IVF_LISTS", 0))  # 0 picks about 4 * sqrt(number of vectors)
+
+# Rows scored per block when assigning vectors to centroids, to bound temporary memory
+ASSIGN_BLOCK = 16384
+# Rows hashed per block when fingerprinting the indexed vectors
+FINGERPRINT_BLOCK = 65536
+
+
+def _write_meta(directory: str, meta: dict):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as file:
+        json.dump(meta, file)
+
+
+def _read_meta(directory: str) -> dict:
+    with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+class BruteForceIndex:
+    """Exact search: one matrix-vector product over every normalized vector."""
+
+    kind = "bruteforce"
+
+    def __init__(self, vectors: Optional[np.ndarray] = None):
+        # Already-normalized float32 rows (for example a VectorFile memmap) are used without a copy
+        self.vectors = vectors
+
+    def build(self, vectors: Sequence[Sequence[float]]) -> "BruteForceIndex":
+        self.vectors = normalize_rows(vectors)
+        return self
+
+    def add(self, vectors: Sequence[Sequence[float]]):
+        new_vectors = normalize_rows(vectors)
+        self.vectors = new_vectors if self.vectors is None else np.concatenate([self.vectors, new_vectors])
+
+    def search(self, query: Sequence[float], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (row indices, cosine scores) of the ``k`` best matches, best first."""
+        scores = self.vectors @ normalize_query(query)
+        indices = top_k_indices(scores, k)
+        return indices, scores[indices]
+
+    def __len__(self) -> int:
+        return 0 if self.vectors is None else len(self.vectors)
+
+    def save(self, directory: str):
+        _write_meta(directory, {"kind": self.kind, "count": len(self)})
+        np.save(os.path.join(directory, "vectors.npy"), self.vectors)
+
+    @classmethod
+    def load(cls, directory: str) -> "BruteForceIndex":
+        return cls(np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r"))
+
+
+def spherical_kmeans(vectors: np.ndarray, n_clusters: int, iterations: int = 15,
+                     sample_size: int = 65536, seed: int = 0) -> np.ndarray:
+    """Return ``n_clusters`` unit-length centroids trained on (a sample of) normalized vectors."""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > sample_size:
+        vectors = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+    vectors = np.asarray(vectors, dtype=np.float32)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_clusters)
+
+        # Empty clusters restart from random vectors
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+def assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Return the index of the closest centroid for every vector."""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_BLOCK):
+        block = np.asarray(vectors[start:start + ASSIGN_BLOCK], dtype=np.float32)
+        assignments[start:start + ASSIGN_BLOCK] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+class IVFIndex:
+    """Inverted-file index over normalized vectors.
+
+    Vectors are stored grouped by their closest centroid, so scanning a list
+    is a contiguous slice. ``add`` assigns new vectors to the existing
+    centroids; call ``build`` again to retrain them once the collection has
+    changed a lot.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, n_lists: int = IVF_LISTS, nprobe: int = IVF_NPROBE):
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.centroids: Optional[np.ndarray] = None
+        self.vectors: Optional[np.ndarray] = None  # Grouped by list
+        self.ids: Optional[np.ndarray] = None  # Row number of each stored vector
+        self.offsets: Optional[np.ndarray] = None  # List i spans offsets[i]:offsets[i + 1]
+
+    def build(self, vectors: Sequence[Sequence[float]]) -> "IVFIndex":
+        vectors = normalize_rows(vectors)
+        n_lists = self.n_lists or int(4 * np.sqrt(len(vectors)))
+        n_lists = max(1, min(n_lists, len(vectors)))
+        self.centroids = spherical_kmeans(vectors, n_lists)
+        self._store(vectors, np.arange(len(vectors), dtype=np.int64), assign(vectors, self.centroids))
+        return self
+
+    def add(self, vectors: Sequence[Sequence[float]]):
+        if self.centroids is None:
+            self.build(vectors)
+            return
+        new_vectors = normalize_rows(vectors)
+        new_ids = np.arange(len(self), len(self) + len(new_vectors), dtype=np.int64)
+        old_assignments = np.repeat(np.arange(len(self.centroids), dtype=np.int32), np.diff(self.offsets))
+        self._store(
+            np.concatenate([self.vectors, new_vectors]),
+            np.concatenate([self.ids, new_ids]),
+            np.concatenate([old_assignments, assign(new_vectors, self.centroids)]),
+        )
+
+    def _store(self, vectors: np.ndarray, ids: np.ndarray, assignments: np.ndarray):
+        order = np.argsort(assignments, kind="stable")
+        self.vectors = np.ascontiguousarray(vectors[order])
+        self.ids = ids[order]
+        counts = np.bincount(assignments, minlength=len(self.centroids))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    def search(self, query: Sequence[float], k: int, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (row indices, cosine scores) of the ``k`` best matches in the closest lists."""
+        query = normalize_query(query)
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        lists = top_k_indices(self.centroids @ query, nprobe)
+
+        slices = [slice(self.offsets[i], self.offsets[i + 1]) for i in lists]
+        candidates = np.concatenate([self.vectors[s] for s in slices])
+        candidate_ids = np.concatenate([self.ids[s] for s in slices])
+        scores = candidates @ query
+        best = top_k_indices(scores, k)
+        return candidate_ids[best], scores[best]
+
+    def __len__(self) -> int:
+        return 0 if self.ids is None else len(self.ids)
+
+    def save(self, directory: str):
+        _write_meta(directory, {"kind": self.kind, "count": len(self), "n_lists": len(self.centroids),
+                                "nprobe": self.nprobe})
+        np.save(os.path.join(directory, "centroids.npy"), self.centroids)
+        np.save(os.path.join(directory, "vectors.npy"), self.vectors)
+        np.save(os.path.join(directory, "ids.npy"), self.ids)
+        np.save(os.path.join(directory, "offsets.npy"), self.offsets)
+
+    @classmethod
+    def load(cls, directory: str, nprobe: Optional[int] = None) -> "IVFIndex":
+        meta = _read_meta(directory)
+        index = cls(meta["n_lists"], nprobe or meta["nprobe"])
+        index.centroids = np.load(os.path.join(directory, "centroids.npy"))
+        index.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        index.ids = np.load(os.path.join(directory, "ids.npy"))
+        index.offsets = np.load(os.path.join(directory, "offsets.npy"))
+        return index
+
+
+INDEX_TYPES = {
+    BruteForceIndex.kind: BruteForceIndex,
+    IVFIndex.kind: IVFIndex,
+    ScalarQuantizedIndex.kind: ScalarQuantizedIndex,
+    PQIndex.kind: PQIndex,
+}
+
+
+def create_index(kind: str = VECTOR_INDEX):
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown vector index: {kind}. Use one of {sorted(INDEX_TYPES)}.")
+    return INDEX_TYPES[kind]()
+
+
+def load_index(directory: str):
+    return INDEX_TYPES[_read_meta(directory)["kind"]].load(directory)
+
+
+def index_exists(directory: str) -> bool:
+    return os.path.exists(os.path.join(directory, "meta.json"))
+
+
+def rows_fingerprint(vectors: np.ndarray, count: Optional[int] = None) -> str:
+    """Hash of the first ``count`` rows of ``vectors`` (all rows by default)."""
+    count = len(vectors) if count is None else count
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(vectors.shape[1:]).encode("utf-8"))
+    for start in range(0, count, FINGERPRINT_BLOCK):
+        digest.update(np.ascontiguousarray(vectors[start:min(count, start + FINGERPRINT_BLOCK)], dtype=np.float32))
+    return digest.hexdigest()
+
+
+def _file_stamp(vectors: np.ndarray) -> Optional[list]:
+    """Size and modification time of the file behind a memory-mapped matrix, if any."""
+    path = getattr(vectors, "filename", None)
+    if not path or not os.path.exists(path):
+        return None
+    info = os.stat(path)
+    return [info.st_size, info.st_mtime_ns]
+
+
+def _stamp_index(directory: str, vectors: np.ndarray):
+    """Record which vectors a saved index was built from."""
+    meta = _read_meta(directory)
+    meta["fingerprint"] = rows_fingerprint(vectors)
+    meta["source"] = _file_stamp(vectors)
+    _write_meta(directory, meta)
+
+
+def _saved_rows_unchanged(meta: dict, vectors: np.ndarray) -> bool:
+    """True if the first ``meta["count"]`` rows of ``vectors`` are the ones the saved index holds."""
+    if "fingerprint" not in meta or meta["count"] > len(vectors):
+        return False
+    stamp = _file_stamp(vectors)
+    if stamp is not None and stamp == meta.get("source") and meta["count"] == len(vectors):
+        return True
+    return rows_fingerprint(vectors, meta["count"]) == meta["fingerprint"]
+
+
+def open_index(vectors: np.ndarray, kind: str = VECTOR_INDEX, directory: Optional[str] = None):
+    """Return an index over ``vectors`` (normalized rows), reusing the one saved in ``directory``.
+
+    The brute-force index searches ``vectors`` directly. Other backends are
+    loaded from ``directory`` when present, extended with rows appended since
+    they were saved, and rebuilt if the backend changed or any saved row was
+    removed or modified (the index meta keeps a fingerprint of its rows).
+    Quantized backends re-rank their candidates against ``vectors``.
+    """
+    if kind == BruteForceIndex.kind:
+        return BruteForceIndex(vectors)
+
+    index = _open_saved_index(vectors, kind, directory)
+    if isinstance(index, QuantizedIndex):
+        index.rerank_vectors = vectors
+    return index
+
+
+def _open_saved_index(vectors: np.ndarray, kind: str, directory: Optional[str]):
+    if directory and index_exists(directory):
+        meta = _read_meta(directory)
+        if meta["kind"] == kind and _saved_rows_unchanged(meta, vectors):
+            index = load_index(directory)
+            if meta["count"] == len(vectors):
+                if meta.get("source") != _file_stamp(vectors):
+                    _stamp_index(directory, vectors)
+                return index
+            print(f"[LOG] Adding {len(vectors) - meta['count']} new vectors to the {kind} index...")
+            index.add(vectors[meta["count"]:])
+            index.save(directory)
+            _stamp_index(directory, vectors)
+            return index
+        if meta["kind"] == kind:
+            print(f"[LOG] The saved {kind} index does not match the current vectors.")
+
+    print(f"[LOG] Building {kind} index over {len(vectors)} vectors...")
+    index = create_index(kind).build(vectors)
+    if directory:
+        index.save(directory)
+        _stamp_index(directory, vectors)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the vector index of a vector file directory.")
+    parser.add_argument("vector_file", help="Directory written by instrit.vector_file.")
+    parser.add_argument("--backend", choices=sorted(INDEX_TYPES), default=IVFIndex.kind)
+    args = parser.parse_args()
+
+    from instrit.vector_file import VectorFile
+
+    vector_file = VectorFile(args.vector_file)
+    directory = os.path.join(args.vector_file, f"{args.backend}_index")
+    index = open_index(vector_file.vectors, args.backend, directory)
+    print(f"[LOG] {args.backend} index with {len(index)} vectors saved to '{directory}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Assemble chat completion messages within a fixed token budget.
+
+Only the raw user and assistant turns are kept between requests. Retrieved
+documents and response instructions are added to the current turn only, and
+older turns that no longer fit are folded into a short local summary instead
+of being re-sent in full.
+"""
+import json
+import math
+import os
+import re
+from typing import Dict, List, Optional
+
+# Tokens available for the prompt (the response budget comes on top of it)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))
+
+# Share of the history budget reserved for the summary of dropped turns
+SUMMARY_SHARE = 0.25
+
+# Longest line (in tokens) a single dropped message contributes to the summary
+SUMMARY_LINE_TOKENS = 40
+
+# Approximate per-message overhead of the chat format (role and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_FIRST_SENTENCE = re.compile(r"^(.+?[.!?])(\s|$)", re.DOTALL)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English text)."""
+    return math.ceil(len(text) / 4)
+
+
+def message_tokens(message: Dict[str, str]) -> int:
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut the text so it fits in ``max_tokens``, marking the cut."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    return text[:max(0, max_tokens * 4 - 3)].rstrip() + "..."
+
+
+def first_sentence(text: str) -> str:
+    text = " ".join(text.split())
+    match = _FIRST_SENTENCE.match(text)
+    return match.group(1) if match else text
+
+
+class ContextBuilder:
+    """Conversation memory that builds each request under a token budget.
+
+    The system prompt and the current turn are always sent. Retrieved
+    documents are trimmed (last ones first) if the current turn alone would
+    exceed the budget, and the remaining budget is filled with the most
+    recent turns. Turns that do not fit are summarized by their first
+    sentences, so the model still knows what was discussed earlier.
+    """
+
+    def __init__(self, system_prompt: Dict[str, str], token_budget: int = CONTEXT_TOKEN_BUDGET):
+        self.system_prompt = system_prompt
+        self.token_budget = token_budget
+        self.turns: List[Dict[str, str]] = []
+        self.last_messages: List[Dict[str, str]] = [system_prompt]
+        self.last_stats: Dict[str, int] = {}
+
+    def add_turn(self, query: str, response: str):
+        """Remember a finished exchange (without instructions or retrieved context)."""
+        self.turns.append({"role": "user", "content": query})
+        self.turns.append({"role": "assistant", "content": response})
+
+    def build(self, query: str, instructions: str, documents: Optional[List[str]] = None) -> List[Dict[str, str]]:
+        """Return the messages for the current turn and record their size in ``last_stats``."""
+        system_tokens = message_tokens(self.system_prompt)
+        available = self.token_budget - system_tokens
+
+        current_turn = self._current_turn(query, instructions, documents or [], available)
+        current_tokens = message_tokens(current_turn)
+        available -= current_tokens
+
+        # Part of the budget goes to the summary only when the whole history does not fit
+        summary_budget = 0
+        if sum(message_tokens(message) for message in self.turns) > available:
+            summary_budget = int(available * SUMMARY_SHARE)
+
+        # Newest turns first until the history budget runs out
+        history: List[Dict[str, str]] = []
+        history_tokens = 0
+        for start in range(len(self.turns) - 2, -1, -2):
+            pair = self.turns[start:start + 2]
+            pair_tokens = sum(message_tokens(message) for message in pair)
+            if history_tokens + pair_tokens > available - summary_budget:
+                break
+            history = pair + history
+            history_tokens += pair_tokens
+
+        dropped_turns = self.turns[:len(self.turns) - len(history)]
+        summary = self._summary(dropped_turns, available - history_tokens)
+        summary_tokens = message_tokens(summary) if summary else 0
+
+        messages = [self.system_prompt]
+        if summary:
+            messages.append(summary)
+        messages += history + [current_turn]
+
+        self.last_messages = messages
+        self.last_stats = {
+            "messages": len(messages),
+            "payload_bytes": len(json.dumps(messages, ensure_ascii=False).encode("utf-8")),
+            "tokens": system_tokens + summary_tokens + history_tokens + current_tokens,
+            "system_tokens": system_tokens,
+            "summary_tokens": summary_tokens,
+            "history_tokens": history_tokens,
+            "current_tokens": current_tokens,
+            "turns_sent": len(history) // 2,
+            "turns_summarized": len(dropped_turns) // 2,
+        }
+        return messages
+
+    def log_stats(self):
+        stats = self.last_stats
+        print(f"[LOG] Prompt: {stats['messages']} messages, {stats['payload_bytes']} bytes, "
+              f"~{stats['tokens']}/{self.token_budget} tokens "
+              f"(system {stats['system_tokens']}, summary {stats['summary_tokens']}, "
+              f"history {stats['history_tokens']}, current turn {stats['current_tokens']}); "
+              f"{stats['turns_sent']} turns sent, {stats['turns_summarized']} summarized.")
+
+    @staticmethod
+    def _format_turn(query: str, instructions: str, documents: List[str]) -> str:
+        sections = [instructions.strip()]
+        if documents:
+            sections.append("### Context\n" + "\n\n".join(documents))
+        sections.append(f"### Current Question\n{query}")
+        return "\n\n".join(sections)
+
+    def _current_turn(self, query: str, instructions: str, documents: List[str], available: int) -> Dict[str, str]:
+        documents = list(documents)
+        content = self._format_turn(query, instructions, documents)
+        while documents and estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS > available:
+            overflow = estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS - available
+            last_tokens = estimate_tokens(documents[-1])
+            if last_tokens > overflow:
+                # Trimming the last document is enough
+                documents[-1] = truncate_to_tokens(documents[-1], last_tokens - overflow)
+            else:
+                documents.pop()
+            content = self._format_turn(query, instructions, documents)
+        return {"role": "user", "content": content}
+
+    @staticmethod
+    def _summary(dropped_turns: List[Dict[str, str]], max_tokens: int) -> Optional[Dict[str, str]]:
+        if not dropped_turns:
+            return None
+        lines = []
+        for message in dropped_turns:
+            speaker = "User" if message["role"] == "user" else "Assistant"
+            lines.append(f"- {speaker}: {truncate_to_tokens(first_sentence(message['content']), SUMMARY_LINE_TOKENS)}")
+        header = "Summary of the earlier conversation:\n"
+        # Keep the most recent lines when the summary itself is too long
+        while lines and estimate_tokens(header + "\n".join(lines)) + MESSAGE_OVERHEAD_TOKENS > max_tokens:
+            lines.pop(0)
+        if not lines:
+            return None
+        return {"role": "system", "content": header + "\n".join(lines)}
@@ -0,0 +1,125 @@
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import List, Optional
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 1024))
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", 3600))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH")  # Optional SQLite file for the disk tier
+
+
+class EmbeddingCache:
+    """LRU cache of query embeddings with time-based expiry.
+
+    Entries are keyed by (model, normalized text) and evicted when the cache
+    is full (least recently used first) or older than ``ttl`` seconds. An
+    optional SQLite file acts as a second tier that survives restarts and can
+    be shared by several processes. Its reads and writes block, so async
+    code should call them from a worker thread (see ``AsyncEmbeddingClient``).
+    """
+
+    def __init__(self, max_size: int = EMBEDDING_CACHE_SIZE, ttl: float = EMBEDDING_CACHE_TTL,
+                 disk_path: Optional[str] = EMBEDDING_CACHE_PATH):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.disk = None
+        if disk_path:
+            self.disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self.disk.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self.disk.commit()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Collapse whitespace and case so trivially different queries share an entry."""
+        return " ".join(text.split()).casefold()
+
+    def key(self, model: str, text: str) -> str:
+        return f"{model}\x00{self.normalize(text)}"
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """Return the cached embedding, or None on a miss."""
+        key = self.key(model, text)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                created_at, vector = entry
+                if now - created_at < self.ttl:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self.entries[key]
+                self.evictions += 1
+
+            if self.disk is not None:
+                row = self.disk.execute(
+                    "SELECT vector, created_at FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row and now - row[1] < self.ttl:
+                    vector = array("f", row[0]).tolist()
+                    self._store(key, vector, row[1])
+                    self.disk_hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Return the cached embedding of each text, None for misses."""
+        return [self.get(model, text) for text in texts]
+
+    def put(self, model: str, text: str, vector: List[float]):
+        """Cache the embedding of a text."""
+        self.put_many(model, [text], [vector])
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        """Cache the embeddings of many texts, with a single commit to the disk tier."""
+        keys = [self.key(model, text) for text in texts]
+        now = time.time()
+        with self.lock:
+            for key, vector in zip(keys, vectors):
+                self._store(key, vector, now)
+            if self.disk is not None and keys:
+                self.disk.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                    [(key, array("f", vector).tobytes(), now) for key, vector in zip(keys, vectors)],
+                )
+                self.disk.execute("DELETE FROM embeddings WHERE created_at < ?", (now - self.ttl,))
+                self.disk.commit()
+
+    def _store(self, key: str, vector: List[float], created_at: float):
+        self.entries[key] = (created_at, vector)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        """Return hit, miss and eviction counters."""
+        with self.lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            }
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
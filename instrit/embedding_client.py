@@ -0,0 +1,253 @@
+import asyncio
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrit.embedding_cache import EmbeddingCache
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
+# Maximum number of embedding requests in flight per async client
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", 8))
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class EmbeddingError(Exception):
+    """Raised when the embedding API keeps failing after all retries."""
+
+
+def _backoff_delay(backoff: float, attempt: int) -> float:
+    """Exponential backoff with jitter."""
+    return backoff * (2 ** attempt) * (1 + random.random())
+
+
+def _batch_embeddings(data: dict, batch: List[str]) -> List[List[float]]:
+    embeddings = data.get("embeddings")
+    if not embeddings or len(embeddings) != len(batch):
+        raise EmbeddingError(f"Unexpected embedding response: {str(data)[:200]}")
+    return embeddings
+
+
+def _single_embedding(data: dict) -> List[float]:
+    embedding = data.get("embedding")
+    if not embedding:
+        raise EmbeddingError(f"Unexpected embedding response: {str(data)[:200]}")
+    return embedding
+
+
+class EmbeddingClient:
+    """Batched, concurrent client for the Ollama embedding API.
+
+    Texts are split into batches sent to ``/api/embed`` (which accepts a list
+    of inputs) by a bounded pool of worker threads sharing one keep-alive
+    session. Failed requests are retried with exponential backoff. Servers
+    without ``/api/embed`` fall back to one ``/api/embeddings`` call per text.
+    Single queries, and batches requested with ``use_cache=True``, go through
+    the optional :class:`EmbeddingCache` first.
+    """
+
+    def __init__(self, base_url: str = OLLAMA_URL, model: str = EMBEDDING_MODEL,
+                 batch_size: int = 32, max_workers: int = 4, max_retries: int = 3,
+                 backoff: float = 0.5, timeout: float = 60, cache: Optional[EmbeddingCache] = None):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = cache
+        self.batch_endpoint = True
+        self.last_throughput = 0.0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def embed(self, text: str) -> List[float]:
+        """Return the embedding of a single text."""
+        return self.embed_many([text], report=False, use_cache=True)[0]
+
+    def embed_many(self, texts: List[str], report: bool = True, use_cache: bool = False) -> List[List[float]]:
+        """Return the embeddings of many texts, in the same order as the input."""
+        texts = list(texts)
+        if not use_cache or self.cache is None:
+            return self._embed_texts(texts, report)
+
+        vectors = self.cache.get_many(self.model, texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        new_vectors = self._embed_texts([texts[i] for i in missing], report)
+        for i, vector in zip(missing, new_vectors):
+            vectors[i] = vector
+        self.cache.put_many(self.model, [texts[i] for i in missing], new_vectors)
+        return vectors
+
+    def _embed_texts(self, texts: List[str], report: bool) -> List[List[float]]:
+        if not texts:
+            return []
+
+        start_time = time.perf_counter()
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1:
+            results = [self._embed_batch(batches[0])]
+        else:
+            results = list(self.executor.map(self._embed_batch, batches))
+        elapsed = time.perf_counter() - start_time
+
+        self.last_throughput = len(texts) / elapsed if elapsed > 0 else float("inf")
+        if report:
+            print(f"[LOG] Embedded {len(texts)} texts in {elapsed:.2f}s "
+                  f"({self.last_throughput:.1f} texts/s).")
+        return [vector for batch in results for vector in batch]
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        if self.batch_endpoint:
+            response = self._post("/api/embed", {"model": self.model, "input": batch})
+            if response.status_code != 404:
+                return _batch_embeddings(response.json(), batch)
+            print("[LOG] /api/embed not available. Falling back to /api/embeddings.")
+            self.batch_endpoint = False
+
+        embeddings = []
+        for text in batch:
+            response = self._post("/api/embeddings", {"model": self.model, "prompt": text})
+            embeddings.append(_single_embedding(response.json()))
+        return embeddings
+
+    def _post(self, path: str, payload: dict) -> requests.Response:
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(url, json=payload, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = str(e)
+            else:
+                if response.status_code == 200 or response.status_code == 404:
+                    return response
+                error = f"{response.status_code} - {response.text[:200]}"
+                if response.status_code not in RETRY_STATUS_CODES:
+                    break
+
+            if attempt < self.max_retries:
+                delay = _backoff_delay(self.backoff, attempt)
+                print(f"[LOG] Embedding request failed ({error}). Retrying in {delay:.1f}s...")
+                time.sleep(delay)
+
+        raise EmbeddingError(f"Failed to get embedding: {error}")
+
+    def close(self):
+        """Release the worker threads and pooled connections."""
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+
+class AsyncEmbeddingClient:
+    """Non-blocking counterpart of :class:`EmbeddingClient` for asyncio code.
+
+    Uses one ``httpx.AsyncClient`` connection pool, meant to be opened in the
+    application lifespan and shared by every request handler. Batches run
+    concurrently, bounded by ``max_concurrency``. Lookups in a cache with a
+    SQLite tier run in a worker thread.
+    """
+
+    def __init__(self, base_url: str = OLLAMA_URL, model: str = EMBEDDING_MODEL,
+                 batch_size: int = 32, max_concurrency: int = EMBEDDING_CONCURRENCY, max_retries: int = 3,
+                 backoff: float = 0.5, timeout: float = 60, cache: Optional[EmbeddingCache] = None):
+        self.model = model
+        self.cache = cache
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.batch_endpoint = True
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+        )
+
+    async def embed(self, text: str) -> List[float]:
+        """Return the embedding of a single text."""
+        return (await self.embed_many([text], report=False, use_cache=True))[0]
+
+    async def embed_many(self, texts: List[str], report: bool = True, use_cache: bool = False) -> List[List[float]]:
+        """Return the embeddings of many texts, in the same order as the input."""
+        texts = list(texts)
+        if not use_cache or self.cache is None:
+            return await self._embed_texts(texts, report)
+
+        vectors = await self._cache_call(self.cache.get_many, self.model, texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        new_vectors = await self._embed_texts([texts[i] for i in missing], report)
+        for i, vector in zip(missing, new_vectors):
+            vectors[i] = vector
+        await self._cache_call(self.cache.put_many, self.model, [texts[i] for i in missing], new_vectors)
+        return vectors
+
+    async def _cache_call(self, method, *args):
+        # The memory tier answers inline; SQLite I/O runs in a worker thread to keep the event loop free
+        if self.cache.disk is None:
+            return method(*args)
+        return await asyncio.to_thread(method, *args)
+
+    async def _embed_texts(self, texts: List[str], report: bool) -> List[List[float]]:
+        if not texts:
+            return []
+
+        start_time = time.perf_counter()
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(self._embed_batch(batch) for batch in batches))
+        elapsed = time.perf_counter() - start_time
+
+        if report:
+            throughput = len(texts) / elapsed if elapsed > 0 else float("inf")
+            print(f"[LOG] Embedded {len(texts)} texts in {elapsed:.2f}s ({throughput:.1f} texts/s).")
+        return [vector for batch in results for vector in batch]
+
+    async def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        if self.batch_endpoint:
+            response = await self._post("/api/embed", {"model": self.model, "input": batch})
+            if response.status_code != 404:
+                return _batch_embeddings(response.json(), batch)
+            print("[LOG] /api/embed not available. Falling back to /api/embeddings.")
+            self.batch_endpoint = False
+
+        responses = await asyncio.gather(
+            *(self._post("/api/embeddings", {"model": self.model, "prompt": text}) for text in batch)
+        )
+        return [_single_embedding(response.json()) for response in responses]
+
+    async def _post(self, path: str, payload: dict) -> httpx.Response:
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.semaphore:
+                    response = await self.client.post(path, json=payload)
+            except httpx.TransportError as e:
+                error = str(e) or type(e).__name__
+            else:
+                if response.status_code == 200 or response.status_code == 404:
+                    return response
+                error = f"{response.status_code} - {response.text[:200]}"
+                if response.status_code not in RETRY_STATUS_CODES:
+                    break
+
+            if attempt < self.max_retries:
+                delay = _backoff_delay(self.backoff, attempt)
+                print(f"[LOG] Embedding request failed ({error}). Retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+
+        raise EmbeddingError(f"Failed to get embedding: {error}")
+
+    async def aclose(self):
+        """Close the pooled connections."""
+        await self.client.aclose()
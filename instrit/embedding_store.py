@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+from typing import Iterable, List, Optional
+
+
+class EmbeddingStore:
+    """Persistent on-disk cache of document embeddings.
+
+    Entries are grouped by embedding model and keyed by document id. Each entry
+    keeps the hash of the content it was generated from, so a vector is only
+    reused while both the model and the document content are unchanged.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, path: str, model: str):
+        self.path = path
+        self.model = model
+        self.entries = {}
+        self.dirty = False
+        self.load()
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        """Return a stable hash of the document content."""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def load(self):
+        """Load the store from disk, starting empty if it is missing or unreadable."""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"[ERROR] Failed to read embedding store '{self.path}': {e}")
+            return
+        if data.get("version") != self.FORMAT_VERSION:
+            print(f"[LOG] Embedding store '{self.path}' has an old format. Rebuilding it.")
+            return
+        self.entries = data.get("entries", {})
+
+    def get(self, doc_id: str, content: str) -> Optional[List[float]]:
+        """Return the stored vector if it matches the current model and content."""
+        entry = self.entries.get(self.model, {}).get(str(doc_id))
+        if entry and entry["hash"] == self.content_hash(content):
+            return entry["vector"]
+        return None
+
+    def put(self, doc_id: str, content: str, vector: List[float]):
+        """Store the vector generated for a document."""
+        self.entries.setdefault(self.model, {})[str(doc_id)] = {
+            "hash": self.content_hash(content),
+            "vector": vector,
+        }
+        self.dirty = True
+
+    def prune(self, keep_ids: Iterable[str]) -> int:
+        """Drop entries of the current model whose documents no longer exist."""
+        keep = {str(doc_id) for doc_id in keep_ids}
+        model_entries = self.entries.get(self.model, {})
+        stale = [doc_id for doc_id in model_entries if doc_id not in keep]
+        for doc_id in stale:
+            del model_entries[doc_id]
+        if stale:
+            self.dirty = True
+        return len(stale)
+
+    def save(self):
+        """Write the store to disk if it changed, replacing the old file atomically."""
+        if not self.dirty:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"version": self.FORMAT_VERSION, "entries": self.entries}, file)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
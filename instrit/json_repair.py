@@ -0,0 +1,146 @@
+"""Deterministic repair of near-miss JSON returned by an LLM.
+
+Models asked for JSON often return something close to it: the JSON wrapped
+in prose or a code fence, ``//`` comments copied from the prompt template,
+or trailing commas. Asking again costs a full request; :func:`loads_tolerant`
+fixes these cases locally instead:
+
+1. the first JSON value is cut out of the surrounding text;
+2. comments, trailing and doubled commas outside strings are removed, and
+   raw line breaks inside strings are escaped.
+
+Output cut short (an open string or bracket at the end) is not repaired:
+closing it would silently lose the missing members, so it raises
+:class:`TruncatedJSONError` and the caller asks again. Any other output
+still invalid after the repairs raises ``ValueError`` as well.
+"""
+import json
+from typing import Any, List, Tuple
+
+# How many opening brackets are tried as the start of the JSON value ("see [1]: [...]")
+MAX_START_CANDIDATES = 4
+
+
+def _is_record(value: Any) -> bool:
+    """True for an object or a list of objects, the shapes the callers ask the model for."""
+    return isinstance(value, dict) or (isinstance(value, list) and bool(value)
+                                       and all(isinstance(item, dict) for item in value))
+
+
+class TruncatedJSONError(ValueError):
+    """The JSON value ends before its closing brackets: the response was cut short."""
+
+
+def _starts(text: str) -> List[int]:
+    return [index for index, char in enumerate(text) if char in "{["][:MAX_START_CANDIDATES]
+
+
+def _clean(text: str, start: int) -> Tuple[str, List[str], bool]:
+    """Scan the JSON value starting at ``start``, dropping comments and trailing commas.
+
+    Returns the cleaned text, the brackets still open at its end and whether
+    it ends inside a string.
+    """
+    output: List[str] = []
+    stack: List[str] = []
+    in_string = escaped = False
+    index, length = start, len(text)
+
+    while index < length:
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            elif char in "\r\n":
+                output.append("\\n" if char == "\n" else "")
+                index += 1
+                continue
+            output.append(char)
+        elif char == '"':
+            in_string = True
+            output.append(char)
+        elif text.startswith("//", index):
+            newline = text.find("\n", index)
+            index = length if newline < 0 else newline
+            continue
+        elif text.startswith("/*", index):
+            close = text.find("*/", index + 2)
+            index = length if close < 0 else close + 2
+            continue
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+            output.append(char)
+        elif char in "}]":
+            # Drop a comma right before the closing bracket
+            while output and output[-1].isspace():
+                output.pop()
+            if output and output[-1] == ",":
+                output.pop()
+            if stack:
+                stack.pop()
+            output.append(char)
+            if not stack:
+                break
+        elif char == ",":
+            # Doubled commas and commas right after an opening bracket are dropped
+            previous = next((piece for piece in reversed(output) if not piece.isspace()), "")
+            if previous not in (",", "{", "["):
+                output.append(char)
+        else:
+            output.append(char)
+        index += 1
+
+    return "".join(output), stack, in_string
+
+
+def repair_json(text: str, start: int) -> str:
+    """Repaired JSON value at ``start``.
+
+    Raises:
+        TruncatedJSONError: If the value is still open at the end of ``text``.
+    """
+    cleaned, stack, in_string = _clean(text, start)
+    if stack or in_string:
+        raise TruncatedJSONError("Truncated JSON: the response ends before the value is closed.")
+    return cleaned
+
+
+def loads_tolerant(text: str) -> Tuple[Any, bool]:
+    """Parse ``text`` as JSON, repairing it if needed.
+
+    Returns ``(value, repaired)``; ``repaired`` is False when the text was valid JSON as is.
+    When several values in the text parse, the first object or list of objects
+    wins over bare values such as the ``[1]`` of "see [1]: [...]".
+
+    Raises:
+        TruncatedJSONError: If the response was cut short.
+        ValueError: If no repair produces valid JSON.
+    """
+    try:
+        return json.loads(text), False
+    except json.JSONDecodeError:
+        pass
+
+    starts = _starts(text)
+    if not starts:
+        raise ValueError("No JSON object or array in the response.")
+    error = fallback = None
+    for start in starts:
+        # Later starts lie inside a truncated value, so truncation ends the search
+        candidate = repair_json(text, start)
+        try:
+            value = json.loads(candidate)
+        except json.JSONDecodeError as e:
+            error = e
+            continue
+        if _is_record(value):
+            return value, True
+        if fallback is None:
+            fallback = (value,)
+    if fallback is not None:
+        return fallback[0], True
+    raise ValueError(f"Unrecoverable JSON: {error}")
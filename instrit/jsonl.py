@@ -0,0 +1,95 @@
+"""Streaming record files: JSON Lines, or the legacy indented JSON array.
+
+The PDF tools used to collect every chunk or summary of a run in a list
+and ``json.dump`` it at the end. :class:`RecordWriter` writes each record
+as soon as it is produced, so memory no longer grows with the corpus:
+
+- ``jsonl``: one compact record per line, encoded with orjson;
+- ``json``: the same indented array ``json.dump(records, indent=4)``
+  produced before, written element by element.
+
+Files are written to a temporary path and moved into place on success, so
+readers never see half a file. :func:`iter_records` reads either format;
+JSON Lines are parsed one line at a time.
+"""
+import json
+import os
+from typing import Iterator
+
+import orjson
+
+OUTPUT_FORMATS = ("json", "jsonl")
+
+
+def dumps_line(record) -> bytes:
+    """One record as a JSON line, newline included."""
+    return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+
+
+def loads(line):
+    return orjson.loads(line)
+
+
+def record_path(base: str, output_format: str) -> str:
+    """Path of a record file without extension in the given format."""
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}. Use 'json' or 'jsonl'.")
+    return f"{base}.{output_format}"
+
+
+class RecordWriter:
+    """Write records one at a time to a ``.json`` or ``.jsonl`` file, replacing it atomically on close."""
+
+    def __init__(self, path: str, output_format: str = None):
+        self.path = path
+        self.format = output_format or os.path.splitext(path)[1].lstrip(".")
+        if self.format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format: {self.format}. Use 'json' or 'jsonl'.")
+        self.temporary_path = f"{path}.tmp"
+        self.file = open(self.temporary_path, "wb")
+        self.count = 0
+
+    def write(self, record):
+        if self.format == "jsonl":
+            self.file.write(dumps_line(record))
+        else:
+            # Same bytes as json.dump(records, indent=4): each element indented one level
+            element = json.dumps(record, ensure_ascii=False, indent=4).replace("\n", "\n    ")
+            self.file.write(f"{',' if self.count else '['}\n    {element}".encode("utf-8"))
+        self.count += 1
+
+    def write_all(self, records) -> int:
+        for record in records:
+            self.write(record)
+        return self.count
+
+    def close(self):
+        if self.format == "json":
+            self.file.write(b"\n]" if self.count else b"[]")
+        self.file.close()
+        os.replace(self.temporary_path, self.path)
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.temporary_path)
+
+    def __enter__(self) -> "RecordWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def iter_records(path: str) -> Iterator[dict]:
+    """Iterate over the records of a ``.jsonl`` file lazily, or of a legacy JSON array."""
+    if path.endswith(".jsonl"):
+        with open(path, "rb") as file:
+            for line in file:
+                if line.strip():
+                    yield orjson.loads(line)
+    else:
+        with open(path, "rb") as file:
+            yield from orjson.loads(file.read())
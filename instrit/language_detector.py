@@ -0,0 +1,95 @@
+"""Local language detection by character n-gram scoring.
+
+Used in front of the translator so text that is already in the target
+language (English questions, part numbers, English manuals) skips the remote
+call. Profiles are built once from the sample texts in ``instrit/data/`` and
+a detection is a dictionary lookup per n-gram, well under a millisecond for
+a chat message.
+"""
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+DEFAULT_SAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "language_samples.json")
+
+# Probability above which the detected language is trusted
+LANGUAGE_CONFIDENCE = float(os.getenv("LANGUAGE_CONFIDENCE", 0.95))
+
+# Texts with fewer letters than this carry no language (codes, part numbers, numbers)
+MIN_LETTERS = 3
+
+# Only the start of long texts is scored
+MAX_CHARS = 1000
+
+NGRAM_SIZES = (1, 2, 3)
+
+_NON_LETTERS = re.compile(r"[^\w]+|[\d_]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase and keep only words, separated by single spaces."""
+    return " ".join(_NON_LETTERS.sub(" ", text[:MAX_CHARS].lower()).split())
+
+
+def ngrams(text: str):
+    padded = f" {text} "
+    for size in NGRAM_SIZES:
+        for start in range(len(padded) - size + 1):
+            gram = padded[start:start + size]
+            if gram.strip():
+                yield gram
+
+
+class LanguageDetector:
+    """Naive Bayes over character 1- to 3-grams, one profile per language."""
+
+    def __init__(self, samples: Dict[str, str], confidence: float = LANGUAGE_CONFIDENCE):
+        self.confidence = confidence
+        self.log_probabilities = {}
+        self.unseen = {}
+        vocabulary = set()
+        counts = {}
+        for language, text in samples.items():
+            counts[language] = Counter(ngrams(normalize(text)))
+            vocabulary.update(counts[language])
+        for language, counter in counts.items():
+            # Add-one smoothing so unseen n-grams do not zero the score
+            total = sum(counter.values()) + len(vocabulary) + 1
+            self.log_probabilities[language] = {gram: math.log((count + 1) / total) for gram, count in counter.items()}
+            self.unseen[language] = math.log(1 / total)
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_SAMPLES_PATH, **kwargs) -> "LanguageDetector":
+        with open(path, "r", encoding="utf-8") as file:
+            return cls(json.load(file), **kwargs)
+
+    def scores(self, text: str) -> Dict[str, float]:
+        """Return the probability of each language for the text (empty if it has too few letters)."""
+        normalized = normalize(text)
+        if sum(character.isalpha() for character in normalized) < MIN_LETTERS:
+            return {}
+        grams = Counter(ngrams(normalized))
+        log_scores = {
+            language: sum(count * table.get(gram, self.unseen[language]) for gram, count in grams.items())
+            for language, table in self.log_probabilities.items()
+        }
+        best = max(log_scores.values())
+        exponentials = {language: math.exp(score - best) for language, score in log_scores.items()}
+        total = sum(exponentials.values())
+        return {language: value / total for language, value in exponentials.items()}
+
+    def detect(self, text: str) -> Tuple[Optional[str], float]:
+        """Return (language, probability), or (None, 0.0) for text without enough letters."""
+        scores = self.scores(text)
+        if not scores:
+            return None, 0.0
+        language = max(scores, key=scores.get)
+        return language, scores[language]
+
+    def is_language(self, text: str, language: str) -> bool:
+        """True when the text confidently is in ``language`` or has no language at all."""
+        detected, probability = self.detect(text)
+        return detected is None or (detected == language and probability >= self.confidence)
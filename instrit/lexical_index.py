@@ -0,0 +1,178 @@
+"""BM25 inverted index for lexical retrieval, and rank fusion with vector search.
+
+Technicians search by exact tokens ("WEG", "15 HP", "ISO VG 68", part
+numbers) that embeddings tend to blur into generic paragraphs. The index
+covers the ``title``, ``tags`` and ``content`` of every document, is built
+once at load time and saved next to the vectors. Its BM25 weights are
+precomputed per posting, so a query only sums the postings of its terms.
+
+:func:`reciprocal_rank_fusion` merges the BM25 and vector rankings. Queries
+made only of identifier-like tokens (see :func:`is_exact_query`) can be
+answered from the documents containing all of them without computing a
+query embedding.
+"""
+import os
+import re
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from instrit.vector_search import top_k_indices
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Rank offset of reciprocal rank fusion; 60 is the value from the original paper
+RRF_K = 60
+LEXICAL_INDEX_FILE = "bm25_index.npz"
+
+# Words, numbers and codes such as "6204-2rs" or "1.5"
+TOKEN_PATTERN = re.compile(r"[0-9a-zà-ÿ]+(?:[.\-/][0-9a-zà-ÿ]+)*")
+# Tokens that identify something: with a digit (15, 6204-2rs) or an uppercase code (WEG, ISO, VG)
+IDENTIFIER_PATTERN = re.compile(r"^(?=.*\d)[\w.\-/]+$|^[A-Z]{2,}[\w.\-/]*$")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def document_text(payload: dict) -> str:
+    """Text indexed for a document: title, tags and content."""
+    return " ".join([payload.get("title") or "", " ".join(payload.get("tags") or []), payload.get("content") or ""])
+
+
+def is_exact_query(query: str) -> bool:
+    """True for quoted queries and queries made only of identifier-like tokens."""
+    stripped = query.strip()
+    if len(stripped) > 2 and stripped[0] == stripped[-1] == '"':
+        return True
+    words = stripped.split()
+    return bool(words) and all(IDENTIFIER_PATTERN.match(word) for word in words)
+
+
+class BM25Index:
+    """Inverted index with precomputed BM25 weights per (term, document) posting."""
+
+    def __init__(self, vocabulary: Dict[str, int], rows: np.ndarray, weights: np.ndarray, offsets: np.ndarray,
+                 count: int, revision: str = ""):
+        self.vocabulary = vocabulary
+        self.rows = rows  # Document rows of each posting, grouped by term
+        self.weights = weights  # BM25 weight of each posting
+        self.offsets = offsets  # Term t spans offsets[t]:offsets[t + 1]
+        self.count = count
+        self.revision = revision  # Dataset revision the index was built from, if known
+
+    @classmethod
+    def build(cls, texts: Iterable[str], k1: float = BM25_K1, b: float = BM25_B) -> "BM25Index":
+        postings: Dict[str, Dict[int, int]] = {}
+        lengths = []
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            for token in tokens:
+                counts = postings.setdefault(token, {})
+                counts[row] = counts.get(row, 0) + 1
+
+        count = len(lengths)
+        lengths = np.asarray(lengths, dtype=np.float32)
+        average_length = float(lengths.mean()) if count else 0.0
+        vocabulary = {term: index for index, term in enumerate(sorted(postings))}
+
+        rows, weights, offsets = [], [], [0]
+        for term in sorted(postings):
+            term_rows = np.fromiter(postings[term].keys(), dtype=np.int64)
+            frequencies = np.fromiter(postings[term].values(), dtype=np.float32)
+            idf = np.log(1 + (count - len(term_rows) + 0.5) / (len(term_rows) + 0.5))
+            norm = k1 * (1 - b + b * lengths[term_rows] / max(average_length, 1e-9))
+            rows.append(term_rows)
+            weights.append((idf * frequencies * (k1 + 1) / (frequencies + norm)).astype(np.float32))
+            offsets.append(offsets[-1] + len(term_rows))
+
+        empty_rows, empty_weights = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return cls(vocabulary, np.concatenate(rows) if rows else empty_rows,
+                   np.concatenate(weights) if weights else empty_weights, np.asarray(offsets, dtype=np.int64), count)
+
+    def _postings(self, query: str):
+        for term in dict.fromkeys(tokenize(query)):
+            index = self.vocabulary.get(term)
+            if index is None:
+                yield term, None, None
+            else:
+                span = slice(self.offsets[index], self.offsets[index + 1])
+                yield term, self.rows[span], self.weights[span]
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.count, dtype=np.float32)
+        for _, rows, weights in self._postings(query):
+            if rows is not None:
+                scores[rows] += weights
+        return scores
+
+    def search(self, query: str, k: int, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (rows, BM25 scores) of the ``k`` best documents with at least one query term.
+
+        ``rows`` (sorted) restricts the search to those documents.
+        """
+        scores = self.scores(query)
+        candidates = np.flatnonzero(scores) if rows is None else rows[scores[rows] > 0]
+        best = top_k_indices(scores[candidates], k)
+        return candidates[best], scores[candidates][best]
+
+    def search_all_terms(self, query: str, k: int, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Like :meth:`search`, but only documents containing every query term are returned."""
+        matching = rows
+        for _, term_rows, _ in self._postings(query.strip('"')):
+            if term_rows is None:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            matching = np.sort(term_rows) if matching is None else np.intersect1d(matching, term_rows)
+        if matching is None or not len(matching):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = self.scores(query.strip('"'))[matching]
+        best = top_k_indices(scores, k)
+        return matching[best], scores[best]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def save(self, path: str):
+        terms = np.asarray(sorted(self.vocabulary, key=self.vocabulary.get), dtype=str)
+        np.savez(path, terms=terms, rows=self.rows, weights=self.weights, offsets=self.offsets,
+                 count=np.asarray(self.count), revision=np.asarray(self.revision))
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        data = np.load(path)
+        vocabulary = {str(term): index for index, term in enumerate(data["terms"])}
+        return cls(vocabulary, data["rows"], data["weights"], data["offsets"], int(data["count"]),
+                   str(data["revision"]))
+
+    @classmethod
+    def open(cls, directory: str, payloads, count: int, revision: str = "") -> "BM25Index":
+        """Load the index saved in ``directory``, building it from ``payloads`` if missing or stale.
+
+        ``payloads`` is a callable returning an iterable of payloads, only called on a rebuild.
+        """
+        path = os.path.join(directory, LEXICAL_INDEX_FILE)
+        if os.path.exists(path):
+            index = cls.load(path)
+            if index.count == count and index.revision == revision:
+                return index
+        print(f"[LOG] Building BM25 index over {count} documents...")
+        start_time = time.perf_counter()
+        os.makedirs(directory, exist_ok=True)
+        index = cls.build(document_text(payload) for payload in payloads())
+        index.revision = revision
+        index.save(path)
+        print(f"[LOG] BM25 index with {len(index.vocabulary)} terms built in {time.perf_counter() - start_time:.2f}s.")
+        return index
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int, rrf_k: int = RRF_K) -> Tuple[np.ndarray, np.ndarray]:
+    """Fuse best-first rankings by summing ``1 / (rrf_k + rank)``; returns (ids, fused scores) of the top ``k``."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            fused[int(item)] = fused.get(int(item), 0.0) + 1.0 / (rrf_k + rank)
+    ordered = sorted(fused.items(), key=lambda entry: entry[1], reverse=True)[:k]
+    return (np.asarray([item for item, _ in ordered], dtype=np.int64),
+            np.asarray([score for _, score in ordered], dtype=np.float32))
@@ -0,0 +1,178 @@
+"""Clients for the OpenRouter chat completions API, with optional streaming.
+
+Streaming requests set ``"stream": true`` and read the server-sent events
+line by line, yielding each content delta as soon as it arrives. The time to
+the first token and the total latency are recorded separately.
+"""
+import json
+import os
+import time
+from typing import AsyncIterator, Iterator, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+OPENROUTER_API_URL = os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")
+# Maximum number of chat requests in flight per async client
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 16))
+
+_DONE = object()
+
+
+class LLMError(Exception):
+    """Raised when the chat completions API returns an error."""
+
+
+class StreamStats:
+    """Timing of one completion: time to first token and total latency."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.chunks = 0
+        self.characters = 0
+
+    def token(self, content: str):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.chunks += 1
+        self.characters += len(content)
+
+    def finish(self):
+        self.finished_at = time.perf_counter()
+
+    @property
+    def ttft(self) -> Optional[float]:
+        """Seconds until the first content token, or None if nothing arrived."""
+        return None if self.first_token_at is None else self.first_token_at - self.started_at
+
+    @property
+    def total(self) -> Optional[float]:
+        return None if self.finished_at is None else self.finished_at - self.started_at
+
+    def as_dict(self) -> dict:
+        return {
+            "ttft_ms": None if self.ttft is None else round(self.ttft * 1000, 1),
+            "total_ms": None if self.total is None else round(self.total * 1000, 1),
+            "chunks": self.chunks,
+            "characters": self.characters,
+        }
+
+    def log(self):
+        stats = self.as_dict()
+        print(f"[LOG] Time to first token: {stats['ttft_ms']} ms | Total latency: {stats['total_ms']} ms "
+              f"| {stats['chunks']} chunks, {stats['characters']} characters.")
+
+
+def parse_sse_line(line: str):
+    """Return the content delta of one SSE line, ``None`` to skip it, or the end-of-stream marker."""
+    line = line.strip()
+    # Blank separators and comments (OpenRouter sends ": OPENROUTER PROCESSING" keep-alives)
+    if not line or line.startswith(":") or not line.startswith("data:"):
+        return None
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return _DONE
+    event = json.loads(data)
+    if "error" in event:
+        raise LLMError(f"Stream error: {event['error']}")
+    choices = event.get("choices") or [{}]
+    return choices[0].get("delta", {}).get("content") or None
+
+
+def _headers(api_key: Optional[str]) -> dict:
+    # Read at call time so a .env loaded after the import is honoured
+    api_key = api_key or os.getenv("OPENROUTER_KEY")
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+    }
+
+
+class ChatClient:
+    """Chat completions client sharing one keep-alive session."""
+
+    def __init__(self, api_url: str = OPENROUTER_API_URL, api_key: Optional[str] = None,
+                 timeout: float = 120):
+        self.api_url = api_url
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(_headers(api_key))
+
+    def complete(self, payload: dict, stats: Optional[StreamStats] = None) -> str:
+        """Return the full completion text."""
+        response = self.session.post(self.api_url, json=payload, timeout=self.timeout)
+        if response.status_code != 200:
+            raise LLMError(f"{response.status_code} - {response.text}")
+        content = response.json()["choices"][0]["message"]["content"]
+        if stats is not None:
+            stats.token(content)
+            stats.finish()
+        return content
+
+    def stream(self, payload: dict, stats: Optional[StreamStats] = None) -> Iterator[str]:
+        """Yield the completion text piece by piece as the server streams it."""
+        stats = stats if stats is not None else StreamStats()
+        with self.session.post(self.api_url, json={**payload, "stream": True},
+                               timeout=self.timeout, stream=True) as response:
+            if response.status_code != 200:
+                raise LLMError(f"{response.status_code} - {response.text}")
+            for line in response.iter_lines(decode_unicode=True):
+                content = parse_sse_line(line or "")
+                if content is _DONE:
+                    break
+                if content:
+                    stats.token(content)
+                    yield content
+        stats.finish()
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncChatClient:
+    """Non-blocking counterpart of :class:`ChatClient` with one shared connection pool."""
+
+    def __init__(self, api_url: str = OPENROUTER_API_URL, api_key: Optional[str] = None,
+                 timeout: float = 120, max_concurrency: int = LLM_CONCURRENCY):
+        self.api_url = api_url
+        self.client = httpx.AsyncClient(
+            headers=_headers(api_key),
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+        )
+
+    async def complete(self, payload: dict, stats: Optional[StreamStats] = None) -> str:
+        """Return the full completion text."""
+        response = await self.client.post(self.api_url, json=payload)
+        if response.status_code != 200:
+            raise LLMError(f"{response.status_code} - {response.text}")
+        content = response.json()["choices"][0]["message"]["content"]
+        if stats is not None:
+            stats.token(content)
+            stats.finish()
+        return content
+
+    async def stream(self, payload: dict, stats: Optional[StreamStats] = None) -> AsyncIterator[str]:
+        """Yield the completion text piece by piece as the server streams it."""
+        stats = stats if stats is not None else StreamStats()
+        async with self.client.stream("POST", self.api_url, json={**payload, "stream": True}) as response:
+            if response.status_code != 200:
+                raise LLMError(f"{response.status_code} - {(await response.aread()).decode(errors='replace')}")
+            async for line in response.aiter_lines():
+                content = parse_sse_line(line)
+                if content is _DONE:
+                    break
+                if content:
+                    stats.token(content)
+                    yield content
+        stats.finish()
+
+    async def aclose(self):
+        """Close the pooled connections."""
+        await self.client.aclose()
@@ -0,0 +1,211 @@
+"""Payload filters for retrieval: by tag, source file and creation date.
+
+A :class:`SearchFilter` describes the restriction once. ``to_qdrant`` turns
+it into a Qdrant filter, served by the collection's payload indexes, and
+:class:`PayloadIndex` resolves it to row numbers for the NumPy path. Both
+restrict the candidates *before* any vector is scored.
+
+``PayloadIndex`` is built once from the payloads of a vector file and saved
+next to it: an inverted index from each tag and each source file to the
+sorted rows carrying it, plus the rows sorted by ``created_at`` for range
+lookups with a binary search.
+
+Filter dates are checked when the filter is created. A date without a time
+covers the whole day (or month, or year): ``to=2025-01-11`` keeps documents
+created at 2025-01-11T12:51.
+"""
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from qdrant_client import models
+
+PAYLOAD_INDEX_FILE = "payload_index.npz"
+
+# Sorts after every real date; rows without a date never match a date range
+MISSING_DATE = np.iinfo(np.int64).max
+# Date units without a time of day: an end date in one of them extends to the end of that period
+CALENDAR_UNITS = ("Y", "M", "W", "D")
+
+
+def parse_date(value: Optional[str]) -> int:
+    """ISO date or datetime as microseconds since the epoch."""
+    if not value:
+        return MISSING_DATE
+    try:
+        return int(np.datetime64(value, "us").astype(np.int64))
+    except ValueError:
+        return MISSING_DATE
+
+
+def filter_date(value: str, field: str) -> np.datetime64:
+    """Parse a filter date, raising ``ValueError`` for anything that is not an ISO date or datetime."""
+    try:
+        date = np.datetime64(value)
+    except ValueError:
+        date = np.datetime64("NaT")
+    if np.isnat(date):
+        raise ValueError(f"Invalid date for '{field}': {value}. Use ISO format, e.g. 2025-01-31 or 2025-01-31T12:00.")
+    return date
+
+
+def source_file(payload: dict) -> Optional[str]:
+    source = payload.get("source") or payload.get("metadata", {}).get("source") or {}
+    return source.get("file_name") or None
+
+
+class SearchFilter:
+    """Restriction on tags (any of them), source file name and ``created_at`` range (inclusive).
+
+    Raises:
+        ValueError: If ``created_from`` or ``created_to`` is not an ISO date or datetime.
+    """
+
+    def __init__(self, tags: Iterable[str] = (), source: Optional[str] = None,
+                 created_from: Optional[str] = None, created_to: Optional[str] = None):
+        self.tags = [tag for tag in tags if tag]
+        self.source = source or None
+        self.created_from = created_from or None
+        self.created_to = created_to or None
+        # Validated up front, so a bad date fails here and not on the next search
+        self.start, self.end = self._date_bounds()
+
+    def _date_bounds(self) -> Tuple[Optional[np.datetime64], Optional[np.datetime64]]:
+        """Inclusive start and exclusive end of the ``created_at`` range, in microseconds."""
+        start = end = None
+        if self.created_from:
+            start = filter_date(self.created_from, "from").astype("datetime64[us]")
+        if self.created_to:
+            date = filter_date(self.created_to, "to")
+            if np.datetime_data(date.dtype)[0] in CALENDAR_UNITS:
+                end = (date + 1).astype("datetime64[us]")
+            else:
+                end = date.astype("datetime64[us]") + np.timedelta64(1, "us")
+        return start, end
+
+    def is_empty(self) -> bool:
+        return not (self.tags or self.source or self.created_from or self.created_to)
+
+    def to_qdrant(self) -> Optional[models.Filter]:
+        if self.is_empty():
+            return None
+        conditions = []
+        if self.tags:
+            conditions.append(models.FieldCondition(key="tags", match=models.MatchAny(any=self.tags)))
+        if self.source:
+            conditions.append(models.FieldCondition(key="source.file_name", match=models.MatchValue(value=self.source)))
+        if self.created_from or self.created_to:
+            conditions.append(models.FieldCondition(
+                key="created_at", range=models.DatetimeRange(gte=None if self.start is None else str(self.start),
+                                                             lt=None if self.end is None else str(self.end))
+            ))
+        return models.Filter(must=conditions)
+
+    def __repr__(self) -> str:
+        parts = [f"tags={','.join(self.tags)}" if self.tags else "", f"source={self.source}" if self.source else "",
+                 f"from={self.created_from}" if self.created_from else "", f"to={self.created_to}" if self.created_to else ""]
+        return " ".join(part for part in parts if part) or "no filter"
+
+
+def parse_filter(text: str) -> SearchFilter:
+    """Parse ``tags=a,b source=manual.pdf from=2025-01-01 to=2025-12-31`` (every part optional)."""
+    fields = {}
+    for part in text.split():
+        key, _, value = part.partition("=")
+        fields[key.lower()] = value
+    unknown = set(fields) - {"tags", "source", "from", "to"}
+    if unknown:
+        raise ValueError(f"Unknown filter fields: {', '.join(sorted(unknown))}. Use tags, source, from and to.")
+    return SearchFilter(fields.get("tags", "").split(","), fields.get("source"), fields.get("from"), fields.get("to"))
+
+
+def _pack(postings: Dict[str, List[int]]):
+    keys = sorted(postings)
+    rows = [np.asarray(postings[key], dtype=np.int64) for key in keys]
+    offsets = np.concatenate([[0], np.cumsum([len(r) for r in rows])]).astype(np.int64)
+    return np.asarray(keys, dtype=str), np.concatenate(rows) if rows else np.empty(0, dtype=np.int64), offsets
+
+
+class PayloadIndex:
+    """Inverted payload indexes of a vector file, resolving a :class:`SearchFilter` to sorted rows."""
+
+    def __init__(self, count: int, tags: Dict[str, np.ndarray], sources: Dict[str, np.ndarray],
+                 dates: np.ndarray, revision: str = ""):
+        self.count = count
+        self.revision = revision  # Revision of the vector file the index was built from
+        self.tags = tags
+        self.sources = sources
+        self.dates = dates  # created_at of every row, in microseconds
+        self.date_order = np.argsort(dates, kind="stable")
+        self.sorted_dates = dates[self.date_order]
+
+    @classmethod
+    def build(cls, payloads: Iterable[dict]) -> "PayloadIndex":
+        tags: Dict[str, List[int]] = {}
+        sources: Dict[str, List[int]] = {}
+        dates = []
+        for row, payload in enumerate(payloads):
+            for tag in set(payload.get("tags") or []):
+                tags.setdefault(tag, []).append(row)
+            source = source_file(payload)
+            if source:
+                sources.setdefault(source, []).append(row)
+            dates.append(parse_date(payload.get("created_at")))
+        return cls(len(dates), {key: np.asarray(rows, dtype=np.int64) for key, rows in tags.items()},
+                   {key: np.asarray(rows, dtype=np.int64) for key, rows in sources.items()},
+                   np.asarray(dates, dtype=np.int64))
+
+    def rows(self, search_filter: Optional[SearchFilter]) -> Optional[np.ndarray]:
+        """Sorted rows matching the filter, or None when nothing is filtered."""
+        if search_filter is None or search_filter.is_empty():
+            return None
+        rows = None
+        if search_filter.tags:
+            postings = [self.tags[tag] for tag in search_filter.tags if tag in self.tags]
+            rows = np.unique(np.concatenate(postings)) if postings else np.empty(0, dtype=np.int64)
+        if search_filter.source:
+            matching = self.sources.get(search_filter.source, np.empty(0, dtype=np.int64))
+            rows = matching if rows is None else np.intersect1d(rows, matching, assume_unique=True)
+        if search_filter.created_from or search_filter.created_to:
+            low = np.iinfo(np.int64).min if search_filter.start is None else int(search_filter.start.astype(np.int64))
+            high = MISSING_DATE - 1 if search_filter.end is None else int(search_filter.end.astype(np.int64)) - 1
+            start = np.searchsorted(self.sorted_dates, low, side="left")
+            end = np.searchsorted(self.sorted_dates, high, side="right")
+            matching = np.sort(self.date_order[start:end])
+            rows = matching if rows is None else np.intersect1d(rows, matching, assume_unique=True)
+        return rows
+
+    def save(self, path: str):
+        tag_keys, tag_rows, tag_offsets = _pack(self.tags)
+        source_keys, source_rows, source_offsets = _pack(self.sources)
+        np.savez(path, tag_keys=tag_keys, tag_rows=tag_rows, tag_offsets=tag_offsets, source_keys=source_keys,
+                 source_rows=source_rows, source_offsets=source_offsets, dates=self.dates,
+                 revision=np.asarray(self.revision))
+
+    @classmethod
+    def load(cls, path: str) -> "PayloadIndex":
+        data = np.load(path)
+
+        def unpack(prefix: str) -> Dict[str, np.ndarray]:
+            keys, rows, offsets = data[f"{prefix}_keys"], data[f"{prefix}_rows"], data[f"{prefix}_offsets"]
+            return {str(key): rows[offsets[i]:offsets[i + 1]] for i, key in enumerate(keys)}
+
+        revision = str(data["revision"]) if "revision" in data else ""
+        return cls(len(data["dates"]), unpack("tag"), unpack("source"), data["dates"], revision)
+
+    @classmethod
+    def open(cls, vector_file) -> "PayloadIndex":
+        """Load the index saved in a vector file directory, rebuilding it if the file was rewritten."""
+        path = os.path.join(vector_file.directory, PAYLOAD_INDEX_FILE)
+        if os.path.exists(path):
+            index = cls.load(path)
+            if index.count == len(vector_file) and index.revision == vector_file.revision:
+                return index
+        print(f"[LOG] Building payload index over {len(vector_file)} documents...")
+        index = cls.build(vector_file.iter_payloads())
+        index.revision = vector_file.revision
+        index.save(path)
+        return index
+
+    def stats(self) -> dict:
+        return {"documents": self.count, "tags": len(self.tags), "sources": len(self.sources)}
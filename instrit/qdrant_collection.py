@@ -0,0 +1,111 @@
+"""Persistent Qdrant collection that is only rewritten when the dataset changes.
+
+The collection lives on disk (``QdrantClient(path=QDRANT_PATH)``) or on a
+server when ``QDRANT_URL`` is set. Its metadata holds a version stamp: the
+schema version of the points plus a revision hash of the documents and the
+embedding model. On start-up, a collection whose stamp matches is reopened
+as is, without embedding or upserting anything. Otherwise changed points are
+upserted, points of removed documents are deleted and the stamp is written
+last, so an interrupted sync is redone on the next start.
+
+Collection metadata needs the pinned qdrant-client (1.19) and, in server
+mode, a Qdrant server that supports it; qdrant-client 1.12 has neither
+``CollectionConfig.metadata`` nor ``update_collection(metadata=...)``.
+"""
+import hashlib
+import json
+import os
+from typing import Iterable, List, Optional
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, PayloadSchemaType, PointIdsList, PointStruct, VectorParams
+
+from instrit.qdrant_sync import is_local, upload_points
+
+QDRANT_PATH = os.getenv("QDRANT_PATH", "qdrant_data")
+QDRANT_URL = os.getenv("QDRANT_URL")  # Server mode when set, local files otherwise
+QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "chatbot")
+
+# Bump when the point payload or the payload indexes change
+SCHEMA_VERSION = 2
+PAYLOAD_INDEXES = {
+    "tags": PayloadSchemaType.KEYWORD,
+    "title": PayloadSchemaType.KEYWORD,
+    "created_at": PayloadSchemaType.DATETIME,
+    "source.file_name": PayloadSchemaType.KEYWORD,
+}
+
+
+def dataset_revision(documents: Iterable[dict], model: str) -> str:
+    """Hash of every document (ids, content and metadata) and the embedding model."""
+    digest = hashlib.sha256(model.encode("utf-8"))
+    for document in documents:
+        digest.update(json.dumps(document, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def connect(path: str = QDRANT_PATH, url: Optional[str] = QDRANT_URL) -> QdrantClient:
+    if url:
+        return QdrantClient(url=url, api_key=os.getenv("QDRANT_KEY"))
+    return QdrantClient(path=path)
+
+
+class PersistentCollection:
+    """A Qdrant collection stamped with the dataset revision it was built from."""
+
+    def __init__(self, client: QdrantClient, name: str = QDRANT_COLLECTION):
+        self.client = client
+        self.name = name
+
+    def stamp(self) -> Optional[dict]:
+        if not self.client.collection_exists(self.name):
+            return None
+        return self.client.get_collection(self.name).config.metadata or {}
+
+    def is_current(self, revision: str) -> bool:
+        """True when the stored collection was built from ``revision`` with the current schema."""
+        stamp = self.stamp()
+        return bool(stamp) and stamp.get("schema_version") == SCHEMA_VERSION and stamp.get("revision") == revision
+
+    def sync(self, points: Iterable[PointStruct], ids: List, dimension: int, revision: Optional[str]) -> dict:
+        """Bring the collection to ``revision``: upsert changed points, delete removed ones, stamp it.
+
+        With ``revision=None`` (an incomplete dataset) nothing is stamped, so the next start syncs again.
+        """
+        stamp = self.stamp()
+        if stamp is not None and (stamp.get("schema_version", SCHEMA_VERSION) != SCHEMA_VERSION
+                                  or self.client.get_collection(self.name).config.params.vectors.size != dimension):
+            print(f"[LOG] Collection '{self.name}' has an old schema or dimension. Recreating it...")
+            self.client.delete_collection(self.name)
+            stamp = None
+        if stamp is None:
+            self.client.create_collection(self.name, vectors_config=VectorParams(size=dimension, distance=Distance.COSINE))
+            # The local mode has no payload indexes; it filters by scanning the payloads
+            if not is_local(self.client):
+                for field, schema in PAYLOAD_INDEXES.items():
+                    self.client.create_payload_index(self.name, field, schema)
+
+        stats = upload_points(self.client, self.name, points)
+        stats["deleted"] = self._delete_missing(ids)
+        if revision is not None:
+            self.client.update_collection(self.name, metadata={"schema_version": SCHEMA_VERSION, "revision": revision})
+        return stats
+
+    def _delete_missing(self, ids: List) -> int:
+        keep = {str(point_id) for point_id in ids}
+        stale, offset = [], None
+        while True:
+            records, offset = self.client.scroll(self.name, limit=1024, offset=offset,
+                                                 with_payload=False, with_vectors=False)
+            stale += [record.id for record in records if str(record.id) not in keep]
+            if offset is None:
+                break
+        if stale:
+            self.client.delete(self.name, points_selector=PointIdsList(points=stale))
+        return len(stale)
+
+    def count(self) -> int:
+        return self.client.count(self.name).count
+
+    def close(self):
+        self.client.close()
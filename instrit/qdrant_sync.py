@@ -0,0 +1,114 @@
+"""Streaming, batched upserts into a Qdrant collection.
+
+Points are consumed lazily from any iterable and sent in batches of
+``QDRANT_BATCH_SIZE`` by ``QDRANT_UPLOAD_WORKERS`` threads, with a bounded
+number of batches in flight, so memory does not grow with the collection.
+Every point carries a ``content_hash`` of its vector and payload; points
+whose stored hash already matches are skipped.
+
+Works with a remote Qdrant, a local one (``QdrantClient(path=...)``) or the
+in-memory ``QdrantClient(":memory:")``. Local mode is not thread-safe, so
+it is always written by a single worker.
+"""
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, List, Sequence
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.local.qdrant_local import QdrantLocal
+from qdrant_client.models import PointStruct
+
+QDRANT_BATCH_SIZE = int(os.getenv("QDRANT_BATCH_SIZE", 256))
+QDRANT_UPLOAD_WORKERS = int(os.getenv("QDRANT_UPLOAD_WORKERS", 4))
+HASH_FIELD = "content_hash"
+
+# Minimum seconds between two progress lines
+PROGRESS_INTERVAL = 2.0
+
+
+def point_hash(vector: Sequence[float], payload: dict) -> str:
+    """Hash of a point's vector and payload (without the hash field itself)."""
+    digest = hashlib.sha256()
+    fields = {key: value for key, value in payload.items() if key != HASH_FIELD}
+    digest.update(json.dumps(fields, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    digest.update(np.asarray(vector, dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def is_local(client: QdrantClient) -> bool:
+    """True for the embedded local mode (``":memory:"`` or ``path=...``)."""
+    return isinstance(getattr(client, "_client", None), QdrantLocal)
+
+
+def upload_batch(client: QdrantClient, collection: str, points: List[PointStruct],
+                 skip_unchanged: bool = True) -> int:
+    """Upsert the points of one batch whose content changed; returns how many were sent."""
+    for point in points:
+        point.payload = {**(point.payload or {}), HASH_FIELD: point_hash(point.vector, point.payload or {})}
+
+    if skip_unchanged:
+        stored = client.retrieve(collection, ids=[point.id for point in points],
+                                 with_payload=[HASH_FIELD], with_vectors=False)
+        stored_hashes = {str(record.id): (record.payload or {}).get(HASH_FIELD) for record in stored}
+        points = [point for point in points if stored_hashes.get(str(point.id)) != point.payload[HASH_FIELD]]
+
+    if points:
+        client.upsert(collection_name=collection, points=points, wait=True)
+    return len(points)
+
+
+def upload_points(client: QdrantClient, collection: str, points: Iterable[PointStruct],
+                  batch_size: int = QDRANT_BATCH_SIZE, workers: int = QDRANT_UPLOAD_WORKERS,
+                  skip_unchanged: bool = True, total: int = None, report: bool = True) -> dict:
+    """Stream ``points`` into ``collection`` and return upload statistics.
+
+    ``total`` is only used for the progress lines.
+    """
+    if is_local(client):
+        workers = 1
+    stats = {"points": 0, "uploaded": 0, "skipped": 0, "batches": 0}
+    start = last_report = time.perf_counter()
+
+    def collect(future, size: int):
+        nonlocal last_report
+        uploaded = future.result()
+        stats["points"] += size
+        stats["uploaded"] += uploaded
+        stats["skipped"] += size - uploaded
+        stats["batches"] += 1
+        now = time.perf_counter()
+        if report and now - last_report >= PROGRESS_INTERVAL:
+            last_report = now
+            of_total = f"/{total}" if total else ""
+            print(f"[LOG] Qdrant: {stats['points']}{of_total} points processed "
+                  f"({stats['skipped']} unchanged), {stats['points'] / (now - start):.0f} points/s")
+
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch in batched(points, batch_size):
+            # At most two batches per worker are held in memory
+            if len(in_flight) >= 2 * workers:
+                collect(*in_flight.popleft())
+            in_flight.append((executor.submit(upload_batch, client, collection, batch, skip_unchanged), len(batch)))
+        while in_flight:
+            collect(*in_flight.popleft())
+
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    stats["points_per_second"] = round(stats["points"] / stats["seconds"], 1) if stats["seconds"] else 0.0
+    if report:
+        print(f"[LOG] Qdrant: {stats['points']} points in {stats['seconds']:.1f}s "
+              f"({stats['points_per_second']:.0f} points/s): {stats['uploaded']} uploaded, "
+              f"{stats['skipped']} unchanged.")
+    return stats
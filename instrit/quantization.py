@@ -0,0 +1,261 @@
+"""Quantized vector indexes: int8 scalar quantization and product quantization.
+
+Both keep only compact codes in memory and score queries against them
+directly (the query stays in float32, so distances are asymmetric). The best
+``rerank_candidates`` are then re-scored with the full-precision vectors,
+which stay on disk in the memory-mapped vector file, so recall stays close to
+exact search while RAM holds 1 byte (int8) or ``dim / n_subspaces`` times
+less (PQ) per dimension.
+
+Both classes follow the index API of :mod:`instrit.ann_index`, which selects
+them with ``VECTOR_INDEX=sq8`` or ``VECTOR_INDEX=pq``.
+"""
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from instrit.vector_search import normalize_query, normalize_rows, top_k_indices
+
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", 50))
+PQ_SUBSPACES = int(os.getenv("PQ_SUBSPACES", 96))
+PQ_CENTROIDS = 256  # One uint8 code per subspace
+
+# Rows decoded per block while scoring; small blocks keep the float32 copy in CPU cache
+SCORE_BLOCK = 1024
+
+
+def kmeans(vectors: np.ndarray, n_clusters: int, iterations: int = 15, seed: int = 0) -> np.ndarray:
+    """Euclidean k-means; returns the centroids."""
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = nearest(vectors, centroids)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        sums = np.stack([np.bincount(assignments, weights=column, minlength=n_clusters)
+                         for column in vectors.T], axis=1)
+        empty = counts == 0
+        centroids = np.where(empty[:, None], vectors[rng.choice(len(vectors), n_clusters)],
+                             sums / np.maximum(counts, 1)[:, None]).astype(np.float32)
+    return centroids
+
+
+def nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the closest centroid (Euclidean) for every vector."""
+    distances = (centroids ** 2).sum(axis=1) - 2 * vectors @ centroids.T
+    return np.argmin(distances, axis=1)
+
+
+class QuantizedIndex(ABC):
+    """Shared search logic: approximate scores over the codes, then full-precision re-ranking.
+
+    Subclasses implement the coding scheme; saving and loading go through
+    ``_meta`` (constructor arguments) and ``_arrays`` (the stored arrays).
+    """
+
+    kind = ""
+
+    def __init__(self, rerank_candidates: int = RERANK_CANDIDATES):
+        self.rerank_candidates = rerank_candidates
+        # Full-precision normalized vectors (usually the VectorFile memmap); None disables re-ranking
+        self.rerank_vectors: Optional[np.ndarray] = None
+
+    @abstractmethod
+    def build(self, vectors: Sequence[Sequence[float]]) -> "QuantizedIndex":
+        """Train the quantizer on ``vectors`` and encode them."""
+
+    @abstractmethod
+    def add(self, vectors: Sequence[Sequence[float]]):
+        """Encode more rows with the trained quantizer."""
+
+    @abstractmethod
+    def approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        """Approximate dot product of the normalized ``query`` with every stored vector."""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    def search(self, query: Sequence[float], k: int, rerank: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (row indices, scores) of the ``k`` best matches, best first."""
+        query = normalize_query(query)
+        scores = self.approximate_scores(query)
+        if not rerank or self.rerank_vectors is None:
+            indices = top_k_indices(scores, k)
+            return indices, scores[indices]
+
+        # Sorted rows read the memory-mapped file in order
+        candidates = np.sort(top_k_indices(scores, max(k, self.rerank_candidates)))
+        exact_scores = np.asarray(self.rerank_vectors[candidates], dtype=np.float32) @ query
+        best = top_k_indices(exact_scores, k)
+        return candidates[best], exact_scores[best]
+
+    @abstractmethod
+    def memory_bytes(self) -> int:
+        """Bytes held in memory by the codes and the quantizer parameters."""
+
+    @abstractmethod
+    def _meta(self) -> dict:
+        """Constructor arguments saved in meta.json."""
+
+    @abstractmethod
+    def _arrays(self) -> dict:
+        """Arrays saved as ``<name>.npy`` and restored as attributes of the same name."""
+
+    @classmethod
+    @abstractmethod
+    def _from_meta(cls, meta: dict) -> "QuantizedIndex":
+        """Create an empty index from the saved meta.json."""
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as file:
+            json.dump({"kind": self.kind, "count": len(self), **self._meta()}, file)
+        for name, array in self._arrays().items():
+            np.save(os.path.join(directory, f"{name}.npy"), array)
+
+    @classmethod
+    def load(cls, directory: str) -> "QuantizedIndex":
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as file:
+            meta = json.load(file)
+        index = cls._from_meta(meta)
+        for name in index._arrays():
+            setattr(index, name, np.load(os.path.join(directory, f"{name}.npy")))
+        return index
+
+
+class ScalarQuantizedIndex(QuantizedIndex):
+    """int8 scalar quantization: each dimension mapped linearly onto 256 levels."""
+
+    kind = "sq8"
+
+    def __init__(self, rerank_candidates: int = RERANK_CANDIDATES):
+        super().__init__(rerank_candidates)
+        self.low: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+        self.codes: Optional[np.ndarray] = None
+
+    def build(self, vectors: Sequence[Sequence[float]]) -> "ScalarQuantizedIndex":
+        vectors = normalize_rows(vectors)
+        self.low = vectors.min(axis=0)
+        self.scale = (vectors.max(axis=0) - self.low) / 255
+        self.scale[self.scale == 0] = 1.0
+        self.codes = self.encode(vectors)
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        levels = np.clip(np.round((vectors - self.low) / self.scale), 0, 255)
+        return (levels - 128).astype(np.int8)
+
+    def add(self, vectors: Sequence[Sequence[float]]):
+        if self.codes is None:
+            self.build(vectors)
+            return
+        self.codes = np.concatenate([self.codes, self.encode(normalize_rows(vectors))])
+
+    def approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        # decode(codes) @ q == (codes + 128) @ (scale * q) + low @ q, without decoding every vector
+        scaled_query = (self.scale * query).astype(np.float32)
+        offset = float(self.low @ query) + 128 * float(scaled_query.sum())
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), SCORE_BLOCK):
+            block = self.codes[start:start + SCORE_BLOCK].astype(np.float32)
+            scores[start:start + SCORE_BLOCK] = block @ scaled_query + offset
+        return scores
+
+    def memory_bytes(self) -> int:
+        return self.codes.nbytes + self.low.nbytes + self.scale.nbytes
+
+    def __len__(self) -> int:
+        return 0 if self.codes is None else len(self.codes)
+
+    def _meta(self) -> dict:
+        return {"rerank_candidates": self.rerank_candidates}
+
+    def _arrays(self) -> dict:
+        return {"low": self.low, "scale": self.scale, "codes": self.codes}
+
+    @classmethod
+    def _from_meta(cls, meta: dict) -> "ScalarQuantizedIndex":
+        return cls(meta["rerank_candidates"])
+
+
+class PQIndex(QuantizedIndex):
+    """Product quantization: the vector is split into subspaces, each stored as a 1-byte centroid id.
+
+    A query builds one table of dot products per subspace, and the
+    approximate score of a vector is the sum of its table entries.
+    """
+
+    kind = "pq"
+
+    def __init__(self, n_subspaces: int = PQ_SUBSPACES, rerank_candidates: int = RERANK_CANDIDATES,
+                 training_size: int = 10000):
+        super().__init__(rerank_candidates)
+        self.n_subspaces = n_subspaces
+        self.training_size = training_size
+        self.codebooks: Optional[np.ndarray] = None  # (subspaces, 256, sub-dimension)
+        self.codes: Optional[np.ndarray] = None  # (subspaces, vectors): each subspace is contiguous
+
+    def build(self, vectors: Sequence[Sequence[float]]) -> "PQIndex":
+        vectors = normalize_rows(vectors)
+        dimension = vectors.shape[1]
+        if dimension % self.n_subspaces:
+            raise ValueError(f"Dimension {dimension} is not divisible into {self.n_subspaces} subspaces.")
+        sub_dimension = dimension // self.n_subspaces
+
+        rng = np.random.default_rng(0)
+        sample = vectors
+        if len(vectors) > self.training_size:
+            sample = vectors[rng.choice(len(vectors), self.training_size, replace=False)]
+
+        self.codebooks = np.zeros((self.n_subspaces, PQ_CENTROIDS, sub_dimension), dtype=np.float32)
+        for subspace in range(self.n_subspaces):
+            columns = slice(subspace * sub_dimension, (subspace + 1) * sub_dimension)
+            centroids = kmeans(np.ascontiguousarray(sample[:, columns]), PQ_CENTROIDS, seed=subspace)
+            self.codebooks[subspace, :len(centroids)] = centroids
+        self.codes = self.encode(vectors)
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        sub_dimension = self.codebooks.shape[2]
+        codes = np.empty((self.n_subspaces, len(vectors)), dtype=np.uint8)
+        for subspace in range(self.n_subspaces):
+            columns = slice(subspace * sub_dimension, (subspace + 1) * sub_dimension)
+            for start in range(0, len(vectors), SCORE_BLOCK):
+                block = vectors[start:start + SCORE_BLOCK, columns]
+                codes[subspace, start:start + SCORE_BLOCK] = nearest(block, self.codebooks[subspace])
+        return codes
+
+    def add(self, vectors: Sequence[Sequence[float]]):
+        if self.codes is None:
+            self.build(vectors)
+            return
+        self.codes = np.concatenate([self.codes, self.encode(normalize_rows(vectors))], axis=1)
+
+    def approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        # Asymmetric distance: the query is not quantized, only the stored vectors are
+        tables = np.einsum("skd,sd->sk", self.codebooks, query.reshape(self.n_subspaces, -1))
+        scores = np.zeros(self.codes.shape[1], dtype=np.float32)
+        for subspace in range(self.n_subspaces):
+            scores += tables[subspace][self.codes[subspace]]
+        return scores
+
+    def memory_bytes(self) -> int:
+        return self.codes.nbytes + self.codebooks.nbytes
+
+    def __len__(self) -> int:
+        return 0 if self.codes is None else self.codes.shape[1]
+
+    def _meta(self) -> dict:
+        return {"n_subspaces": self.n_subspaces, "rerank_candidates": self.rerank_candidates}
+
+    def _arrays(self) -> dict:
+        return {"codebooks": self.codebooks, "codes": self.codes}
+
+    @classmethod
+    def _from_meta(cls, meta: dict) -> "PQIndex":
+        return cls(meta["n_subspaces"], meta["rerank_candidates"])
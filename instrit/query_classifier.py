@@ -0,0 +1,195 @@
+"""Decide whether a user question needs the knowledge base (RAG).
+
+The local classifier is a logistic regression over the query embedding that
+retrieval computes anyway, so a prediction is one dot product. Predictions
+whose probability falls between the confidence thresholds are left to the
+LLM classifier, which is also kept as a standalone mode.
+
+Train or refresh the local model with::
+
+    python -m instrit.query_classifier query_classifier.npz
+"""
+import argparse
+import json
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+import requests
+
+from instrit.embedding_client import EmbeddingClient
+from instrit.vector_search import normalize_query, normalize_rows
+
+DEFAULT_EXAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data",
+                                     "query_classification_examples.json")
+OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
+
+# Probability above which a query is classified "y" locally (and below 1 - value, "n")
+CLASSIFIER_CONFIDENCE = float(os.getenv("CLASSIFIER_CONFIDENCE", 0.8))
+
+CLASSIFICATION_PROMPT = """
+You are an advanced technical AI assistant specialized in industrial machinery, maintenance practices, and operational standards. Your primary task is to determine whether a question requires consulting technical documentation, manuals, or detailed records (referred to as RAG). Respond with "y" (yes) or "n" (no), strictly following the guidelines below.
+
+### Guidelines:
+
+#### Respond "y" if:
+1. The question requires any form of technical, detailed, or specific information, including but not limited to:
+   - Definitions of machinery components or their functions (e.g., "What are the parts of a lathe?").
+   - Maintenance practices or guidelines (e.g., "How to perform preventive maintenance on a milling machine?").
+   - Lubricants, fluids, or material specifications (e.g., "What oil should be used for a refrigerator?").
+   - Operational, assembly, or disassembly instructions.
+   - Any information about a specific machine model, brand, or type (e.g., "Parts of an industrial fan," "How to troubleshoot an XYZ Model 500?").
+   - Descriptions or classifications of machines or their functions.
+
+#### Respond "n" if:
+1. The question involves superficial or conversational inputs (e.g., "Hello," "Who are you?").
+2. It reflects a continuation or exploration of a symptom or issue without requiring documentation (e.g., "It is making noise," "The machine stopped working.").
+3. It is explicitly not technical or specific enough to require reference materials.
+
+### Examples:
+- "What are the parts of a lathe?" → y
+- "How to perform preventive maintenance on a milling machine?" → y
+- "What oil should be used for a refrigerator?" → y
+- "Parts of an industrial fan?" → y
+- "Hello, who are you?" → n
+- "It is making noise." → n
+- "What are the main types of lubrication?" → y
+- "What is a lathe?" → y
+- "The machine stopped working." → n
+- "What are the benefits of using hydraulic systems in heavy machinery?" → y
+
+### Rules for Output:
+1. Respond **only** with "y" or "n".
+2. Do not include any additional text, punctuation, or spaces.
+3. Maintain a consistent response format for every query.
+
+### Decision Process:
+1. **Keyword Identification**: Identify terms that indicate a need for technical details, machine parts, or operational information.
+2. **Context Evaluation**: Assess whether the question involves a technical inquiry or a continuation of a previously described issue.
+3. **Apply the Guidelines**: Classify the query based on the provided rules and respond accordingly.
+
+Question: {query}
+Answer:
+"""
+
+
+def classify_with_llm(query: str, api_key: str, model: str, api_url: str = OPENROUTER_API_URL) -> bool:
+    """Ask the LLM whether the query needs the knowledge base."""
+    payload = {
+        "model": model,
+        "prompt": CLASSIFICATION_PROMPT.format(query=query).strip(),
+        "max_tokens": 2,
+        "temperature": 0.0,
+    }
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+    }
+    response = requests.post(api_url, headers=headers, json=payload)
+    response.raise_for_status()
+    result = response.json().get("choices", [{}])[0].get("text", "").strip()
+    return result.lower() == "y"
+
+
+def classifier_path(path: str) -> str:
+    """Path with the ``.npz`` suffix that ``np.savez`` adds when it is missing."""
+    return path if path.endswith(".npz") else f"{path}.npz"
+
+
+def load_examples(path: str = DEFAULT_EXAMPLES_PATH) -> Tuple[List[str], List[bool]]:
+    """Load labelled queries as (queries, needs_rag labels)."""
+    with open(path, "r", encoding="utf-8") as file:
+        examples = json.load(file)
+    return [example["query"] for example in examples], [example["label"] == "y" for example in examples]
+
+
+class LogisticRegression:
+    """Binary logistic regression trained with full-batch gradient descent."""
+
+    def __init__(self, weights: Optional[np.ndarray] = None, bias: float = 0.0):
+        self.weights = weights
+        self.bias = bias
+
+    def fit(self, features: np.ndarray, labels: np.ndarray, epochs: int = 2000,
+            learning_rate: float = 1.0, l2: float = 1e-3) -> "LogisticRegression":
+        features = np.asarray(features, dtype=np.float32)
+        labels = np.asarray(labels, dtype=np.float32)
+        self.weights = np.zeros(features.shape[1], dtype=np.float32)
+        self.bias = 0.0
+        for _ in range(epochs):
+            error = self.predict_proba(features) - labels
+            self.weights -= learning_rate * (features.T @ error / len(labels) + l2 * self.weights)
+            self.bias -= learning_rate * float(error.mean())
+        return self
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        return 1.0 / (1.0 + np.exp(-(features @ self.weights + self.bias)))
+
+
+class QueryClassifier:
+    """Local RAG/no-RAG classifier over query embeddings."""
+
+    def __init__(self, model: LogisticRegression, embedding_model: str,
+                 confidence: float = CLASSIFIER_CONFIDENCE):
+        self.model = model
+        self.embedding_model = embedding_model
+        self.confidence = confidence
+
+    @classmethod
+    def train(cls, queries: List[str], labels: List[bool], embedding_client: EmbeddingClient) -> "QueryClassifier":
+        """Embed the labelled queries and fit the classifier on them."""
+        features = normalize_rows(embedding_client.embed_many(queries))
+        return cls(LogisticRegression().fit(features, np.asarray(labels)), embedding_client.model)
+
+    def probability(self, embedding: List[float]) -> float:
+        """Return the probability that the query needs the knowledge base."""
+        return float(self.model.predict_proba(normalize_query(embedding)))
+
+    def classify(self, embedding: List[float]) -> Optional[bool]:
+        """Return the decision, or None when the model is not confident enough."""
+        probability = self.probability(embedding)
+        if probability >= self.confidence:
+            return True
+        if probability <= 1 - self.confidence:
+            return False
+        return None
+
+    def save(self, path: str):
+        np.savez(classifier_path(path), weights=self.model.weights, bias=self.model.bias, embedding_model=self.embedding_model)
+
+    @classmethod
+    def load(cls, path: str) -> "QueryClassifier":
+        data = np.load(classifier_path(path))
+        return cls(LogisticRegression(data["weights"], float(data["bias"])), str(data["embedding_model"]))
+
+    @classmethod
+    def load_or_train(cls, path: str, embedding_client: EmbeddingClient,
+                      examples_path: str = DEFAULT_EXAMPLES_PATH) -> "QueryClassifier":
+        """Load a saved classifier for the client's model, training and saving one if needed."""
+        path = classifier_path(path)
+        if os.path.exists(path):
+            classifier = cls.load(path)
+            if classifier.embedding_model == embedding_client.model:
+                return classifier
+            print(f"[LOG] Classifier '{path}' was trained for another embedding model. Retraining...")
+        print("[LOG] Training local query classifier...")
+        classifier = cls.train(*load_examples(examples_path), embedding_client)
+        classifier.save(path)
+        return classifier
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the local query classifier.")
+    parser.add_argument("output", help="Path of the .npz file to write.")
+    parser.add_argument("--examples", default=DEFAULT_EXAMPLES_PATH, help="JSON file with labelled queries.")
+    args = parser.parse_args()
+
+    embedding_client = EmbeddingClient()
+    queries, labels = load_examples(args.examples)
+    classifier = QueryClassifier.train(queries, labels, embedding_client)
+    classifier.save(args.output)
+    print(f"[LOG] Trained on {len(queries)} examples. Saved to '{args.output}'.")
+
+
+if __name__ == "__main__":
+    main()
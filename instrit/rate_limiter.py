@@ -0,0 +1,26 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """Spaces out calls to a remote service so they stay under a per-minute rate.
+
+    Thread-safe: each caller reserves the next free slot and sleeps until it,
+    so concurrent workers share one budget. A rate of 0 disables the limit.
+    """
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """Block until the caller may send its request."""
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
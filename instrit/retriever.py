@@ -0,0 +1,80 @@
+"""Filtered hybrid retrieval over a vector file (the NumPy path).
+
+Combines the vector index (:mod:`instrit.ann_index`), the payload filters
+(:mod:`instrit.payload_filter`) and the BM25 index
+(:mod:`instrit.lexical_index`):
+
+- a filter is resolved to rows first, and only those rows are scored;
+- with ``RETRIEVAL_MODE=hybrid`` (default) the vector and BM25 rankings of
+  the best ``RRF_CANDIDATES`` are fused by reciprocal rank fusion, while
+  ``vector`` keeps the plain embedding search;
+- exact-match queries are answered by :meth:`Retriever.exact` before any
+  query embedding is requested.
+"""
+import os
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from instrit.ann_index import VECTOR_INDEX, open_index
+from instrit.lexical_index import BM25Index, is_exact_query, reciprocal_rank_fusion
+from instrit.payload_filter import PayloadIndex, SearchFilter
+from instrit.vector_file import VectorFile
+from instrit.vector_search import normalize_query, subset_top_k
+
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")  # "hybrid" or "vector"
+RRF_CANDIDATES = int(os.getenv("RRF_CANDIDATES", 50))
+
+
+class Retriever:
+    """Vector, lexical and payload indexes of one vector file."""
+
+    def __init__(self, vector_file: VectorFile, index, payload_index: PayloadIndex, lexical_index: BM25Index,
+                 mode: str = RETRIEVAL_MODE, candidates: int = RRF_CANDIDATES):
+        if mode not in ("hybrid", "vector"):
+            raise ValueError(f"Unknown retrieval mode: {mode}. Use 'hybrid' or 'vector'.")
+        self.vector_file = vector_file
+        self.index = index
+        self.payload_index = payload_index
+        self.lexical_index = lexical_index
+        self.mode = mode
+        self.candidates = candidates
+
+    @classmethod
+    def open(cls, vector_file: VectorFile, kind: str = VECTOR_INDEX, mode: str = RETRIEVAL_MODE) -> "Retriever":
+        """Open (or build and save) every index in the vector file directory."""
+        directory = vector_file.directory
+        index = open_index(vector_file.vectors, kind, os.path.join(directory, f"{kind}_index"))
+        payload_index = PayloadIndex.open(vector_file)
+        lexical_index = BM25Index.open(directory, vector_file.iter_payloads, len(vector_file),
+                                       vector_file.revision)
+        return cls(vector_file, index, payload_index, lexical_index, mode)
+
+    def exact(self, query: str, k: int, search_filter: Optional[SearchFilter] = None) -> Optional[np.ndarray]:
+        """Rows of documents containing every token of an exact-match query, or None to fall back to search."""
+        if self.mode != "hybrid" or not is_exact_query(query):
+            return None
+        rows, _ = self.lexical_index.search_all_terms(query, k, self.payload_index.rows(search_filter))
+        return rows if len(rows) else None
+
+    def search(self, query: str, embedding: Sequence[float], k: int,
+               search_filter: Optional[SearchFilter] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (rows, cosine similarities) of the ``k`` best documents, best first."""
+        rows = self.payload_index.rows(search_filter)
+        if rows is not None and not len(rows):
+            return rows, np.empty(0, dtype=np.float32)
+
+        if self.mode == "vector":
+            return self._vector_search(embedding, k, rows)
+
+        vector_rows, _ = self._vector_search(embedding, self.candidates, rows)
+        lexical_rows, _ = self.lexical_index.search(query, self.candidates, rows)
+        fused, _ = reciprocal_rank_fusion([vector_rows, lexical_rows], k)
+        similarities = np.asarray(self.vector_file.vectors[fused], dtype=np.float32) @ normalize_query(embedding)
+        return fused, similarities
+
+    def _vector_search(self, embedding: Sequence[float], k: int, rows: Optional[np.ndarray]):
+        # Filtered searches score only the matching rows, exactly
+        if rows is None:
+            return self.index.search(embedding, k)
+        return subset_top_k(self.vector_file.vectors, rows, embedding, k)
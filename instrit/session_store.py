@@ -0,0 +1,77 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, TypeVar
+
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", 1000))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", 1800))  # Seconds without messages before a session expires
+
+T = TypeVar("T")
+
+
+class SessionStore(Generic[T]):
+    """Bounded per-session state for the chat server.
+
+    Sessions are kept in least-recently-used order. A session expires after
+    ``idle_ttl`` seconds without being used, and the least recently used one
+    is evicted when more than ``max_sessions`` are open, so memory stays
+    bounded however many clients connect. Meant to be used from a single
+    asyncio event loop, so it needs no locking.
+    """
+
+    def __init__(self, factory: Callable[[], T], max_sessions: int = MAX_SESSIONS,
+                 idle_ttl: float = SESSION_IDLE_TTL):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.sessions = OrderedDict()
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def get(self, session_id: str) -> T:
+        """Return the session state, creating it if it is new or has expired."""
+        now = time.monotonic()
+        entry = self.sessions.get(session_id)
+        if entry is not None and now - entry[0] >= self.idle_ttl:
+            del self.sessions[session_id]
+            self.expired += 1
+            entry = None
+
+        if entry is None:
+            state = self.factory()
+            self.created += 1
+        else:
+            state = entry[1]
+
+        self.sessions[session_id] = (now, state)
+        self.sessions.move_to_end(session_id)
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+            self.evicted += 1
+        return state
+
+    def delete(self, session_id: str) -> bool:
+        return self.sessions.pop(session_id, None) is not None
+
+    def expire_idle(self) -> int:
+        """Drop every session idle for longer than the TTL; returns how many were dropped."""
+        now = time.monotonic()
+        removed = 0
+        # Oldest first, so the scan stops at the first session still in use
+        while self.sessions:
+            session_id, (last_used, _) = next(iter(self.sessions.items()))
+            if now - last_used < self.idle_ttl:
+                break
+            del self.sessions[session_id]
+            removed += 1
+        self.expired += removed
+        return removed
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self.sessions),
+            "created": self.created,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
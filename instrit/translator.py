@@ -0,0 +1,276 @@
+"""Cached, batched translation shared by the chatbot and the ingestion scripts.
+
+Translations are cached by a hash of (backend, target language, text) in
+memory and in a SQLite file, so re-ingesting an unchanged manual or repeating
+a question does not hit the network. Uncached texts are packed into as few
+requests as the backend allows. Texts a local language detector finds to be
+in the target language already are returned unchanged without a lookup. The
+remote backend is pluggable: set ``TRANSLATION_BACKEND=offline`` to run
+without the network.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from instrit.language_detector import LanguageDetector
+
+TRANSLATION_BACKEND = os.getenv("TRANSLATION_BACKEND", "google")  # "google" or "offline"
+TRANSLATION_TARGET = os.getenv("TRANSLATION_TARGET", "en")
+TRANSLATION_CACHE_PATH = os.getenv("TRANSLATION_CACHE_PATH", "translation_cache.sqlite")  # Empty disables the disk tier
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", 4096))
+# Skip the translation of text already in the target language
+DETECT_LANGUAGE = os.getenv("DETECT_LANGUAGE", "true").lower() == "true"
+
+# Google rejects requests over 5000 characters
+GOOGLE_MAX_CHARS = 4500
+# Line placed between texts packed into one request; it is left untranslated
+BATCH_SEPARATOR = "\n|||\n"
+
+
+def split_text(text: str, max_chars: int) -> List[str]:
+    """Split a text into pieces of at most ``max_chars``, at line breaks where possible."""
+    if len(text) <= max_chars:
+        return [text]
+    pieces, current = [], ""
+    for line in text.split("\n"):
+        while len(line) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(line[:max_chars])
+            line = line[max_chars:]
+        if current and len(current) + 1 + len(line) > max_chars:
+            pieces.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+class GoogleBackend:
+    """Google Translate through one reused ``deep_translator`` instance per thread.
+
+    ``GoogleTranslator.translate`` keeps the request parameters on the instance,
+    so an instance shared between threads could send one thread's text with
+    another's parameters and return the wrong translation.
+    """
+
+    name = "google"
+
+    def __init__(self, target: str = TRANSLATION_TARGET, max_chars: int = GOOGLE_MAX_CHARS):
+        from deep_translator import GoogleTranslator
+
+        self.translator_class = GoogleTranslator
+        self.target = target
+        self.max_chars = max_chars
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    @property
+    def translator(self):
+        if not hasattr(self.local, "translator"):
+            self.local.translator = self.translator_class(source="auto", target=self.target)
+        return self.local.translator
+
+    def translate(self, text: str) -> str:
+        with self.lock:
+            self.requests += 1
+        return self.translator.translate(text) or ""
+
+    def translate_batch(self, texts: List[str]) -> List[str]:
+        """Translate many texts, packing as many as fit into each request."""
+        # Long texts are split and translated piece by piece, then joined again
+        pieces, owners = [], []
+        for index, text in enumerate(texts):
+            for piece in split_text(text, self.max_chars):
+                pieces.append(piece)
+                owners.append(index)
+
+        translated_pieces = []
+        start = 0
+        while start < len(pieces):
+            end, size = start, 0
+            while end < len(pieces) and (end == start or size + len(BATCH_SEPARATOR) + len(pieces[end]) <= self.max_chars):
+                size += len(pieces[end]) + (len(BATCH_SEPARATOR) if end > start else 0)
+                end += 1
+            translated_pieces += self._translate_packed(pieces[start:end])
+            start = end
+
+        results = [[] for _ in texts]
+        for owner, piece in zip(owners, translated_pieces):
+            results[owner].append(piece)
+        return ["\n".join(parts) for parts in results]
+
+    def _translate_packed(self, pieces: List[str]) -> List[str]:
+        if len(pieces) == 1:
+            return [self.translate(pieces[0])]
+        translated = self.translate(BATCH_SEPARATOR.join(pieces)).split(BATCH_SEPARATOR.strip())
+        if len(translated) == len(pieces):
+            return [piece.strip() for piece in translated]
+        # The separator did not survive the translation; fall back to one request per piece
+        return [self.translate(piece) for piece in pieces]
+
+
+class OfflineBackend:
+    """Backend that never touches the network, for tests and offline runs.
+
+    Returns the text from ``translations`` when present, or the text itself.
+    """
+
+    name = "offline"
+
+    def __init__(self, translations: Optional[Dict[str, str]] = None):
+        self.translations = translations or {}
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def translate(self, text: str) -> str:
+        with self.lock:
+            self.requests += 1
+        return self.translations.get(text, text)
+
+    def translate_batch(self, texts: List[str]) -> List[str]:
+        with self.lock:
+            self.requests += 1
+        return [self.translations.get(text, text) for text in texts]
+
+
+def create_backend(name: str = TRANSLATION_BACKEND, target: str = TRANSLATION_TARGET):
+    if name == "google":
+        return GoogleBackend(target)
+    if name == "offline":
+        return OfflineBackend()
+    raise ValueError(f"Unknown translation backend: {name}")
+
+
+class Translator:
+    """Translation layer with a memory LRU and an optional SQLite cache in front of the backend.
+
+    Thread-safe: the ingestion pipeline calls it from several workers.
+    """
+
+    def __init__(self, backend=None, target: str = TRANSLATION_TARGET,
+                 cache_path: Optional[str] = TRANSLATION_CACHE_PATH, max_size: int = TRANSLATION_CACHE_SIZE,
+                 detector: Optional[LanguageDetector] = None, detect_language: bool = DETECT_LANGUAGE):
+        self.backend = backend if backend is not None else create_backend(target=target)
+        self.target = target
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+        self.detector = detector
+        if self.detector is None and detect_language:
+            self.detector = LanguageDetector.from_file()
+        if self.detector is not None and target not in self.detector.log_probabilities:
+            self.detector = None
+
+        self.disk = None
+        if cache_path:
+            self.disk = sqlite3.connect(cache_path, check_same_thread=False)
+            self.disk.execute("CREATE TABLE IF NOT EXISTS translations (key TEXT PRIMARY KEY, text TEXT NOT NULL)")
+            self.disk.commit()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.backend.name}\x00{self.target}\x00{text}".encode("utf-8")).hexdigest()
+
+    def translate(self, text: str) -> str:
+        """Translate one text."""
+        return self.translate_many([text])[0]
+
+    def translate_many(self, texts: List[str]) -> List[str]:
+        """Translate many texts, sending only the uncached ones to the backend in one batch."""
+        texts = list(texts)
+        keys = [self.key(text) for text in texts]
+        results = [self._lookup(key) if self._needs_translation(text) else text for key, text in zip(keys, texts)]
+
+        # Each distinct uncached text is translated once
+        missing = OrderedDict()
+        for key, text, result in zip(keys, texts, results):
+            if result is None:
+                missing.setdefault(key, text)
+        if missing:
+            translated = self.backend.translate_batch(list(missing.values()))
+            self._store_many(list(missing.keys()), translated)
+            by_key = dict(zip(missing.keys(), translated))
+            results = [by_key[key] if result is None else result for key, result in zip(keys, results)]
+        return results
+
+    def _needs_translation(self, text: str) -> bool:
+        if not text.strip():
+            return False
+        if self.detector is not None and self.detector.is_language(text, self.target):
+            with self.lock:
+                self.skipped += 1
+            return False
+        return True
+
+    def _lookup(self, key: str) -> Optional[str]:
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            if self.disk is not None:
+                row = self.disk.execute("SELECT text FROM translations WHERE key = ?", (key,)).fetchone()
+                if row:
+                    self._remember(key, row[0])
+                    self.disk_hits += 1
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def _store_many(self, keys: List[str], texts: List[str]):
+        with self.lock:
+            for key, text in zip(keys, texts):
+                self._remember(key, text)
+            if self.disk is not None:
+                self.disk.executemany("INSERT OR REPLACE INTO translations (key, text) VALUES (?, ?)",
+                                      list(zip(keys, texts)))
+                self.disk.commit()
+
+    def _remember(self, key: str, text: str):
+        self.entries[key] = text
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Return cache counters and the number of requests sent to the backend."""
+        with self.lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "backend": self.backend.name,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "skipped_target_language": self.skipped,
+                "backend_requests": self.backend.requests,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            }
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+
+
+_translator: Optional[Translator] = None
+_translator_lock = threading.Lock()
+
+
+def get_translator() -> Translator:
+    """Return the process-wide translator, creating it on first use."""
+    global _translator
+    with _translator_lock:
+        if _translator is None:
+            _translator = Translator()
+        return _translator
@@ -0,0 +1,148 @@
+"""Binary on-disk format for document embeddings.
+
+A vector file is a directory holding:
+
+- ``vectors.npy``: float32 matrix with one unit-length row per document,
+  opened with ``np.load(..., mmap_mode="r")`` so nothing is read up front;
+- ``payloads.jsonl``: one compact JSON document per row;
+- ``offsets.npy``: int64 byte offsets of each payload line, so row ``i`` is
+  read with a single seek;
+- ``meta.json``: row count, dimension, embedding model and revision, a
+  hash of the vectors and payloads that the indexes saved next to them
+  (payload filters, BM25) compare to detect a rewritten file.
+
+Convert an existing ``documents_embeddings.json`` with::
+
+    python -m instrit.vector_file documents_embeddings.json documents_embeddings
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from instrit.jsonl import dumps_line, loads
+from instrit.vector_search import normalize_rows
+
+VECTORS_FILE = "vectors.npy"
+PAYLOADS_FILE = "payloads.jsonl"
+OFFSETS_FILE = "offsets.npy"
+META_FILE = "meta.json"
+# Bytes hashed per read when computing the revision of a vector file
+REVISION_BLOCK = 1 << 20
+
+
+def file_revision(paths: Sequence[str]) -> str:
+    """Hex digest of the contents of ``paths``, in order."""
+    digest = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(REVISION_BLOCK), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def save_vector_file(directory: str, vectors: Sequence[Sequence[float]], payloads: Iterable[dict],
+                     model: Optional[str] = None):
+    """Write normalized vectors and their payloads to ``directory``."""
+    os.makedirs(directory, exist_ok=True)
+    matrix = normalize_rows(vectors)
+    np.save(os.path.join(directory, VECTORS_FILE), matrix)
+
+    offsets = [0]
+    with open(os.path.join(directory, PAYLOADS_FILE), "wb") as file:
+        for payload in payloads:
+            line = dumps_line(payload)
+            file.write(line)
+            offsets.append(offsets[-1] + len(line))
+    if len(offsets) - 1 != len(matrix):
+        raise ValueError(f"Got {len(matrix)} vectors but {len(offsets) - 1} payloads.")
+    np.save(os.path.join(directory, OFFSETS_FILE), np.asarray(offsets, dtype=np.int64))
+
+    revision = file_revision([os.path.join(directory, VECTORS_FILE), os.path.join(directory, PAYLOADS_FILE)])
+    with open(os.path.join(directory, META_FILE), "w", encoding="utf-8") as file:
+        json.dump({"count": int(matrix.shape[0]), "dim": int(matrix.shape[1]), "model": model,
+                   "revision": revision}, file)
+
+
+class VectorFile:
+    """Read-only, memory-mapped view of a vector file directory."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as file:
+            self.meta = json.load(file)
+        self.vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r")
+        self.offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode="r")
+        self.payload_file = open(os.path.join(directory, PAYLOADS_FILE), "rb")
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, META_FILE))
+
+    def __len__(self) -> int:
+        return int(self.meta["count"])
+
+    @property
+    def revision(self) -> str:
+        """Hash of the vectors and payloads; computed once for files saved without it."""
+        if not self.meta.get("revision"):
+            self.meta["revision"] = file_revision([os.path.join(self.directory, VECTORS_FILE),
+                                                   os.path.join(self.directory, PAYLOADS_FILE)])
+        return self.meta["revision"]
+
+    def payload(self, row: int) -> dict:
+        """Read the payload stored for one row."""
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        with self.lock:
+            self.payload_file.seek(start)
+            line = self.payload_file.read(end - start)
+        return loads(line)
+
+    def payloads(self, rows: Iterable[int]) -> List[dict]:
+        return [self.payload(int(row)) for row in rows]
+
+    def iter_payloads(self) -> Iterator[dict]:
+        """Iterate over every payload in row order without loading the whole file."""
+        with open(os.path.join(self.directory, PAYLOADS_FILE), "rb") as file:
+            for line in file:
+                yield loads(line)
+
+    def close(self):
+        self.payload_file.close()
+
+
+def convert_json(json_path: str, directory: str, model: Optional[str] = None):
+    """Convert a legacy ``documents_embeddings.json`` file into a vector file."""
+    with open(json_path, "r", encoding="utf-8") as file:
+        data = json.load(file)
+    vectors = [embedding["embedding"] for embedding in data["embeddings"]]
+    save_vector_file(directory, vectors, data["documents"], model=model)
+    return len(vectors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert documents_embeddings.json to the binary vector format.")
+    parser.add_argument("json_path", help="Legacy JSON file with 'documents' and 'embeddings'.")
+    parser.add_argument("directory", help="Output directory for the vector file.")
+    parser.add_argument("--model", default="nomic-embed-text", help="Embedding model used to build the vectors.")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    count = convert_json(args.json_path, args.directory, model=args.model)
+    print(f"[LOG] Converted {count} documents to '{args.directory}' in {time.perf_counter() - start_time:.2f}s.")
+
+    start_time = time.perf_counter()
+    vector_file = VectorFile(args.directory)
+    vector_file.payload(0)
+    print(f"[LOG] Reopened in {(time.perf_counter() - start_time) * 1000:.1f} ms.")
+    vector_file.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+from typing import Sequence
+
+import numpy as np
+
+
+def normalize_rows(vectors: Sequence[Sequence[float]]) -> np.ndarray:
+    """Return the vectors as a contiguous float32 matrix with unit-length rows.
+
+    With pre-normalized rows, cosine similarity against a normalized query is a
+    single matrix-vector product.
+    """
+    # Always a copy, so read-only inputs (memory-mapped files) are never normalized in place
+    matrix = np.array(vectors, dtype=np.float32, order="C")
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def normalize_query(vector: Sequence[float]) -> np.ndarray:
+    """Return the query vector as a float32 array with unit length."""
+    query = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(query)
+    return query / norm if norm else query
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return the indices of the ``k`` highest scores, best first.
+
+    ``argpartition`` selects the candidates in linear time, so only those ``k``
+    scores need to be sorted instead of the whole array.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(scores, -k)[-k:]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(scores[candidates])[::-1]]
+
+
+def cosine_top_k(matrix: np.ndarray, query: Sequence[float], k: int):
+    """Score a normalized matrix against a query and return (indices, scores) of the top ``k``."""
+    scores = matrix @ normalize_query(query)
+    indices = top_k_indices(scores, k)
+    return indices, scores[indices]
+
+
+def subset_top_k(matrix: np.ndarray, rows: np.ndarray, query: Sequence[float], k: int,
+                 dense_share: float = 0.1):
+    """Like :func:`cosine_top_k`, but only the given rows compete for the top ``k``.
+
+    ``rows`` should be sorted so a memory-mapped matrix is read in order. When
+    they cover more than ``dense_share`` of the matrix, one contiguous pass
+    over every row is cheaper than gathering them, so all rows are scored and
+    only the selected scores are kept.
+    """
+    query = normalize_query(query)
+    if len(rows) > dense_share * len(matrix):
+        scores = (matrix @ query)[rows]
+    else:
+        scores = np.asarray(matrix[rows], dtype=np.float32) @ query
+    best = top_k_indices(scores, k)
+    return rows[best], scores[best]
@@ -0,0 +1,60 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from instrit.ann_index import BruteForceIndex, IVFIndex
+
+
+# Embeddings reais formam grupos por assunto; vetores sintéticos em torno de centros imitam isso
+def dados_sinteticos(docs: int, dim: int, grupos: int, ruido: float, consultas: int, rng):
+    centros = rng.standard_normal((grupos, dim)).astype(np.float32)
+    vetores = centros[rng.integers(0, grupos, docs)] + ruido * rng.standard_normal((docs, dim)).astype(np.float32)
+    # Consultas próximas de documentos existentes, como perguntas sobre um trecho do manual
+    perguntas = vetores[rng.integers(0, docs, consultas)] + 1.0 * rng.standard_normal((consultas, dim)).astype(np.float32)
+    return vetores, perguntas
+
+
+def medir(indice, perguntas, top_k, **kwargs):
+    resultados = []
+    inicio = time.perf_counter()
+    for pergunta in perguntas:
+        resultados.append(indice.search(pergunta, top_k, **kwargs)[0])
+    return resultados, len(perguntas) / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k e consultas por segundo: busca exata x índice IVF.")
+    parser.add_argument("--docs", type=int, default=100_000, help="Número de documentos sintéticos.")
+    parser.add_argument("--dim", type=int, default=768, help="Dimensão dos embeddings.")
+    parser.add_argument("--grupos", type=int, default=1000, help="Assuntos (centros) dos dados sintéticos.")
+    parser.add_argument("--ruido", type=float, default=1.5, help="Dispersão dos documentos em torno dos centros.")
+    parser.add_argument("--consultas", type=int, default=200, help="Consultas medidas.")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--listas", type=int, default=0, help="Listas do IVF (0 = cerca de 4 * raiz de docs).")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(f"Gerando {args.docs} documentos sintéticos de dimensão {args.dim}...")
+    vetores, perguntas = dados_sinteticos(args.docs, args.dim, args.grupos, args.ruido, args.consultas, rng)
+
+    exato = BruteForceIndex().build(vetores)
+    inicio = time.perf_counter()
+    ivf = IVFIndex(n_lists=args.listas).build(vetores)
+    print(f"IVF construído em {time.perf_counter() - inicio:.1f} s com {len(ivf.centroids)} listas.")
+
+    referencia, qps_exato = medir(exato, perguntas, args.top_k)
+    print(f"{'índice':>16} {'recall@' + str(args.top_k):>9} {'consultas/s':>12} {'ganho':>7}")
+    print(f"{'exato':>16} {1.0:>9.3f} {qps_exato:>12.1f} {1.0:>6.1f}x")
+    for nprobe in args.nprobe:
+        resultados, qps = medir(ivf, perguntas, args.top_k, nprobe=nprobe)
+        recall = np.mean([len(set(r) & set(e)) / args.top_k for r, e in zip(resultados, referencia)])
+        print(f"{'ivf nprobe=' + str(nprobe):>16} {recall:>9.3f} {qps:>12.1f} {qps / qps_exato:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
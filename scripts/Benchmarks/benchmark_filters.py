@@ -0,0 +1,112 @@
+import argparse
+import os
+import sys
+import time
+import uuid
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, PointStruct, VectorParams
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from instrit.ann_index import BruteForceIndex
+from instrit.payload_filter import PayloadIndex, SearchFilter
+from instrit.vector_search import normalize_rows, subset_top_k, top_k_indices
+
+
+# Tags com frequência decrescente (Zipf): poucas muito comuns, muitas raras, como nos manuais
+def payloads_sinteticos(docs: int, tags: int, arquivos: int, rng):
+    pesos = 1.0 / np.arange(1, tags + 1)
+    tags_doc = rng.choice(tags, size=(docs, 2), p=pesos / pesos.sum())
+    arquivos_doc = rng.integers(0, arquivos, docs)
+    dias = rng.integers(0, 365, docs)
+    return [
+        {
+            "id": str(uuid.UUID(int=i + 1)),
+            "tags": sorted({f"tag{t}" for t in tags_doc[i]}),
+            "source": {"file_name": f"manual{arquivos_doc[i]}.pdf"},
+            "created_at": str(np.datetime64("2025-01-01") + np.timedelta64(int(dias[i]), "D")),
+        }
+        for i in range(docs)
+    ]
+
+
+def medir(funcao, perguntas) -> float:
+    inicio = time.perf_counter()
+    for pergunta in perguntas:
+        funcao(pergunta)
+    return (time.perf_counter() - inicio) / len(perguntas) * 1000
+
+
+def pos_filtro(vetores, permitidas, pergunta, k, fator=10):
+    # Alternativa ingênua: busca em tudo e descarta depois; pode devolver menos de k documentos
+    scores = vetores @ pergunta
+    candidatos = top_k_indices(scores, k * fator)
+    return candidatos[permitidas[candidatos]][:k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latência da busca filtrada por tag, arquivo e data.")
+    parser.add_argument("--docs", type=int, default=100_000, help="Documentos no caminho NumPy.")
+    parser.add_argument("--docs-qdrant", type=int, default=5_000, help="Documentos no Qdrant local.")
+    parser.add_argument("--dim", type=int, default=768, help="Dimensão dos embeddings.")
+    parser.add_argument("--tags", type=int, default=200, help="Tags distintas.")
+    parser.add_argument("--arquivos", type=int, default=100, help="Arquivos de origem distintos.")
+    parser.add_argument("--consultas", type=int, default=100, help="Consultas medidas por filtro.")
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    payloads = payloads_sinteticos(args.docs, args.tags, args.arquivos, rng)
+    vetores = normalize_rows(rng.standard_normal((args.docs, args.dim)).astype(np.float32))
+    perguntas = normalize_rows(rng.standard_normal((args.consultas, args.dim)).astype(np.float32))
+
+    inicio = time.perf_counter()
+    indice_payload = PayloadIndex.build(payloads)
+    print(f"Índice de payload de {args.docs} documentos construído em {time.perf_counter() - inicio:.2f} s.")
+
+    filtros = {
+        "sem filtro": None,
+        "seletivo (tag rara)": SearchFilter(tags=[f"tag{args.tags - 1}"]),
+        "seletivo (arquivo)": SearchFilter(source="manual7.pdf"),
+        "médio (1 mês)": SearchFilter(created_from="2025-03-01", created_to="2025-03-31"),
+        "amplo (tag comum)": SearchFilter(tags=["tag0"]),
+        "amplo (tag + ano)": SearchFilter(tags=["tag0", "tag1"], created_from="2025-01-01", created_to="2025-12-31"),
+    }
+
+    exato = BruteForceIndex(vetores)
+    print(f"\nCaminho NumPy ({args.docs} documentos), milissegundos por consulta:")
+    print(f"{'filtro':>22} {'documentos':>11} {'pré-filtro':>11} {'pós-filtro':>11}")
+    for nome, filtro in filtros.items():
+        linhas = indice_payload.rows(filtro)
+        if linhas is None:
+            ms = medir(lambda p: exato.search(p, args.top_k), perguntas)
+            print(f"{nome:>22} {args.docs:>11} {ms:>11.2f} {'-':>11}")
+            continue
+        ms_pre = medir(lambda p: (indice_payload.rows(filtro), subset_top_k(vetores, linhas, p, args.top_k)), perguntas)
+        permitidas = np.zeros(args.docs, dtype=bool)
+        permitidas[linhas] = True
+        ms_pos = medir(lambda p: pos_filtro(vetores, permitidas, p, args.top_k), perguntas)
+        print(f"{nome:>22} {len(linhas):>11} {ms_pre:>11.2f} {ms_pos:>11.2f}")
+
+    # Caminho Qdrant: o filtro vai junto da consulta e é aplicado antes do score
+    cliente = QdrantClient(":memory:")
+    cliente.create_collection("filtros", vectors_config=VectorParams(size=args.dim, distance=Distance.COSINE))
+    n = args.docs_qdrant
+    for inicio in range(0, n, 1000):
+        cliente.upsert("filtros", points=[
+            PointStruct(id=payloads[i]["id"], vector=vetores[i].tolist(), payload=payloads[i])
+            for i in range(inicio, min(n, inicio + 1000))
+        ])
+    print(f"\nCaminho Qdrant local ({n} documentos), milissegundos por consulta:")
+    print(f"{'filtro':>22} {'ms':>11}")
+    for nome, filtro in filtros.items():
+        consulta_filtro = filtro.to_qdrant() if filtro else None
+        ms = medir(lambda p: cliente.query_points("filtros", query=p.tolist(), query_filter=consulta_filtro,
+                                                  limit=args.top_k), perguntas[:20])
+        print(f"{nome:>22} {ms:>11.2f}")
+    cliente.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from instrit.lexical_index import BM25Index, LEXICAL_INDEX_FILE
+from instrit.retriever import Retriever
+from instrit.vector_file import VectorFile, save_vector_file
+
+PALAVRAS = ("lubrication oil grease bearing pump motor valve pressure hydraulic filter seal gear shaft belt "
+            "temperature vibration alignment coupling inspection cleaning viscosity contamination wear").split()
+
+
+def corpus_sintetico(docs: int, assuntos: int, dim: int, ruido: float, rng):
+    """
+    Documentos agrupados por assunto, cada um com um código próprio (peça, norma ou modelo).
+
+    O embedding representa o assunto, não o código: é assim que a busca vetorial
+    confunde "ISO VG 68" com qualquer parágrafo genérico sobre lubrificação.
+    """
+    centros = rng.standard_normal((assuntos, dim)).astype(np.float32)
+    assunto_doc = rng.integers(0, assuntos, docs)
+    vetores = centros[assunto_doc] + ruido * rng.standard_normal((docs, dim)).astype(np.float32)
+    palavras_assunto = [rng.choice(PALAVRAS, 6, replace=False) for _ in range(assuntos)]
+    # Vocabulário específico: cada documento também usa alguns termos menos comuns
+    termos = [f"term{t}" for t in range(5000)]
+
+    payloads, codigos, termos_doc = [], [], []
+    for i in range(docs):
+        codigo = [f"{rng.integers(1000, 9999)}-{rng.integers(1, 9)}RS", f"ISO VG {rng.integers(10, 999)}",
+                  f"WEG W{rng.integers(10, 99)}-{rng.integers(1, 200)} HP"][i % 3]
+        proprios = list(rng.choice(termos, 4, replace=False))
+        texto = " ".join(list(rng.choice(palavras_assunto[assunto_doc[i]], 40)) + proprios)
+        payloads.append({"id": str(uuid.UUID(int=i + 1)), "title": f"Section {i}",
+                         "tags": list(palavras_assunto[assunto_doc[i]][:2]),
+                         "created_at": "2025-01-11T12:51:29", "content": f"{texto} Use {codigo}."})
+        codigos.append(codigo)
+        termos_doc.append(proprios)
+    return centros, assunto_doc, vetores, payloads, codigos, palavras_assunto, termos_doc
+
+
+def buscar_com_exata(retriever: Retriever, consulta: str, embedding, top_k: int):
+    # Como em semantic_dataset_query: consultas só com códigos dispensam o embedding
+    linhas = retriever.exact(consulta, top_k)
+    return linhas if linhas is not None else retriever.search(consulta, embedding, top_k)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Busca híbrida (BM25 + vetores, RRF) x busca só vetorial.")
+    parser.add_argument("--docs", type=int, default=20_000)
+    parser.add_argument("--assuntos", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--ruido", type=float, default=0.5)
+    parser.add_argument("--consultas", type=int, default=300)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    centros, assunto_doc, vetores, payloads, codigos, palavras_assunto, termos_doc = corpus_sintetico(
+        args.docs, args.assuntos, args.dim, args.ruido, rng)
+
+    diretorio = tempfile.mkdtemp(prefix="hibrido_")
+    try:
+        save_vector_file(diretorio, vetores, payloads)
+        vector_file = VectorFile(diretorio)
+        inicio = time.perf_counter()
+        hibrido = Retriever.open(vector_file, "bruteforce", "hybrid")
+        print(f"Índices (BM25 + payload) de {args.docs} documentos construídos em {time.perf_counter() - inicio:.2f} s, "
+              f"BM25 com {len(hibrido.lexical_index.vocabulary)} termos "
+              f"({os.path.getsize(os.path.join(diretorio, LEXICAL_INDEX_FILE)) / 2 ** 20:.1f} MB).")
+        inicio = time.perf_counter()
+        BM25Index.open(diretorio, vector_file.iter_payloads, len(vector_file), vector_file.revision)
+        print(f"Reabertura do índice BM25: {(time.perf_counter() - inicio) * 1000:.1f} ms.")
+        vetorial = Retriever(vector_file, hibrido.index, hibrido.payload_index, hibrido.lexical_index, "vector")
+
+        # Consultas por código: o embedding só carrega o assunto do documento procurado
+        alvos = rng.integers(0, args.docs, args.consultas)
+        por_codigo = [(codigos[a], centros[assunto_doc[a]] + args.ruido * rng.standard_normal(args.dim), a) for a in alvos]
+        # Consultas em linguagem natural: palavras do assunto e um termo do documento, embedding perto dele
+        por_texto = [(" ".join(list(rng.choice(palavras_assunto[assunto_doc[a]], 3, replace=False)) + [termos_doc[a][0]]),
+                      vetores[a] + args.ruido * rng.standard_normal(args.dim), a) for a in alvos]
+
+        print(f"\n{'consultas':>10} {'busca':>22} {'acerto@' + str(args.top_k):>9} {'ms/consulta':>12} {'sem embedding':>14}")
+        for nome_consultas, consultas in (("código", por_codigo), ("texto", por_texto)):
+            for nome, executar in (
+                ("só vetorial", lambda q, e: vetorial.search(q, e, args.top_k)[0]),
+                ("híbrida (RRF)", lambda q, e: hibrido.search(q, e, args.top_k)[0]),
+                ("híbrida + exata", lambda q, e: buscar_com_exata(hibrido, q, e, args.top_k)),
+            ):
+                acertos = 0
+                inicio = time.perf_counter()
+                for consulta, embedding, alvo in consultas:
+                    acertos += alvo in executar(consulta, embedding)
+                ms = (time.perf_counter() - inicio) / len(consultas) * 1000
+                exatas = sum(hibrido.exact(c, args.top_k) is not None for c, _, _ in consultas) if "exata" in nome else 0
+                print(f"{nome_consultas:>10} {nome:>22} {acertos / len(consultas):>9.3f} {ms:>12.2f} "
+                      f"{exatas / len(consultas):>13.0%}")
+        vector_file.close()
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, PointStruct, VectorParams
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from instrit.qdrant_collection import PersistentCollection, dataset_revision
+
+MODELO = "nomic-embed-text"
+
+
+def documentos_sinteticos(quantidade: int, dim: int, rng):
+    documentos = [
+        {
+            "id": str(uuid.UUID(int=i + 1)),
+            "title": f"Seção {i}",
+            "tags": ["lubrificação" if i % 2 else "hidráulica"],
+            "created_at": "2025-01-11T12:51:29.921760",
+            "content": f"Trecho {i} do manual de manutenção. " * 20,
+            "summary": f"Resumo do trecho {i}",
+            "context": {"preceding_text": "", "following_text": ""},
+        }
+        for i in range(quantidade)
+    ]
+    vetores = rng.standard_normal((quantidade, dim)).astype(np.float32)
+    return documentos, vetores
+
+
+def pontos(documentos, vetores):
+    return (PointStruct(id=doc["id"], vector=vetor.tolist(), payload=doc) for doc, vetor in zip(documentos, vetores))
+
+
+def inicio_em_memoria(documentos, vetores) -> float:
+    # Comportamento anterior: coleção em memória recriada e preenchida a cada início
+    inicio = time.perf_counter()
+    cliente = QdrantClient(":memory:")
+    cliente.create_collection("chatbot", vectors_config=VectorParams(size=vetores.shape[1], distance=Distance.COSINE))
+    cliente.upsert(collection_name="chatbot", points=list(pontos(documentos, vetores)))
+    duracao = time.perf_counter() - inicio
+    cliente.close()
+    return duracao
+
+
+def inicio_persistente(caminho: str, documentos, vetores) -> float:
+    inicio = time.perf_counter()
+    colecao = PersistentCollection(QdrantClient(path=caminho))
+    revisao = dataset_revision(documentos, MODELO)
+    if not colecao.is_current(revisao):
+        colecao.sync(pontos(documentos, vetores), [doc["id"] for doc in documentos], vetores.shape[1], revisao)
+    duracao = time.perf_counter() - inicio
+    colecao.close()
+    return duracao
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de início: coleção Qdrant em memória x persistente em disco.")
+    parser.add_argument("--docs", type=int, default=5000, help="Número de documentos sintéticos.")
+    parser.add_argument("--dim", type=int, default=768, help="Dimensão dos embeddings.")
+    args = parser.parse_args()
+
+    documentos, vetores = documentos_sinteticos(args.docs, args.dim, np.random.default_rng(42))
+    caminho = tempfile.mkdtemp(prefix="qdrant_")
+    try:
+        print(f"{'início':>36} {'segundos':>9}")
+        print(f"{'em memória (antes, todo início)':>36} {inicio_em_memoria(documentos, vetores):>9.2f}")
+        print(f"{'persistente, primeira execução':>36} {inicio_persistente(caminho, documentos, vetores):>9.2f}")
+        print(f"{'persistente, reabertura':>36} {inicio_persistente(caminho, documentos, vetores):>9.2f}")
+        documentos[0] = {**documentos[0], "content": "Trecho alterado."}
+        print(f"{'persistente, 1 documento alterado':>36} {inicio_persistente(caminho, documentos, vetores):>9.2f}")
+    finally:
+        shutil.rmtree(caminho, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
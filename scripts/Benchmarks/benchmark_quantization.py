@@ -0,0 +1,70 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from benchmark_ann import dados_sinteticos, medir
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from instrit.ann_index import BruteForceIndex
+from instrit.quantization import PQIndex, ScalarQuantizedIndex
+from instrit.vector_search import normalize_rows
+
+# Um float do Python ocupa 24 bytes, mais 8 do ponteiro na lista
+BYTES_FLOAT_PYTHON = 32
+
+
+def mb_por_milhao(bytes_por_vetor: float) -> float:
+    return bytes_por_vetor * 1_000_000 / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memória por milhão de vetores e perda de recall da quantização.")
+    parser.add_argument("--docs", type=int, default=100_000, help="Número de documentos sintéticos.")
+    parser.add_argument("--dim", type=int, default=768, help="Dimensão dos embeddings.")
+    parser.add_argument("--grupos", type=int, default=1000, help="Assuntos (centros) dos dados sintéticos.")
+    parser.add_argument("--ruido", type=float, default=1.5, help="Dispersão dos documentos em torno dos centros.")
+    parser.add_argument("--consultas", type=int, default=200, help="Consultas medidas.")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--subespacos", type=int, default=96, help="Subespaços do PQ (1 byte cada por vetor).")
+    parser.add_argument("--candidatos", type=int, default=50, help="Candidatos reordenados com os vetores completos.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(f"Gerando {args.docs} documentos sintéticos de dimensão {args.dim}...")
+    vetores, perguntas = dados_sinteticos(args.docs, args.dim, args.grupos, args.ruido, args.consultas, rng)
+    vetores = normalize_rows(vetores)
+
+    exato = BruteForceIndex(vetores)
+    indices = {}
+    for nome, indice in [("int8", ScalarQuantizedIndex(args.candidatos)),
+                         (f"pq m={args.subespacos}", PQIndex(args.subespacos, args.candidatos))]:
+        inicio = time.perf_counter()
+        indices[nome] = indice.build(vetores)
+        indice.rerank_vectors = vetores
+        print(f"Índice {nome} construído em {time.perf_counter() - inicio:.1f} s.")
+
+    print(f"\nMemória por vetor de dimensão {args.dim}:")
+    print(f"{'formato':>14} {'bytes/vetor':>12} {'MB/milhão':>10} {'redução':>8}")
+    bytes_float32 = args.dim * 4
+    linhas = [("lista Python", args.dim * BYTES_FLOAT_PYTHON), ("float32", bytes_float32)]
+    linhas += [(nome, indice.memory_bytes() / len(indice)) for nome, indice in indices.items()]
+    for nome, bytes_por_vetor in linhas:
+        print(f"{nome:>14} {bytes_por_vetor:>12.1f} {mb_por_milhao(bytes_por_vetor):>10.1f} "
+              f"{bytes_float32 / bytes_por_vetor:>7.1f}x")
+
+    referencia, qps_exato = medir(exato, perguntas, args.top_k)
+    print(f"\n{'índice':>24} {'recall@' + str(args.top_k):>9} {'consultas/s':>12}")
+    print(f"{'exato float32':>24} {1.0:>9.3f} {qps_exato:>12.1f}")
+    for nome, indice in indices.items():
+        for reordenar in (False, True):
+            resultados, qps = medir(indice, perguntas, args.top_k, rerank=reordenar)
+            recall = np.mean([len(set(r) & set(e)) / args.top_k for r, e in zip(resultados, referencia)])
+            rotulo = f"{nome} + reordenação" if reordenar else nome
+            print(f"{rotulo:>24} {recall:>9.3f} {qps:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
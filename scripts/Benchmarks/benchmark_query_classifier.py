@@ -0,0 +1,71 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from instrit.embedding_client import EmbeddingClient
+from instrit.query_classifier import QueryClassifier, classify_with_llm, load_examples
+
+load_dotenv()
+OPENROUTER_KEY = os.getenv("OPENROUTER_KEY")
+MODEL = os.getenv("MODEL", "meta-llama/llama-3.2-3b-instruct:free")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara o classificador local com o classificador via LLM.")
+    parser.add_argument("--fracao-teste", type=float, default=0.3, help="Fração dos exemplos separada para teste.")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--sem-llm", action="store_true", help="Não chama o LLM (sem concordância nem reserva).")
+    args = parser.parse_args()
+
+    queries, labels = load_examples()
+    indices = list(range(len(queries)))
+    random.Random(args.semente).shuffle(indices)
+    corte = int(len(indices) * (1 - args.fracao_teste))
+    treino, teste = indices[:corte], indices[corte:]
+
+    embedding_client = EmbeddingClient()
+    classifier = QueryClassifier.train([queries[i] for i in treino], [labels[i] for i in treino], embedding_client)
+    print(f"Treinado com {len(treino)} exemplos; avaliando {len(teste)} perguntas separadas.")
+
+    embeddings = embedding_client.embed_many([queries[i] for i in teste])
+    tempos_local, tempos_llm = [], []
+    acertos_local = acertos_final = concordancias = comparacoes = reservas = 0
+
+    for i, embedding in zip(teste, embeddings):
+        inicio = time.perf_counter()
+        probabilidade = classifier.probability(embedding)
+        decisao = classifier.classify(embedding)
+        tempos_local.append(time.perf_counter() - inicio)
+        acertos_local += (probabilidade >= 0.5) == labels[i]
+
+        resposta_llm = None
+        if not args.sem_llm:
+            inicio = time.perf_counter()
+            resposta_llm = classify_with_llm(queries[i], OPENROUTER_KEY, MODEL)
+            tempos_llm.append(time.perf_counter() - inicio)
+            comparacoes += 1
+            concordancias += (probabilidade >= 0.5) == resposta_llm
+
+        if decisao is None:
+            reservas += 1
+            decisao = resposta_llm if resposta_llm is not None else probabilidade >= 0.5
+        acertos_final += decisao == labels[i]
+
+    total = len(teste)
+    print(f"Latência local (mediana): {np.median(tempos_local) * 1000:.3f} ms por pergunta")
+    if tempos_llm:
+        print(f"Latência LLM (mediana):   {np.median(tempos_llm) * 1000:.1f} ms por pergunta")
+        print(f"Concordância local x LLM: {concordancias / comparacoes:.1%}")
+    print(f"Acurácia local (limiar 0.5): {acertos_local / total:.1%}")
+    print(f"Acurácia com reserva no LLM: {acertos_final / total:.1%}")
+    print(f"Perguntas enviadas ao LLM por baixa confiança: {reservas}/{total}")
+
+
+if __name__ == "__main__":
+    main()
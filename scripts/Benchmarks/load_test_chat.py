@@ -0,0 +1,122 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+from stub_servers import criar_ollama_falso, criar_openrouter_falso, iniciar_processo
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Chat_server"))
+from instrit.vector_file import save_vector_file
+
+PORTA_OLLAMA = 11510
+PORTA_OPENROUTER = 11511
+PORTA_API = 8101
+
+
+# Índice falso com documentos curtos, só para a busca ter o que percorrer
+def criar_indice(diretorio: str, documentos: int, dimensao: int):
+    rng = np.random.default_rng(0)
+    vetores = rng.standard_normal((documentos, dimensao)).astype(np.float32)
+    payloads = [{"id": str(i), "content": f"Documento técnico {i} sobre manutenção de máquinas."}
+                for i in range(documentos)]
+    save_vector_file(diretorio, vetores, payloads, model="nomic-embed-text")
+
+
+async def mensagem(http: httpx.AsyncClient, url: str, session_id: str, pergunta: str, stream: bool):
+    """Envia uma mensagem e retorna (latência total, tempo até o primeiro token)."""
+    payload = {"pergunta": pergunta, "session_id": session_id, "stream": stream}
+    inicio = time.perf_counter()
+    if not stream:
+        response = await http.post(url, json=payload)
+        response.raise_for_status()
+        total = time.perf_counter() - inicio
+        return total, total
+
+    primeiro_token = None
+    async with http.stream("POST", url, json=payload) as response:
+        response.raise_for_status()
+        async for linha in response.aiter_lines():
+            if linha.startswith("event: error"):
+                raise RuntimeError("Erro no stream do servidor")
+            if primeiro_token is None and linha.startswith("data:") and '"token"' in linha:
+                primeiro_token = time.perf_counter() - inicio
+    return time.perf_counter() - inicio, primeiro_token
+
+
+async def rodar_sessoes(url: str, sessoes: int, turnos: int, stream: bool):
+    latencias, primeiros_tokens = [], []
+
+    # Cada sessão conversa em sequência; as sessões rodam ao mesmo tempo
+    async def sessao(http: httpx.AsyncClient, indice: int):
+        for turno in range(turnos):
+            total, primeiro = await mensagem(http, url, f"sessao-{indice}",
+                                             f"Pergunta {turno} da sessão {indice} sobre lubrificação?", stream)
+            latencias.append(total)
+            primeiros_tokens.append(primeiro)
+
+    limites = httpx.Limits(max_connections=sessoes, max_keepalive_connections=sessoes)
+    inicio = time.perf_counter()
+    async with httpx.AsyncClient(timeout=120, limits=limites) as http:
+        await asyncio.gather(*(sessao(http, s) for s in range(sessoes)))
+    return sessoes * turnos / (time.perf_counter() - inicio), latencias, primeiros_tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do servidor de chat com sessões simultâneas.")
+    parser.add_argument("--sessoes", type=int, nargs="+", default=[1, 10, 50, 100])
+    parser.add_argument("--turnos", type=int, default=5, help="Mensagens enviadas por sessão.")
+    parser.add_argument("--stream", action="store_true", help="Usa respostas em streaming (mede o primeiro token).")
+    parser.add_argument("--latencia-embedding", type=float, default=0.02)
+    parser.add_argument("--primeiro-token", type=float, default=0.3, help="Latência até o primeiro token do LLM falso.")
+    parser.add_argument("--latencia-token", type=float, default=0.01, help="Intervalo entre tokens do LLM falso.")
+    parser.add_argument("--tokens", type=int, default=50, help="Tokens por resposta do LLM falso.")
+    parser.add_argument("--documentos", type=int, default=10000, help="Documentos no índice falso.")
+    parser.add_argument("--dimensao", type=int, default=768)
+    parser.add_argument("--max-sessoes", type=int, default=1000, help="Limite de sessões do servidor (LRU).")
+    args = parser.parse_args()
+
+    # Os servidores falsos precisam estar configurados antes de subir a aplicação
+    os.environ["OLLAMA_URL"] = f"http://127.0.0.1:{PORTA_OLLAMA}"
+    os.environ["OPENROUTER_API_URL"] = f"http://127.0.0.1:{PORTA_OPENROUTER}/api/v1/chat/completions"
+    os.environ["EMBEDDING_CONCURRENCY"] = str(max(args.sessoes))
+    os.environ["LLM_CONCURRENCY"] = str(max(args.sessoes))
+    os.environ["CLASSIFIER_PATH"] = ""
+    # Tradução local, sem rede e sem cache em disco: o teste mede só o servidor
+    os.environ["TRANSLATION_BACKEND"] = "offline"
+    os.environ["TRANSLATION_CACHE_PATH"] = ""
+    from chat_server import criar_app
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        indice = os.path.join(diretorio, "documents_embeddings")
+        criar_indice(indice, args.documentos, args.dimensao)
+
+        iniciar_processo(criar_ollama_falso, PORTA_OLLAMA, latencia=args.latencia_embedding, dimensao=args.dimensao)
+        iniciar_processo(criar_openrouter_falso, PORTA_OPENROUTER, latencia_primeiro_token=args.primeiro_token,
+                         latencia_token=args.latencia_token, tokens=args.tokens)
+        servidor = iniciar_processo(criar_app, PORTA_API, vector_file_path=indice, max_sessions=args.max_sessoes)
+        url = f"http://127.0.0.1:{PORTA_API}/chat"
+
+        resposta_llm = args.primeiro_token + args.latencia_token * (args.tokens - 1)
+        print(f"Embedding falso: {args.latencia_embedding * 1000:.0f} ms | "
+              f"LLM falso: {args.primeiro_token * 1000:.0f} ms até o primeiro token, {resposta_llm * 1000:.0f} ms no total")
+        print(f"{'sessões':>8} {'msg/s':>8} {'p50 (ms)':>9} {'p99 (ms)':>9} {'TTFT p50':>9} {'TTFT p99':>9}")
+        for sessoes in args.sessoes:
+            vazao, latencias, primeiros = asyncio.run(rodar_sessoes(url, sessoes, args.turnos, args.stream))
+            p50, p99 = np.percentile(latencias, [50, 99]) * 1000
+            t50, t99 = np.percentile(primeiros, [50, 99]) * 1000
+            print(f"{sessoes:>8} {vazao:>8.1f} {p50:>9.1f} {p99:>9.1f} {t50:>9.1f} {t99:>9.1f}")
+
+        estatisticas = httpx.get(f"http://127.0.0.1:{PORTA_API}/stats").json()
+        print(f"Sessões no servidor: {json.dumps(estatisticas['sessions'])}")
+        servidor.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+import numpy as np
+
+from stub_servers import criar_ollama_falso, iniciar_processo, iniciar_servidor
+
+PORTA_OLLAMA = 11500
+PORTA_API = 8100
+
+
+async def rodar_clientes(url: str, clientes: int, requisicoes_por_cliente: int):
+    latencias = []
+
+    async def cliente(http: httpx.AsyncClient, indice: int):
+        for i in range(requisicoes_por_cliente):
+            payload = {
+                "consultas": [f"consulta {indice}-{i}"],
+                "passagens": [f"passagem {indice}-{i}-{j}" for j in range(3)],
+            }
+            inicio = time.perf_counter()
+            response = await http.post(url, json=payload)
+            response.raise_for_status()
+            latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    async with httpx.AsyncClient(timeout=60) as http:
+        await asyncio.gather(*(cliente(http, c) for c in range(clientes)))
+    return clientes * requisicoes_por_cliente / (time.perf_counter() - inicio), latencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do /calcular-similaridades contra um Ollama falso.")
+    parser.add_argument("--latencia", type=float, default=0.05, help="Latência do servidor falso, em segundos.")
+    parser.add_argument("--clientes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--requisicoes", type=int, default=10, help="Requisições por cliente.")
+    parser.add_argument("--dimensao", type=int, default=768, help="Dimensão dos embeddings falsos.")
+    parser.add_argument("--concorrencia-embeddings", type=int, default=32,
+                        help="Limite de requisições simultâneas do servidor ao Ollama.")
+    args = parser.parse_args()
+
+    # O servidor falso precisa estar configurado antes de importar a aplicação
+    os.environ["OLLAMA_URL"] = f"http://127.0.0.1:{PORTA_OLLAMA}"
+    os.environ["EMBEDDING_CONCURRENCY"] = str(args.concorrencia_embeddings)
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Semantic_query"))
+    from semantic_query import app
+
+    iniciar_processo(criar_ollama_falso, PORTA_OLLAMA, latencia=args.latencia, dimensao=args.dimensao)
+    iniciar_servidor(app, PORTA_API)
+    url = f"http://127.0.0.1:{PORTA_API}/calcular-similaridades"
+
+    print(f"Latência do Ollama falso: {args.latencia * 1000:.0f} ms")
+    print(f"{'clientes':>8} {'req/s':>8} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for clientes in args.clientes:
+        vazao, latencias = asyncio.run(rodar_clientes(url, clientes, args.requisicoes))
+        p50, p99 = np.percentile(latencias, [50, 99]) * 1000
+        print(f"{clientes:>8} {vazao:>8.1f} {p50:>9.1f} {p99:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import socket
+import threading
+import time
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+# Embedding determinístico a partir do texto, para que resultados repetidos sejam comparáveis
+def embedding_falso(texto: str, dimensao: int) -> list:
+    semente = int.from_bytes(hashlib.sha256(texto.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(semente).standard_normal(dimensao).tolist()
+
+
+# Servidor falso compatível com /api/embed e /api/embeddings do Ollama, com latência artificial
+def criar_ollama_falso(latencia: float = 0.05, dimensao: int = 768) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/api/embed")
+    async def embed(request: Request):
+        dados = await request.json()
+        entradas = dados["input"] if isinstance(dados["input"], list) else [dados["input"]]
+        await asyncio.sleep(latencia)
+        return JSONResponse({"model": dados["model"], "embeddings": [embedding_falso(t, dimensao) for t in entradas]})
+
+    @app.post("/api/embeddings")
+    async def embeddings(request: Request):
+        dados = await request.json()
+        await asyncio.sleep(latencia)
+        return JSONResponse({"embedding": embedding_falso(dados["prompt"], dimensao)})
+
+    return app
+
+
+# Servidor falso compatível com a API de chat do OpenRouter (com e sem "stream": true).
+# A resposta tem `tokens` trechos: o primeiro chega após `latencia_primeiro_token` e os demais a cada `latencia_token`
+def criar_openrouter_falso(latencia_primeiro_token: float = 0.3, latencia_token: float = 0.02,
+                           tokens: int = 50) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/api/v1/chat/completions")
+    async def chat(request: Request):
+        dados = await request.json()
+        trechos = [f"palavra{i} " for i in range(tokens)]
+
+        if not dados.get("stream"):
+            await asyncio.sleep(latencia_primeiro_token + latencia_token * (tokens - 1))
+            return JSONResponse({"choices": [{"message": {"role": "assistant", "content": "".join(trechos)}}]})
+
+        async def gerar():
+            yield ": OPENROUTER PROCESSING\n\n"
+            await asyncio.sleep(latencia_primeiro_token)
+            for i, trecho in enumerate(trechos):
+                if i:
+                    await asyncio.sleep(latencia_token)
+                yield f"data: {json.dumps({'choices': [{'delta': {'content': trecho}}]})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(gerar(), media_type="text/event-stream")
+
+    return app
+
+
+# Sobe uma aplicação ASGI com uvicorn em uma thread de fundo e espera ela ficar pronta
+def iniciar_servidor(app, porta: int) -> uvicorn.Server:
+    config = uvicorn.Config(app, host="127.0.0.1", port=porta, log_level="warning")
+    servidor = uvicorn.Server(config)
+    threading.Thread(target=servidor.run, daemon=True).start()
+    while not servidor.started:
+        time.sleep(0.05)
+    return servidor
+
+
+def _rodar_fabrica(fabrica, porta: int, kwargs: dict):
+    uvicorn.run(fabrica(**kwargs), host="127.0.0.1", port=porta, log_level="warning")
+
+
+# Sobe um servidor falso em outro processo, para não disputar o GIL com o código medido
+def iniciar_processo(fabrica, porta: int, **kwargs) -> multiprocessing.Process:
+    processo = multiprocessing.Process(target=_rodar_fabrica, args=(fabrica, porta, kwargs), daemon=True)
+    processo.start()
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", porta), timeout=0.1).close()
+            return processo
+        except OSError:
+            time.sleep(0.05)
@@ -0,0 +1,209 @@
+import asyncio
+import json
+import os
+import sys
+import uuid
+from contextlib import asynccontextmanager
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from instrit.ann_index import VECTOR_INDEX
+from instrit.context_builder import CONTEXT_TOKEN_BUDGET, ContextBuilder
+from instrit.embedding_cache import EmbeddingCache
+from instrit.embedding_client import AsyncEmbeddingClient, EmbeddingError
+from instrit.llm_client import AsyncChatClient, LLMError, StreamStats
+from instrit.prompts import CHAT_INSTRUCTIONS, RAG_INSTRUCTIONS, load_system_prompt
+from instrit.query_classifier import QueryClassifier, classifier_path
+from instrit.retriever import Retriever
+from instrit.session_store import MAX_SESSIONS, SESSION_IDLE_TTL, SessionStore
+from instrit.translator import get_translator
+from instrit.vector_file import VectorFile, convert_json
+
+# Carrega variáveis de ambiente do arquivo .env
+load_dotenv()
+
+# Parâmetros do modelo
+MODEL = os.getenv("MODEL", "meta-llama/llama-3.2-3b-instruct:free")
+MAX_TOKENS = int(os.getenv("MAX_TOKENS", 600))
+TEMPERATURE = float(os.getenv("TEMPERATURE", 0.3))
+
+# Índice compartilhado: formato binário mapeado em memória (convertido do JSON antigo na primeira execução)
+VECTOR_FILE_PATH = os.getenv("VECTOR_FILE_PATH", "documents_embeddings")
+EMBEDDING_FILE_PATH = os.getenv("EMBEDDING_FILE_PATH", "documents_embeddings.json")
+TOP_K = int(os.getenv("RAG_TOP_K", 3))
+
+# Classificador local opcional; sem ele (ou sem confiança), toda pergunta consulta a base
+CLASSIFIER_PATH = os.getenv("CLASSIFIER_PATH", "query_classifier.npz")
+
+# Intervalo (segundos) da limpeza das sessões ociosas
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", 60))
+
+
+class ChatSession:
+    """Memória de uma sessão: apenas os turnos, mais um lock para atender uma mensagem por vez."""
+
+    def __init__(self, system_prompt: dict, token_budget: int):
+        self.context = ContextBuilder(system_prompt, token_budget)
+        self.lock = asyncio.Lock()
+
+
+class Mensagem(BaseModel):
+    pergunta: str
+    session_id: Optional[str] = None
+    stream: bool = False
+
+
+def abrir_indice(vector_file_path: str, embedding_file_path: str) -> VectorFile:
+    if not VectorFile.exists(vector_file_path):
+        print(f"[LOG] Convertendo '{embedding_file_path}' para o formato binário em '{vector_file_path}'...")
+        convert_json(embedding_file_path, vector_file_path)
+    return VectorFile(vector_file_path)
+
+
+def carregar_classificador(path: str, model: str) -> Optional[QueryClassifier]:
+    # Caminho vazio desativa o classificador
+    if not path or not os.path.exists(classifier_path(path)):
+        return None
+    classifier = QueryClassifier.load(path)
+    if classifier.embedding_model != model:
+        print(f"[LOG] Classificador '{path}' foi treinado para outro modelo de embedding. Ignorando.")
+        return None
+    return classifier
+
+
+def evento_sse(dados: dict, evento: str = None) -> str:
+    linhas = f"event: {evento}\n" if evento else ""
+    return linhas + f"data: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+
+def criar_app(vector_file_path: str = VECTOR_FILE_PATH, embedding_file_path: str = EMBEDDING_FILE_PATH,
+              max_sessions: int = MAX_SESSIONS, idle_ttl: float = SESSION_IDLE_TTL,
+              token_budget: int = CONTEXT_TOKEN_BUDGET) -> FastAPI:
+    """
+    Servidor de chat com várias sessões simultâneas em um único processo.
+
+    O índice de documentos, o cache de embeddings e os pools de conexão (Ollama e OpenRouter)
+    são compartilhados por todas as sessões; cada sessão guarda só os próprios turnos.
+    """
+
+    # Recursos compartilhados, abertos e fechados junto com a aplicação
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        app.state.system_prompt = load_system_prompt()
+        app.state.vector_file = abrir_indice(vector_file_path, embedding_file_path)
+        # Índice vetorial, filtros de payload e BM25, salvos junto do arquivo de vetores
+        app.state.retriever = Retriever.open(app.state.vector_file, VECTOR_INDEX)
+        # Tradutor compartilhado, com cache das traduções; a base e o classificador estão em inglês
+        app.state.translator = get_translator()
+        app.state.embedding_cache = EmbeddingCache()
+        app.state.embedding_client = AsyncEmbeddingClient(cache=app.state.embedding_cache)
+        app.state.chat_client = AsyncChatClient()
+        app.state.classifier = carregar_classificador(CLASSIFIER_PATH, app.state.embedding_client.model)
+        app.state.sessions = SessionStore(
+            lambda: ChatSession(app.state.system_prompt, token_budget), max_sessions, idle_ttl
+        )
+        print(f"[LOG] Índice {VECTOR_INDEX} ({app.state.retriever.mode}) com {len(app.state.retriever.index)} documentos. "
+              f"Até {max_sessions} sessões, expiradas após {idle_ttl:.0f}s sem uso.")
+
+        async def limpar_sessoes():
+            while True:
+                await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+                removidas = app.state.sessions.expire_idle()
+                if removidas:
+                    print(f"[LOG] {removidas} sessões ociosas expiradas.")
+
+        limpeza = asyncio.create_task(limpar_sessoes())
+        yield
+        limpeza.cancel()
+        await app.state.embedding_client.aclose()
+        await app.state.chat_client.aclose()
+        app.state.embedding_cache.close()
+        app.state.vector_file.close()
+
+    app = FastAPI(lifespan=lifespan)
+
+    async def montar_mensagens(state, session: ChatSession, pergunta: str) -> Tuple[str, list]:
+        """Traduz a pergunta e monta as mensagens; retorna (pergunta traduzida, mensagens)."""
+        # A tradução pode ir à rede e ao SQLite: roda em uma thread para não travar o event loop
+        pergunta = await asyncio.to_thread(state.translator.translate, pergunta)
+
+        # O embedding da pergunta serve para o classificador e para a busca
+        embedding = await state.embedding_client.embed(pergunta)
+        precisa_contexto = True
+        if state.classifier is not None:
+            decisao = state.classifier.classify(embedding)
+            precisa_contexto = decisao is not False
+
+        if not precisa_contexto:
+            return pergunta, session.context.build(pergunta, CHAT_INSTRUCTIONS)
+
+        top_indices, _ = state.retriever.search(pergunta, embedding, TOP_K)
+        documentos = [state.vector_file.payload(i)["content"] for i in top_indices]
+        return pergunta, session.context.build(pergunta, RAG_INSTRUCTIONS, documentos)
+
+    def montar_payload(mensagens: list) -> dict:
+        return {"model": MODEL, "messages": mensagens, "max_tokens": MAX_TOKENS, "temperature": TEMPERATURE}
+
+    @app.post("/chat")
+    async def chat(dados: Mensagem, request: Request):
+        state = request.app.state
+        session_id = dados.session_id or str(uuid.uuid4())
+        session = state.sessions.get(session_id)
+
+        if not dados.stream:
+            # Uma mensagem por vez em cada sessão, para a memória seguir a ordem da conversa
+            async with session.lock:
+                try:
+                    pergunta, mensagens = await montar_mensagens(state, session, dados.pergunta)
+                    stats = StreamStats()
+                    resposta = await state.chat_client.complete(montar_payload(mensagens), stats)
+                except (EmbeddingError, LLMError) as e:
+                    print(f"[ERROR] {e}")
+                    raise HTTPException(status_code=502, detail=str(e))
+                session.context.add_turn(pergunta, resposta)
+            return {"session_id": session_id, "resposta": resposta, **stats.as_dict()}
+
+        async def gerar():
+            async with session.lock:
+                stats = StreamStats()
+                trechos = []
+                try:
+                    pergunta, mensagens = await montar_mensagens(state, session, dados.pergunta)
+                    async for trecho in state.chat_client.stream(montar_payload(mensagens), stats):
+                        trechos.append(trecho)
+                        yield evento_sse({"token": trecho})
+                except Exception as e:
+                    print(f"[ERROR] {e}")
+                    yield evento_sse({"detail": str(e)}, "error")
+                    return
+                session.context.add_turn(pergunta, "".join(trechos))
+                yield evento_sse({"session_id": session_id, **stats.as_dict()}, "done")
+
+        return StreamingResponse(gerar(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Session-Id": session_id})
+
+    @app.delete("/sessions/{session_id}")
+    async def encerrar_sessao(session_id: str, request: Request):
+        if not request.app.state.sessions.delete(session_id):
+            raise HTTPException(status_code=404, detail="Sessão não encontrada.")
+        return {"session_id": session_id, "encerrada": True}
+
+    @app.get("/stats")
+    async def estatisticas(request: Request):
+        return {
+            "sessions": request.app.state.sessions.stats(),
+            "embedding_cache": request.app.state.embedding_cache.stats(),
+            "translations": request.app.state.translator.stats(),
+        }
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(criar_app(), host="0.0.0.0", port=8001)
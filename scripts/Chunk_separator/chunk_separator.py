@@ -1,15 +1,39 @@
+import argparse
 import fitz  # PyMuPDF
+import hashlib
 import json
 import re
 import os
+import sys
 import time  # Importa o módulo de tempo
-from typing import List
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from typing import Iterator, List, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from instrit.jsonl import OUTPUT_FORMATS, RecordWriter, record_path
 
 # Define os diretórios de entrada e saída
 INPUT_DIRECTORY = "input_files"
 OUTPUT_DIRECTORY = "output_files"
 os.makedirs(OUTPUT_DIRECTORY, exist_ok=True)  # Cria o diretório output_files se não existir
 
+LIMITE_CARACTERES = 500  # Define o limite de caracteres por chunk
+PAGINAS_POR_TAREFA = 16  # Páginas de um PDF extraídas por tarefa no modo com vários processos
+FORMATO_SAIDA = "json"  # "json": lista indentada por PDF; "jsonl": um chunk por linha, gravado assim que é extraído
+
+# Expressões usadas na limpeza e na divisão do texto
+REGEX_FIM_DE_FRASE = r'(?<=[.!?]) +'
+REGEX_ESPACOS = r'\s+'
+REGEX_CARACTERES_ESPECIAIS = r'[^\w\s.,!?-]'
+REGEX_NUMERO_PAGINA = r'Página\s+\d+|Page\s+\d+'
+
+# Manifesto da última execução: hash, tamanho e data de cada PDF e as configurações acima.
+# Só PDFs novos ou alterados são extraídos de novo; mudar uma configuração refaz todos.
+MANIFEST_FILE = "chunk_manifest.json"
+MANIFEST_VERSION = 1
+
 # Remove arquivos antigos do diretório de saída
 def limpar_diretorio_saida():
     for old_file_name in os.listdir(OUTPUT_DIRECTORY):
@@ -20,7 +44,7 @@ def limpar_diretorio_saida():
 
 # Função para dividir texto em chunks respeitando frases
 def dividir_em_chunks_avancado(texto: str, limite: int) -> List[str]:
-    frases = re.split(r'(?<=[.!?]) +', texto)
+    frases = re.split(REGEX_FIM_DE_FRASE, texto)
     chunks, chunk_atual = [], []
     tamanho_atual = 0
 
@@ -40,55 +64,215 @@ def dividir_em_chunks_avancado(texto: str, limite: int) -> List[str]:
 
 # Função para limpar e formatar o texto para melhor leitura por IA
 def limpar_e_formatar_texto(texto_original: str) -> str:
-    texto_processado = re.sub(r'\s+', ' ', texto_original)  # Substitui múltiplos espaços por um único
-    texto_processado = re.sub(r'[^\w\s.,!?-]', '', texto_processado)  # Remove caracteres especiais
+    texto_processado = re.sub(REGEX_ESPACOS, ' ', texto_original)  # Substitui múltiplos espaços por um único
+    texto_processado = re.sub(REGEX_CARACTERES_ESPECIAIS, '', texto_processado)  # Remove caracteres especiais
     texto_processado = texto_processado.strip()  # Remove espaços extras
     return texto_processado
 
-# Função principal para processar os arquivos PDF
-def processar_pdfs():
-    limpar_diretorio_saida()
+# Extrai os chunks de um intervalo de páginas; cada chamada abre o próprio documento,
+# então pode rodar em outro processo. O "chunk-id" depende só da página e da posição
+# do chunk nela, e não de como as páginas foram divididas entre os processos.
+def extrair_paginas(pdf_path: str, inicio: int, fim: int) -> List[dict]:
+    titulo = os.path.splitext(os.path.basename(pdf_path))[0]
+    dados_extraidos = []
 
-    LIMITE_CARACTERES = 500  # Define o limite de caracteres por chunk
+    with fitz.open(pdf_path) as documento:
+        for numero_pagina in range(inicio, min(fim, len(documento))):
+            pagina_atual = documento.load_page(numero_pagina)
+            texto_pagina = pagina_atual.get_text("text")
 
-    start_time = time.time()  # Registra o tempo de início
+            # Remove marcações de páginas e limpa o texto
+            texto_pagina = re.sub(REGEX_NUMERO_PAGINA, '', texto_pagina, flags=re.IGNORECASE)
+            texto_limpo = limpar_e_formatar_texto(texto_pagina)
+
+            # Divide o texto em chunks
+            chunks_extraidos = dividir_em_chunks_avancado(texto_limpo, LIMITE_CARACTERES)
+
+            for idx, chunk in enumerate(chunks_extraidos):
+                chunk_data = {
+                    "chunk-id": f"{numero_pagina}-{idx}",
+                    "chunk": chunk,
+                    "title": titulo,
+                    "page-number": numero_pagina + 1
+                }
+                dados_extraidos.append(chunk_data)
+
+    return dados_extraidos
 
-    for pdf_file_name in os.listdir(INPUT_DIRECTORY):
-        if pdf_file_name.endswith(".pdf"):
-            pdf_path = os.path.join(INPUT_DIRECTORY, pdf_file_name)
-            documento = fitz.open(pdf_path)
-            dados_extraidos = []
+# Divide cada PDF em tarefas (arquivo, primeira página, página final exclusiva)
+def dividir_em_tarefas(pdf_paths: List[str], paginas_por_tarefa: int) -> List[Tuple[str, int, int]]:
+    tarefas = []
+    for pdf_path in pdf_paths:
+        with fitz.open(pdf_path) as documento:
+            total_paginas = len(documento)
+        for inicio in range(0, max(total_paginas, 1), paginas_por_tarefa):
+            tarefas.append((pdf_path, inicio, inicio + paginas_por_tarefa))
+    return tarefas
 
-            for numero_pagina in range(len(documento)):
-                pagina_atual = documento.load_page(numero_pagina)
-                texto_pagina = pagina_atual.get_text("text")
+# Caminho do arquivo gerado para um PDF no formato escolhido
+def caminho_saida(pdf_file_name: str, formato: str = FORMATO_SAIDA) -> str:
+    return record_path(os.path.join(OUTPUT_DIRECTORY, os.path.splitext(pdf_file_name)[0]), formato)
 
-                # Remove marcações de páginas e limpa o texto
-                texto_pagina = re.sub(r'Página\s+\d+|Page\s+\d+', '', texto_pagina, flags=re.IGNORECASE)
-                texto_limpo = limpar_e_formatar_texto(texto_pagina)
+# Remove as saídas de um PDF em todos os formatos, menos o indicado
+def remover_saidas(pdf_file_name: str, exceto: str = None):
+    for formato in OUTPUT_FORMATS:
+        if formato == exceto:
+            continue
+        output_file_path = caminho_saida(pdf_file_name, formato)
+        if os.path.exists(output_file_path):
+            os.remove(output_file_path)
+            print(f"Arquivo {output_file_path} excluído.")
 
-                # Divide o texto em chunks
-                chunks_extraidos = dividir_em_chunks_avancado(texto_limpo, LIMITE_CARACTERES)
+# Extrai os PDFs e devolve (arquivo, chunks) de cada tarefa, na ordem dos arquivos e das páginas,
+# assim que cada uma termina; com workers > 1, as tarefas rodam em um pool de processos
+def extrair_pdfs(pdf_file_names: List[str], workers: int, paginas_por_tarefa: int) -> Iterator[Tuple[str, List[dict]]]:
+    pdf_paths = [os.path.join(INPUT_DIRECTORY, nome) for nome in pdf_file_names]
+    tarefas = dividir_em_tarefas(pdf_paths, paginas_por_tarefa)
 
-                for idx, chunk in enumerate(chunks_extraidos):
-                    chunk_data = {
-                        "chunk-id": f"{numero_pagina}-{idx}",
-                        "chunk": chunk,
-                        "title": os.path.splitext(pdf_file_name)[0],
-                        "page-number": numero_pagina + 1
-                    }
-                    dados_extraidos.append(chunk_data)
+    if workers <= 1:
+        for pdf_path, inicio, fim in tarefas:
+            yield os.path.basename(pdf_path), extrair_paginas(pdf_path, inicio, fim)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Janela de no máximo duas tarefas por worker: só elas (e seus chunks) ficam em memória,
+            # e cada resultado é devolvido, na ordem das tarefas, assim que a mais antiga termina
+            pendentes = deque()
+            for pdf_path, inicio, fim in tarefas:
+                pendentes.append((os.path.basename(pdf_path), executor.submit(extrair_paginas, pdf_path, inicio, fim)))
+                if len(pendentes) >= 2 * workers:
+                    nome, futuro = pendentes.popleft()
+                    yield nome, futuro.result()
+            while pendentes:
+                nome, futuro = pendentes.popleft()
+                yield nome, futuro.result()
 
-            # Salva os dados extraídos em um arquivo JSON
-            output_file_path = os.path.join(OUTPUT_DIRECTORY, f"{os.path.splitext(pdf_file_name)[0]}.json")
-            with open(output_file_path, "w", encoding='utf-8') as json_output_file:
-                json.dump(dados_extraidos, json_output_file, ensure_ascii=False, indent=4)
+# Grava os chunks de um PDF à medida que chegam e devolve o caminho e a quantidade gravada
+def salvar_chunks(pdf_file_name: str, blocos, formato: str) -> Tuple[str, int]:
+    output_file_path = caminho_saida(pdf_file_name, formato)
+    with RecordWriter(output_file_path, formato) as escritor:
+        for _, chunks in blocos:
+            escritor.write_all(chunks)
+    return output_file_path, escritor.count
 
-            print(f"Extração concluída para {pdf_file_name}. JSON salvo em {output_file_path}.")
+# Configurações que mudam o resultado da extração
+def configuracoes(formato: str = FORMATO_SAIDA) -> dict:
+    return {
+        "versao": MANIFEST_VERSION,
+        "formato": formato,
+        "limite_caracteres": LIMITE_CARACTERES,
+        "regex": [REGEX_FIM_DE_FRASE, REGEX_ESPACOS, REGEX_CARACTERES_ESPECIAIS, REGEX_NUMERO_PAGINA],
+    }
+
+def hash_arquivo(caminho: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(caminho, "rb") as arquivo:
+        for bloco in iter(lambda: arquivo.read(1024 * 1024), b""):
+            sha256.update(bloco)
+    return sha256.hexdigest()
+
+def carregar_manifesto() -> dict:
+    if not os.path.exists(MANIFEST_FILE):
+        return {"configuracoes": None, "arquivos": {}}
+    with open(MANIFEST_FILE, "r", encoding="utf-8") as arquivo:
+        return json.load(arquivo)
+
+# Gravação atômica: um manifesto interrompido no meio nunca é lido
+def salvar_manifesto(manifesto: dict):
+    temporario = f"{MANIFEST_FILE}.tmp"
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        json.dump(manifesto, arquivo, ensure_ascii=False, indent=4)
+    os.replace(temporario, MANIFEST_FILE)
+
+# Compara os PDFs de entrada com o manifesto. Tamanho e data iguais bastam para considerar
+# o arquivo inalterado; só quando diferem o conteúdo é lido para calcular o hash.
+def planejar(pdf_file_names: List[str], manifesto: dict, completo: bool, formato: str = FORMATO_SAIDA):
+    mesmas_configuracoes = manifesto["configuracoes"] == configuracoes(formato)
+    alterados, registros = [], {}
+
+    for pdf_file_name in pdf_file_names:
+        pdf_path = os.path.join(INPUT_DIRECTORY, pdf_file_name)
+        info = os.stat(pdf_path)
+        anterior = manifesto["arquivos"].get(pdf_file_name)
+        registro = {"tamanho": info.st_size, "modificado_ns": info.st_mtime_ns}
+
+        valido = (not completo and mesmas_configuracoes and anterior is not None
+                  and os.path.exists(caminho_saida(pdf_file_name, formato)))
+        if valido and (anterior["tamanho"], anterior["modificado_ns"]) == (info.st_size, info.st_mtime_ns):
+            registros[pdf_file_name] = anterior
+            continue
+
+        registro["sha256"] = hash_arquivo(pdf_path)
+        if valido and anterior["sha256"] == registro["sha256"]:
+            # Só a data mudou (arquivo copiado ou tocado): o JSON existente continua valendo
+            registros[pdf_file_name] = {**anterior, **registro}
+        else:
+            alterados.append(pdf_file_name)
+            registros[pdf_file_name] = registro
+
+    removidos = [nome for nome in manifesto["arquivos"] if nome not in registros]
+    return alterados, removidos, registros
+
+# Função principal para processar os arquivos PDF; com completo=True, refaz tudo do zero
+def processar_pdfs(workers: int = 1, paginas_por_tarefa: int = PAGINAS_POR_TAREFA, completo: bool = False,
+                   formato: str = FORMATO_SAIDA) -> float:
+    if completo:
+        limpar_diretorio_saida()
+
+    start_time = time.time()  # Registra o tempo de início
+
+    pdf_file_names = sorted(nome for nome in os.listdir(INPUT_DIRECTORY) if nome.endswith(".pdf"))
+    manifesto = carregar_manifesto()
+    alterados, removidos, registros = planejar(pdf_file_names, manifesto, completo, formato)
+
+    # Remove as saídas de PDFs que saíram de input_files
+    for pdf_file_name in removidos:
+        print(f"{pdf_file_name} foi removido de {INPUT_DIRECTORY}.")
+        remover_saidas(pdf_file_name)
+
+    print(f"{len(alterados)} PDF(s) novo(s) ou alterado(s), {len(pdf_file_names) - len(alterados)} inalterado(s), "
+          f"{len(removidos)} removido(s).")
+
+    # Cada PDF é gravado enquanto suas tarefas terminam; só os chunks de uma tarefa ficam em memória
+    for pdf_file_name, blocos in groupby(extrair_pdfs(alterados, workers, paginas_por_tarefa), key=lambda bloco: bloco[0]):
+        remover_saidas(pdf_file_name, exceto=formato)
+        output_file_path, total_chunks = salvar_chunks(pdf_file_name, blocos, formato)
+        registros[pdf_file_name]["chunks"] = total_chunks
+        print(f"Extração concluída para {pdf_file_name}. {total_chunks} chunks salvos em {output_file_path}.")
+
+    salvar_manifesto({"configuracoes": configuracoes(formato), "arquivos": registros})
 
     end_time = time.time()  # Registra o tempo de fim
     elapsed_time = end_time - start_time  # Calcula o tempo total de execução
-    print(f"Processamento concluído em {elapsed_time:.2f} segundos.")
+    print(f"Processamento concluído em {elapsed_time:.2f} segundos com {workers} processo(s).")
+    return elapsed_time
+
+# Mede o tempo com 1, 2, 4, ... até N processos
+def medir_escalonamento(max_workers: int, paginas_por_tarefa: int, formato: str = FORMATO_SAIDA):
+    contagens = sorted({2 ** i for i in range(max_workers.bit_length()) if 2 ** i <= max_workers} | {max_workers})
+    tempos = {workers: processar_pdfs(workers, paginas_por_tarefa, True, formato) for workers in contagens}
+
+    print(f"\n{'processos':>9} {'segundos':>9} {'aceleração':>11}")
+    for workers, tempo in tempos.items():
+        print(f"{workers:>9} {tempo:>9.2f} {tempos[1] / tempo:>10.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Extrai e divide em chunks o texto dos PDFs de input_files.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Processos de extração (1 roda tudo no processo principal).")
+    parser.add_argument("--paginas-por-tarefa", type=int, default=PAGINAS_POR_TAREFA,
+                        help="Páginas de um PDF extraídas por tarefa.")
+    parser.add_argument("--formato", choices=OUTPUT_FORMATS, default=FORMATO_SAIDA,
+                        help="json: uma lista por PDF; jsonl: um chunk por linha, gravado durante a extração.")
+    parser.add_argument("--completo", action="store_true",
+                        help="Ignora o manifesto, apaga output_files e extrai todos os PDFs de novo.")
+    parser.add_argument("--escalonamento", action="store_true",
+                        help="Repete a extração com 1, 2, 4, ... até --workers processos e compara os tempos.")
+    args = parser.parse_args()
+
+    if args.escalonamento:
+        medir_escalonamento(args.workers, args.paginas_por_tarefa, args.formato)
+    else:
+        processar_pdfs(args.workers, args.paginas_por_tarefa, args.completo, args.formato)
 
 if __name__ == "__main__":
-    processar_pdfs()
+    main()
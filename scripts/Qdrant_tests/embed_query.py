@@ -1,8 +1,11 @@
 import os
-import requests
+import sys
 from dotenv import load_dotenv
 from qdrant_client import QdrantClient
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from instrit.embedding_client import EmbeddingClient
+
 # Carregar a chave API do arquivo .env
 load_dotenv()
 QDRANT_KEY = os.getenv("QDRANT_KEY")
@@ -11,7 +14,6 @@ if not QDRANT_KEY:
     raise ValueError("A chave API QDRANT_KEY não foi encontrada no arquivo .env")
 
 # Configurações
-NOMIC_API_URL = "http://localhost:11434/api/embeddings"
 NOMIC_MODEL = "nomic-embed-text"
 COLLECTION_NAME = "chatbot"
 
@@ -21,27 +23,19 @@ qdrant_client = QdrantClient(
     api_key=QDRANT_KEY,
 )
 
-# Função para obter embedding da pergunta
-def get_embedding(text: str, model: str = NOMIC_MODEL):
-    response = requests.post(
-        NOMIC_API_URL,
-        json={"model": model, "prompt": text}
-    )
-    if response.status_code == 200:
-        return response.json().get("embedding")
-    else:
-        raise ValueError(f"Erro ao gerar embedding: {response.status_code} - {response.text}")
+# Inicializar cliente de embeddings
+embedding_client = EmbeddingClient(model=NOMIC_MODEL)
 
 # Obter o embedding da pergunta
 question = "What does a lubrication system typically consist of?"
-question_embedding = get_embedding(question)
+question_embedding = embedding_client.embed(question)
 
 # Realizar a busca no Qdrant
-search_results = qdrant_client.search(
+search_results = qdrant_client.query_points(
     collection_name=COLLECTION_NAME,
-    query_vector=question_embedding,
+    query=question_embedding,
     limit=5
-)
+).points
 
 # Exibir resultados
 for result in search_results:
@@ -1,54 +1,90 @@
+import argparse
 import os
-import json
+import sys
+from typing import Iterator
+
 from dotenv import load_dotenv
 from qdrant_client import QdrantClient
 from qdrant_client.models import PointStruct
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from instrit.qdrant_sync import QDRANT_BATCH_SIZE, QDRANT_UPLOAD_WORKERS, upload_points
+from instrit.vector_file import VectorFile, convert_json
+
 # Carregar a chave API do arquivo .env
 load_dotenv()
 QDRANT_KEY = os.getenv("QDRANT_KEY")
 
-if not QDRANT_KEY:
-    raise ValueError("A chave API QDRANT_KEY não foi encontrada no arquivo .env")
-
 # Configurações
+QDRANT_URL = "https://704ff291-d513-44da-adfd-46e78acfa20a.europe-west3-0.gcp.cloud.qdrant.io:6333"
 COLLECTION_NAME = "chatbot"
+EMBEDDING_FILE_PATH = "documents_embeddings.json"  # Formato JSON antigo
+VECTOR_FILE_PATH = "documents_embeddings"  # Formato binário mapeado em memória
+
+
+def gerar_pontos(vector_file: VectorFile) -> Iterator[PointStruct]:
+    """Lê os documentos um a um, sem montar a coleção inteira em memória."""
+    for row, doc in enumerate(vector_file.iter_payloads()):
+        yield PointStruct(
+            id=doc["id"],
+            vector=vector_file.vectors[row].tolist(),
+            payload={
+                "title": doc["title"],
+                "tags": doc["tags"],
+                "created_at": doc["created_at"],
+                "content": doc["content"],
+                "summary": doc["summary"],
+                "context": doc["context"],
+                # Arquivo de origem, usado pelo filtro source.file_name da coleção
+                "source": doc.get("source") or doc.get("metadata", {}).get("source") or {},
+            },
+        )
+
+
+def conectar(url: str) -> QdrantClient:
+    # ":memory:" ou um diretório local dispensam a chave; úteis para testar o envio
+    if url == ":memory:":
+        return QdrantClient(":memory:")
+    if not url.startswith("http"):
+        return QdrantClient(path=url)
+    if not QDRANT_KEY:
+        raise ValueError("A chave API QDRANT_KEY não foi encontrada no arquivo .env")
+    return QdrantClient(url=url, api_key=QDRANT_KEY)
+
+
+def enviar(qdrant_client: QdrantClient, vector_file: VectorFile, lote: int = QDRANT_BATCH_SIZE,
+           workers: int = QDRANT_UPLOAD_WORKERS, reenviar: bool = False) -> dict:
+    # Verificar ou criar a coleção
+    if not qdrant_client.collection_exists(COLLECTION_NAME):
+        qdrant_client.create_collection(
+            collection_name=COLLECTION_NAME,
+            vectors_config={"size": vector_file.vectors.shape[1], "distance": "Cosine"},
+        )
+
+    # Pontos cujo hash de conteúdo já está na coleção não são reenviados
+    return upload_points(qdrant_client, COLLECTION_NAME, gerar_pontos(vector_file), lote, workers,
+                         skip_unchanged=not reenviar, total=len(vector_file))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Envia os embeddings ao Qdrant em lotes, só o que mudou.")
+    parser.add_argument("--url", default=QDRANT_URL,
+                        help="URL do Qdrant, diretório local ou ':memory:' para testar sem servidor.")
+    parser.add_argument("--lote", type=int, default=QDRANT_BATCH_SIZE, help="Pontos por requisição.")
+    parser.add_argument("--workers", type=int, default=QDRANT_UPLOAD_WORKERS, help="Lotes enviados em paralelo.")
+    parser.add_argument("--reenviar", action="store_true", help="Envia todos os pontos, mesmo os inalterados.")
+    args = parser.parse_args()
+
+    # Abrir embeddings no formato binário, convertendo o JSON antigo na primeira execução
+    if not VectorFile.exists(VECTOR_FILE_PATH):
+        print(f"[LOG] Convertendo '{EMBEDDING_FILE_PATH}' para o formato binário...")
+        convert_json(EMBEDDING_FILE_PATH, VECTOR_FILE_PATH)
+    vector_file = VectorFile(VECTOR_FILE_PATH)
+
+    enviar(conectar(args.url), vector_file, args.lote, args.workers, args.reenviar)
+    vector_file.close()
+    print("[LOG] Dados enviados ao Qdrant com sucesso!")
+
 
-# Inicializar cliente Qdrant
-qdrant_client = QdrantClient(
-    url="https://704ff291-d513-44da-adfd-46e78acfa20a.europe-west3-0.gcp.cloud.qdrant.io:6333",
-    api_key=QDRANT_KEY,
-)
-
-# Verificar ou criar a coleção
-if COLLECTION_NAME not in [col.name for col in qdrant_client.get_collections().collections]:
-    qdrant_client.create_collection(
-        collection_name=COLLECTION_NAME,
-        vectors_config={"size": 768, "distance": "Cosine"},  # Ajuste o tamanho do vetor
-    )
-
-# Carregar arquivo JSON com embeddings
-with open("documents_embeddings.json", "r") as file:
-    data = json.load(file)
-
-# Preparar pontos para envio
-points = [
-    PointStruct(
-        id=doc["id"],
-        vector=embedding["embedding"],
-        payload={
-            "title": doc["title"],
-            "tags": doc["tags"],
-            "created_at": doc["created_at"],
-            "content": doc["content"],
-            "summary": doc["summary"],
-            "context": doc["context"],
-        },
-    )
-    for doc, embedding in zip(data["documents"], data["embeddings"])
-]
-
-# Inserir os pontos no Qdrant
-qdrant_client.upsert(collection_name=COLLECTION_NAME, points=points)
-
-print("[LOG] Dados enviados ao Qdrant com sucesso!")
+if __name__ == "__main__":
+    main()
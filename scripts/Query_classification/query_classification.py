@@ -1,8 +1,14 @@
+import argparse
 import os
+import sys
 import requests
 from dotenv import load_dotenv
 import time  # Importa o módulo de tempo
-from deep_translator import GoogleTranslator
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from instrit.embedding_client import EmbeddingClient
+from instrit.query_classifier import QueryClassifier, classify_with_llm
+from instrit.translator import get_translator
 
 load_dotenv()
 
@@ -27,72 +33,13 @@ if not os.path.exists(log_dir):
     os.makedirs(log_dir)
 
 
-# Função para enviar uma consulta ao modelo
+# Função para enviar uma consulta ao modelo (mesmo prompt do classificador compartilhado)
 def ask_model(query):
-    prompt = f"""
-    You are an advanced technical AI assistant specialized in industrial machinery, maintenance practices, and operational standards. Your primary task is to determine whether a question requires consulting technical documentation, manuals, or detailed records (referred to as RAG). Respond with "y" (yes) or "n" (no), strictly following the guidelines below.
-    
-    ### Guidelines:
-    
-    #### Respond "y" if:
-    1. The question requires any form of technical, detailed, or specific information, including but not limited to:
-       - Definitions of machinery components or their functions (e.g., "What are the parts of a lathe?").
-       - Maintenance practices or guidelines (e.g., "How to perform preventive maintenance on a milling machine?").
-       - Lubricants, fluids, or material specifications (e.g., "What oil should be used for a refrigerator?").
-       - Operational, assembly, or disassembly instructions.
-       - Any information about a specific machine model, brand, or type (e.g., "Parts of an industrial fan," "How to troubleshoot an XYZ Model 500?").
-       - Descriptions or classifications of machines or their functions.
-    
-    #### Respond "n" if:
-    1. The question involves superficial or conversational inputs (e.g., "Hello," "Who are you?").
-    2. It reflects a continuation or exploration of a symptom or issue without requiring documentation (e.g., "It is making noise," "The machine stopped working.").
-    3. It is explicitly not technical or specific enough to require reference materials.
-    
-    ### Examples:
-    - "What are the parts of a lathe?" → y
-    - "How to perform preventive maintenance on a milling machine?" → y
-    - "What oil should be used for a refrigerator?" → y
-    - "Parts of an industrial fan?" → y
-    - "Hello, who are you?" → n
-    - "It is making noise." → n
-    - "What are the main types of lubrication?" → y
-    - "What is a lathe?" → y
-    - "The machine stopped working." → n
-    - "What are the benefits of using hydraulic systems in heavy machinery?" → y
-    
-    ### Rules for Output:
-    1. Respond **only** with "y" or "n".
-    2. Do not include any additional text, punctuation, or spaces.
-    3. Maintain a consistent response format for every query.
-    
-    ### Decision Process:
-    1. **Keyword Identification**: Identify terms that indicate a need for technical details, machine parts, or operational information.
-    2. **Context Evaluation**: Assess whether the question involves a technical inquiry or a continuation of a previously described issue.
-    3. **Apply the Guidelines**: Classify the query based on the provided rules and respond accordingly.
-    
-    Question: {query}
-    Answer:
-    """
-
-    payload = {
-        "model": MODEL,
-        "prompt": prompt.strip(),
-        "max_tokens": 2,
-        "temperature": 0.0,
-    }
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_KEY}",
-        "Content-Type": "application/json",
-    }
-
     # Marca o tempo antes do envio
     request_send_time = time.time()
 
     try:
-        response = requests.post(API_URL, headers=headers, json=payload)
-        print("Debug: API response JSON:", response.json())
-        response.raise_for_status()  # Levanta uma exceção se o status não for 2xx
-        result = response.json().get("choices", [{}])[0].get("text", "").strip()
+        result = "y" if classify_with_llm(query, OPENROUTER_KEY, MODEL, API_URL) else "n"
 
         # Marca o tempo após a resposta
         response_receive_time = time.time()
@@ -122,8 +69,50 @@ def ask_model(query):
         return None
 
 
+# Classificação local: regressão logística sobre o embedding da pergunta, com o modelo como reserva
+def ask_local(query, classifier, embedding_client):
+    request_send_time = time.time()
+    embedding = embedding_client.embed(query)
+    embedding_time = time.time() - request_send_time
+
+    classification_start = time.perf_counter()
+    needs_context = classifier.classify(embedding)
+    classification_time = time.perf_counter() - classification_start
+
+    if needs_context is None:
+        print(f"Classificador local sem confiança ({classifier.probability(embedding):.2f}). Consultando o modelo...")
+        return ask_model(query)
+
+    result = f"É necessário consultar RAG para essa resposta? {'y' if needs_context else 'n'}"
+    session_log.append(f"Usuário: {query}\nIA (local): {result}\n"
+                       f"Tempo do embedding: {embedding_time:.2f} seconds\n"
+                       f"Tempo de classificação: {classification_time * 1000:.3f} ms\n"
+                       f"{'-' * 40}\n")
+    with open(log_file_path, "w") as log_file:
+        log_file.writelines(session_log)
+
+    return (f"{result}\n"
+            f"Tempo do embedding: {embedding_time:.2f} seconds\n"
+            f"Tempo de classificação: {classification_time * 1000:.3f} ms\n"
+            f"{'-' * 40}")
+
+
 # Loop principal para interação pelo console
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Classifica se uma pergunta precisa de consulta ao RAG.")
+    parser.add_argument("--modo", choices=["local", "llm"], default="local",
+                        help="local: classificador sobre embeddings com o modelo como reserva; llm: sempre o modelo.")
+    parser.add_argument("--classificador", default="query_classifier.npz",
+                        help="Arquivo do classificador local (treinado automaticamente se não existir).")
+    args = parser.parse_args()
+
+    if args.modo == "local":
+        embedding_client = EmbeddingClient()
+        classifier = QueryClassifier.load_or_train(args.classificador, embedding_client)
+
+    # Tradutor único, com cache das traduções por hash do texto
+    translator = get_translator()
+
     print (f"Script inicializado\n{'-' * 40}")
     while True:
         # Desabilita a entrada de novas queries enquanto aguarda resposta
@@ -132,10 +121,13 @@ if __name__ == "__main__":
             print("Exiting the console. Goodbye!")
             break
 
-        user_input = GoogleTranslator(source='auto', target='en').translate(user_input)
+        user_input = translator.translate(user_input)
 
         # Envia a consulta e espera pela resposta da IA
-        response = ask_model(user_input)
+        if args.modo == "local":
+            response = ask_local(user_input, classifier, embedding_client)
+        else:
+            response = ask_model(user_input)
 
         # Imprime a resposta assim que for recebida
         if response:
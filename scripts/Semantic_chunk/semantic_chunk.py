@@ -1,13 +1,25 @@
+import argparse
+import hashlib
 import os
+import random
+import sys
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import pdfplumber
 import re
 import requests
 import json
-from deep_translator import GoogleTranslator
 from dotenv import load_dotenv
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from instrit.json_repair import loads_tolerant
+from instrit.jsonl import OUTPUT_FORMATS, RecordWriter, dumps_line, loads, record_path
+from instrit.rate_limiter import RateLimiter
+from instrit.translator import get_translator
+
 # Carrega variáveis de ambiente do arquivo .env
 load_dotenv()
 
@@ -15,6 +27,34 @@ load_dotenv()
 OPENROUTER_KEY = os.getenv("OPENROUTER_KEY")
 API_URL = "https://openrouter.ai/api/v1/chat/completions"
 
+# Modo de processamento das páginas: "separado" (padrão) faz duas chamadas, resumo e depois
+# formatação para JSON; "combinado" pede o JSON final em uma única chamada com saída estruturada
+PAGE_MODE = os.getenv("PAGE_MODE", "separado")
+PAGE_MODES = ("combinado", "separado")
+STRUCTURED_MODEL = os.getenv("STRUCTURED_MODEL", "meta-llama/llama-3.1-8b-instruct:free")
+# "json_schema" envia o esquema abaixo (saída estruturada); "json_object" só exige um objeto JSON,
+# para modelos sem suporte a esquema. Se o modelo recusar o esquema, a execução passa para json_object
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "json_schema")
+structured_output = STRUCTURED_OUTPUT
+
+# Política de repetição da formatação para JSON
+FORMAT_MAX_ATTEMPTS = 4  # Tentativas por página antes de enviá-la para o arquivo de falhas
+FORMAT_BACKOFF_BASE = 2.0  # Espera base (segundos), dobrada a cada tentativa
+FORMAT_BACKOFF_MAX = 60.0  # Espera máxima entre tentativas (segundos)
+
+# Arquivo com as páginas que falharam na formatação (uma por linha, com a saída bruta da IA)
+FAILED_PAGES_FILE = "failed_pages.jsonl"
+
+# Páginas traduzidas juntas em uma mesma chamada ao tradutor
+TRANSLATE_BATCH_PAGES = 8
+
+# Checkpoint com o resultado de cada página concluída, chaveado por (hash do arquivo, página)
+CHECKPOINT_FILE = "checkpoint.jsonl"
+
+# Resumo consolidado: "json" grava a lista indentada de antes, "jsonl" um objeto por linha
+CONSOLIDATED_FILE = "consolidated_summary"
+OUTPUT_FORMAT = os.getenv("SUMMARY_FORMAT", "json")
+
 def clean_text(text):
     # Remove linhas vazias, múltiplos espaços, sequências de hifens, underlines e espaços pontilhados
     text = re.sub(r'\n\s*\n', '\n', text)  # Remove linhas vazias
@@ -228,7 +268,557 @@ def format_to_json(message):
         return f"Error: {response.status_code}, {response.text}"
 
 
-def extract_text_from_pdfs():
+# Campos de cada seção na resposta do modo combinado; o registro final (metadata/content/context)
+# é montado localmente, sem pedir à IA campos que ficariam em branco
+SECTION_FIELDS = ("title", "tags", "text", "summary", "preceding_text", "following_text")
+
+SECTIONS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "sections": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    **{field: {"type": "string"} for field in SECTION_FIELDS},
+                    "tags": {"type": "array", "items": {"type": "string"}},
+                },
+                "required": list(SECTION_FIELDS),
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["sections"],
+    "additionalProperties": False,
+}
+
+STRUCTURED_PROMPT = (
+    "Turn one page of technical text into JSON for a retrieval dataset, in English. "
+    "Keep the technical concepts and drop names, places, institutions and other unrelated details. "
+    "Split the page into sections, one concept each, and reply only with "
+    '{"sections":[{"title":"","tags":[],"text":"","summary":"","preceding_text":"","following_text":""}]}. '
+    "title: section title in title case. tags: 3 one-word tags. "
+    "text: a clear, self-contained paragraph explaining the concept. summary: one or two sentences. "
+    'preceding_text/following_text: the first words of the previous/next section\'s text, or "".'
+)
+
+
+def summarize_to_json(message):
+    """
+    Resume e estrutura uma página em uma única requisição, com saída JSON estruturada.
+
+    Se o modelo recusar a saída com esquema (erro que cite response_format ou json_schema), a
+    página é pedida de novo com json_object, que passa a ser usado pelo restante da execução.
+
+    Args:
+        message (str): Texto limpo da página.
+
+    Returns:
+        str: Resposta do modelo (um objeto {"sections": [...]}).
+    """
+    global structured_output
+    headers = {
+        "Authorization": f"Bearer {OPENROUTER_KEY}",
+    }
+
+    output_type = structured_output
+    if output_type == "json_schema":
+        response_format = {"type": "json_schema",
+                           "json_schema": {"name": "page_sections", "strict": True, "schema": SECTIONS_SCHEMA}}
+    else:
+        response_format = {"type": "json_object"}
+
+    payload = {
+        "model": STRUCTURED_MODEL,
+        "temperature": 0.2,
+        "top_p": 0.9,
+        "frequency_penalty": 0.2,
+        "response_format": response_format,
+        "messages": [
+            {"role": "system", "content": STRUCTURED_PROMPT},
+            {"role": "user", "content": message},
+        ],
+    }
+
+    response = requests.post(API_URL, headers=headers, data=json.dumps(payload))
+
+    # Só um erro que cite o formato pedido troca o formato; contexto longo, modelo inválido etc. seguem como erro
+    schema_rejected = response.status_code != 200 and (
+        "response_format" in response.text or "json_schema" in response.text)
+    if schema_rejected and output_type == "json_schema":
+        print(f"[LOG] {STRUCTURED_MODEL} recusou a saída com esquema; usando json_object. Resposta: {response.text}")
+        structured_output = "json_object"
+        llm_usage.add_fallback()
+        return summarize_to_json(message)
+
+    if response.status_code == 200:
+        return response.json().get("choices", [{}])[0].get("message", {}).get("content", "No response content")
+    else:
+        return f"Error: {response.status_code}, {response.text}"
+
+
+class PipelineStage:
+    """
+    Etapa remota do pipeline: limita quantas páginas ficam em andamento ao mesmo tempo
+    e respeita o limite de requisições por minuto do serviço usado.
+    """
+
+    def __init__(self, name, max_in_flight, rate_limiter):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.semaphore = threading.Semaphore(max_in_flight)
+        self.rate_limiter = rate_limiter
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.busy_seconds = 0.0
+
+    def run(self, function, *args):
+        with self.semaphore:
+            self.rate_limiter.wait()
+            start = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                with self.lock:
+                    self.calls += 1
+                    self.busy_seconds += time.perf_counter() - start
+
+
+def process_page(file_hash, file_name, page_number, total_pages, translated_text, stages, mode=PAGE_MODE):
+    """
+    Executa as etapas de uma página já traduzida: limpeza, resumo e formatação para JSON.
+
+    No modo combinado, resumo e formatação são uma só chamada com saída estruturada.
+
+    Args:
+        file_hash (str): Hash SHA-256 do conteúdo do PDF.
+        file_name (str): Nome do arquivo PDF.
+        page_number (int): Número da página (a partir de 1).
+        total_pages (int): Total de páginas do arquivo.
+        translated_text (str): Texto da página traduzido para o inglês.
+        stages (dict): Etapas remotas ("translate", "summarize", "format", "structured").
+        mode (str): "combinado" ou "separado".
+
+    Returns:
+        list | None: Objetos JSON gerados para a página (vazia se a página for ignorada),
+        ou None se o processamento falhar e a página precisar ser refeita.
+    """
+    try:
+        # Data e hora do processamento por página
+        page_processing_time = datetime.now().isoformat()
+
+        # Verifica se o texto traduzido está vazio
+        if not translated_text.strip():
+            print(f"Texto traduzido vazio na página {page_number} do arquivo {file_name}. Ignorando.")
+            return []
+
+        # Envia o texto traduzido para ser limpo
+        cleaned_text = clean_text(translated_text)
+        if not cleaned_text.strip():
+            print(f"Texto limpo na página {page_number} do arquivo {file_name} está vazio. Ignorando.")
+            return []
+
+        print(f"Processando página {page_number}/{total_pages} do arquivo {file_name}...")
+        llm_usage.add_page()
+
+        if mode == "combinado":
+            return structure_page(file_hash, file_name, page_number, total_pages, cleaned_text,
+                                  page_processing_time, stages)
+
+        # Envia o texto limpo para a IA interpretar
+        summarized_text = stages["summarize"].run(summarize, cleaned_text)
+        if not summarized_text.strip():
+            print(f"Resumo gerado vazio na página {page_number} do arquivo {file_name}. Ignorando.")
+            return []
+
+        return format_page(file_hash, file_name, page_number, total_pages, summarized_text,
+                           page_processing_time, stages)
+
+    except Exception as e:
+        print(f"Erro geral ao processar a página {page_number} do arquivo {file_name}: {e}")
+        return None
+
+
+def text_field(value):
+    return value.strip() if isinstance(value, str) else ""
+
+
+def validate_elements(data):
+    """
+    Confere os objetos no esquema metadata/content/context e completa os campos opcionais.
+
+    Objetos sem texto são descartados; título, tags, resumo e contexto ausentes ficam vazios,
+    e os campos preenchidos depois (id, source, created_at) são recriados em branco.
+
+    Raises:
+        ValueError: Se a resposta tinha objetos, mas nenhum com texto.
+    """
+    if isinstance(data, dict):
+        # Um objeto solto, ou a lista dentro de um objeto
+        lists = [value for value in data.values() if isinstance(value, list)]
+        data = lists[0] if "metadata" not in data and "content" not in data and lists else [data]
+    if not isinstance(data, list):
+        raise ValueError("A resposta da IA não é uma lista de objetos JSON.")
+
+    elements = []
+    for element in data:
+        if not isinstance(element, dict):
+            continue
+        metadata = element.get("metadata") if isinstance(element.get("metadata"), dict) else {}
+        content = element.get("content") if isinstance(element.get("content"), dict) else {}
+        context = element.get("context") if isinstance(element.get("context"), dict) else {}
+        text = text_field(content.get("text"))
+        if not text:
+            # Objeto sem texto não tem o que indexar
+            continue
+        tags = metadata.get("tags")
+        if isinstance(tags, str):
+            tags = tags.split(",")
+        elements.append({
+            "metadata": {
+                "id": "",
+                "source": {"file_name": "", "page_number": ""},
+                "title": text_field(metadata.get("title")),
+                "tags": [tag.strip() for tag in tags if isinstance(tag, str) and tag.strip()]
+                if isinstance(tags, list) else [],
+                "created_at": "",
+            },
+            "content": {"text": text, "summary": text_field(content.get("summary"))},
+            "context": {
+                "preceding_text": text_field(context.get("preceding_text")),
+                "following_text": text_field(context.get("following_text")),
+            },
+        })
+
+    if data and not elements:
+        raise ValueError("Nenhum objeto da resposta da IA tem texto.")
+    return elements
+
+
+def parse_formatted_json(formatted_text):
+    """
+    Extrai e valida a lista JSON da resposta de format_to_json.
+
+    Saídas quase válidas (texto em volta, cercas de código, comentários // do modelo
+    do prompt, vírgulas sobrando, colchetes faltando) são corrigidas localmente.
+
+    Returns:
+        tuple: (objetos JSON, True se a resposta precisou de correção).
+
+    Raises:
+        ValueError: Se a resposta não puder ser corrigida; só então a IA é chamada de novo.
+    """
+    data, repaired = loads_tolerant(formatted_text)
+    return validate_elements(data), repaired
+
+
+def parse_structured_sections(response_text):
+    """
+    Valida a resposta do modo combinado e monta os objetos no esquema final
+    (metadata, content e context), com os campos preenchidos depois em branco.
+
+    Returns:
+        tuple: (objetos JSON, True se a resposta precisou de correção).
+
+    Raises:
+        ValueError: Se a resposta não tiver uma lista de seções utilizável.
+    """
+    data, repaired = loads_tolerant(response_text)
+    sections = data.get("sections") if isinstance(data, dict) else data
+    if not isinstance(sections, list):
+        raise ValueError("Resposta da IA sem a lista 'sections'.")
+
+    return validate_elements([
+        {
+            "metadata": {"title": section.get("title"), "tags": section.get("tags")},
+            "content": {"text": section.get("text"), "summary": section.get("summary")},
+            "context": {"preceding_text": section.get("preceding_text"),
+                        "following_text": section.get("following_text")},
+        }
+        for section in sections if isinstance(section, dict)
+    ] if sections else []), repaired
+
+
+def backoff_delay(attempt):
+    """Espera exponencial com jitter completo antes da próxima tentativa (attempt começa em 1)."""
+    return random.uniform(0, min(FORMAT_BACKOFF_MAX, FORMAT_BACKOFF_BASE * 2 ** (attempt - 1)))
+
+
+dead_letter_lock = threading.Lock()
+
+
+def write_failed_page(record):
+    """Acrescenta uma página que esgotou as tentativas ao arquivo de falhas."""
+    with dead_letter_lock:
+        with open(os.path.join("output_files", FAILED_PAGES_FILE), "a", encoding="utf-8") as failed_file:
+            failed_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+class LLMUsage:
+    """
+    Páginas enviadas à IA, para relatar quantas requisições cada página custou,
+    e respostas corrigidas localmente (cada uma é uma chamada à IA economizada).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pages = 0
+        self.repaired = 0
+        self.retries = 0
+        self.fallbacks = 0  # Páginas pedidas de novo com json_object após a recusa do esquema
+
+    def add_page(self):
+        with self.lock:
+            self.pages += 1
+
+    def add_repaired(self):
+        with self.lock:
+            self.repaired += 1
+
+    def add_retry(self):
+        with self.lock:
+            self.retries += 1
+
+    def add_fallback(self):
+        with self.lock:
+            self.fallbacks += 1
+
+
+llm_usage = LLMUsage()
+
+
+def format_page(file_hash, file_name, page_number, total_pages, summarized_text, page_processing_time, stages):
+    """Formata o resumo de uma página em JSON (modo separado)."""
+    return request_page_elements(stages["format"], format_to_json, parse_formatted_json, "separado",
+                                 file_hash, file_name, page_number, total_pages, summarized_text,
+                                 page_processing_time)
+
+
+def structure_page(file_hash, file_name, page_number, total_pages, cleaned_text, page_processing_time, stages):
+    """Resume e formata a página em JSON com uma única chamada (modo combinado)."""
+    return request_page_elements(stages["structured"], summarize_to_json, parse_structured_sections, "combinado",
+                                 file_hash, file_name, page_number, total_pages, cleaned_text,
+                                 page_processing_time)
+
+
+def request_page_elements(stage, request, parse, mode, file_hash, file_name, page_number, total_pages,
+                          input_text, page_processing_time):
+    """
+    Pede os objetos JSON de uma página à IA, com tentativas limitadas e espera exponencial.
+
+    Páginas que esgotam as tentativas são gravadas no arquivo de falhas com a última saída
+    bruta da IA, para serem reprocessadas com --retry-failed sem bloquear o restante.
+
+    Returns:
+        list | None: Objetos JSON da página, ou None se todas as tentativas falharem.
+    """
+    formatted_text, error = "", None
+    for attempt in range(1, FORMAT_MAX_ATTEMPTS + 1):
+        try:
+            # Envia o texto para a IA e valida a resposta
+            formatted_text = stage.run(request, input_text)
+            json_dict, repaired = parse(formatted_text)
+            if repaired:
+                llm_usage.add_repaired()
+
+            # Adiciona os campos adicionais necessários
+            for element in json_dict:
+                element["metadata"]["id"] = str(uuid.uuid4())  # Gera um ID único
+                element["metadata"]["source"]["file_name"] = file_name  # Adiciona o nome do arquivo
+                element["metadata"]["source"]["page_number"] = page_number  # Adiciona o número da página
+                element["metadata"]["created_at"] = page_processing_time  # Adiciona a data e hora por página
+
+            return json_dict
+        except Exception as e:
+            error = e
+            print(f"Erro ao processar JSON na página {page_number} do arquivo {file_name} "
+                  f"(tentativa {attempt}/{FORMAT_MAX_ATTEMPTS}): {e}")
+            if attempt < FORMAT_MAX_ATTEMPTS:
+                llm_usage.add_retry()
+                delay = backoff_delay(attempt)
+                print(f"Tentando novamente em {delay:.1f} segundos...")
+                time.sleep(delay)
+
+    print(f"Página {page_number} do arquivo {file_name} enviada para {FAILED_PAGES_FILE}.")
+    write_failed_page({
+        "file_hash": file_hash,
+        "file_name": file_name,
+        "page_number": page_number,
+        "total_pages": total_pages,
+        "created_at": page_processing_time,
+        # No modo combinado, o texto guardado é a página limpa, e não um resumo
+        "mode": mode,
+        "summarized_text": input_text,
+        "raw_output": formatted_text,
+        "error": str(error),
+        "attempts": FORMAT_MAX_ATTEMPTS,
+        "failed_at": datetime.now().isoformat(),
+    })
+    return None
+
+
+def read_failed_pages():
+    """Lê o arquivo de falhas, uma página por linha."""
+    failed_pages_path = os.path.join("output_files", FAILED_PAGES_FILE)
+    if not os.path.exists(failed_pages_path):
+        return []
+    with open(failed_pages_path, "r", encoding="utf-8") as failed_file:
+        return [json.loads(line) for line in failed_file if line.strip()]
+
+
+def file_hash(path):
+    """Hash SHA-256 do conteúdo do arquivo, para reconhecer o PDF mesmo se ele for renomeado."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def list_input_files(input_dir):
+    """Retorna (nome, caminho, hash) dos PDFs da pasta de entrada, em ordem alfabética."""
+    return [
+        (file_name, os.path.join(input_dir, file_name), file_hash(os.path.join(input_dir, file_name)))
+        for file_name in sorted(os.listdir(input_dir))
+        if file_name.lower().endswith(".pdf")
+    ]
+
+
+class PageCheckpoint:
+    """
+    Checkpoint em JSONL com o resultado de cada página assim que ela termina.
+
+    Cada linha guarda (hash do arquivo, página) e os objetos JSON gerados; ao reiniciar,
+    as páginas já presentes não passam de novo por tradução, resumo ou formatação.
+    Se a mesma página aparecer mais de uma vez, vale a última linha.
+
+    Em memória fica só a posição da linha de cada página no arquivo; os objetos
+    são relidos do disco, página a página, ao montar o resumo consolidado.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.pages = {}
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as checkpoint_file:
+            offset = 0
+            for line in checkpoint_file:
+                try:
+                    record = loads(line)
+                except json.JSONDecodeError:
+                    # Última linha incompleta de uma execução interrompida
+                    record = None
+                if record is not None:
+                    self.pages[(record["file_hash"], record["page_number"])] = offset
+                offset += len(line)
+
+    def __contains__(self, key):
+        return key in self.pages
+
+    def __len__(self):
+        return len(self.pages)
+
+    def add(self, file_hash, file_name, page_number, elements):
+        """Grava a página no disco antes de considerá-la concluída."""
+        record = {
+            "file_hash": file_hash,
+            "file_name": file_name,
+            "page_number": page_number,
+            "elements": elements,
+        }
+        with self.lock:
+            with open(self.path, "ab") as checkpoint_file:
+                offset = checkpoint_file.tell()
+                checkpoint_file.write(dumps_line(record))
+                checkpoint_file.flush()
+                os.fsync(checkpoint_file.fileno())
+            self.pages[(file_hash, page_number)] = offset
+
+    def consolidate(self, input_files):
+        """Gera os objetos consolidados na ordem dos arquivos de entrada e das páginas, um de cada vez."""
+        pages_by_file = {}
+        for (hash_, page_number), offset in self.pages.items():
+            pages_by_file.setdefault(hash_, []).append((page_number, offset))
+
+        with open(self.path, "rb") as checkpoint_file:
+            for file_name, _, hash_ in input_files:
+                for _, offset in sorted(pages_by_file.get(hash_, [])):
+                    checkpoint_file.seek(offset)
+                    for element in loads(checkpoint_file.readline())["elements"]:
+                        # O nome atual do arquivo prevalece caso o PDF tenha sido renomeado
+                        element["metadata"]["source"]["file_name"] = file_name
+                        yield element
+
+
+def checkpoint_page(checkpoint, file_hash, file_name, page_number, total_pages, translated_text, stages,
+                    mode=PAGE_MODE):
+    """Processa a página e grava o resultado no checkpoint se ela foi concluída."""
+    elements = process_page(file_hash, file_name, page_number, total_pages, translated_text, stages, mode)
+    if elements is not None:
+        checkpoint.add(file_hash, file_name, page_number, elements)
+
+
+def translate_page_batch(executor, checkpoint, file_hash, file_name, total_pages, pages, stages, mode=PAGE_MODE):
+    """
+    Traduz um lote de páginas de uma vez e envia cada página traduzida para as etapas seguintes.
+
+    Args:
+        pages (list): Pares (número da página, texto bruto).
+
+    Returns:
+        list: Futures das páginas enviadas (vazia se a tradução falhar; as páginas
+        ficam fora do checkpoint e são refeitas na próxima execução).
+    """
+    try:
+        # Páginas já traduzidas antes vêm do cache; só as novas vão ao tradutor
+        translated_texts = stages["translate"].run(get_translator().translate_many, [text for _, text in pages])
+    except Exception as e:
+        page_numbers = ", ".join(str(page_number) for page_number, _ in pages)
+        print(f"Erro ao traduzir as páginas {page_numbers} do arquivo {file_name}: {e}")
+        return []
+
+    return [
+        executor.submit(checkpoint_page, checkpoint, file_hash, file_name, page_number, total_pages,
+                        translated_text, stages, mode)
+        for (page_number, _), translated_text in zip(pages, translated_texts)
+    ]
+
+
+def build_stages(translate_in_flight=4, summarize_in_flight=4, format_in_flight=4,
+                 translate_per_minute=60, llm_per_minute=20):
+    """
+    Cria as etapas remotas do pipeline.
+
+    Cada etapa tem seu próprio limite de páginas em andamento; as chamadas à IA
+    (resumo, formatação e a chamada única do modo combinado) compartilham um limite
+    de requisições por minuto e a tradução tem outro.
+    """
+    llm_rate_limiter = RateLimiter(llm_per_minute)
+    return {
+        "translate": PipelineStage("tradução", translate_in_flight, RateLimiter(translate_per_minute)),
+        "summarize": PipelineStage("resumo", summarize_in_flight, llm_rate_limiter),
+        "format": PipelineStage("formatação JSON", format_in_flight, llm_rate_limiter),
+        "structured": PipelineStage("resumo + JSON", summarize_in_flight, llm_rate_limiter),
+    }
+
+
+def pool_size(stages):
+    return sum(stage.max_in_flight for stage in stages.values())
+
+
+def extract_text_from_pdfs(stages, restart=False, output_format=OUTPUT_FORMAT, mode=PAGE_MODE):
+    """
+    Processa os PDFs de input_files em um pipeline concorrente por página.
+
+    Cada página concluída vai para o checkpoint; uma nova execução pula as páginas
+    já concluídas e as que estão no arquivo de falhas (reprocessadas com --retry-failed).
+    O JSON consolidado é reconstruído a partir do checkpoint, na ordem por arquivo e página.
+    """
     # Diretórios de entrada e saída
     input_dir = "input_files"
     output_dir = "output_files"
@@ -238,104 +828,135 @@ def extract_text_from_pdfs():
     os.makedirs(output_dir, exist_ok=True)
 
     # Arquivo final para consolidar os resumos
-    consolidated_output = os.path.join(output_dir, "consolidated_summary.json")
-    consolidated_data = []
+    consolidated_output = record_path(os.path.join(output_dir, CONSOLIDATED_FILE), output_format)
+    checkpoint_path = os.path.join(output_dir, CHECKPOINT_FILE)
 
-    # Variável para contar as chamadas à IA
-    ia_requests_count = 0
+    # Recomeçar do zero descarta o checkpoint e as falhas anteriores
+    if restart:
+        for path in (checkpoint_path, os.path.join(output_dir, FAILED_PAGES_FILE)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    checkpoint = PageCheckpoint(checkpoint_path)
+    failed_pages = {(page["file_hash"], page["page_number"]) for page in read_failed_pages()}
+    if len(checkpoint) or failed_pages:
+        print(f"Retomando: {len(checkpoint)} páginas concluídas no checkpoint e "
+              f"{len(failed_pages)} no arquivo de falhas serão puladas.")
 
     # Início do cronômetro
     start_time = datetime.now()
 
-    # Itera pelos arquivos na pasta de entrada
-    for file_name in os.listdir(input_dir):
-        if file_name.lower().endswith(".pdf"):
-            input_path = os.path.join(input_dir, file_name)
+    input_files = list_input_files(input_dir)
+    skipped_pages = 0
+    batch_futures = []
 
-            # Extrai o texto do PDF
+    with ThreadPoolExecutor(max_workers=pool_size(stages)) as executor:
+        # Itera pelos arquivos na pasta de entrada
+        for file_name, input_path, hash_ in input_files:
+            # Extrai o texto do PDF e envia cada página ao pipeline assim que é lida
             with pdfplumber.open(input_path) as pdf:
                 total_pages = len(pdf.pages)
                 print(f"Processando arquivo: {file_name} ({total_pages} páginas)")
+                pending_pages = []
 
-                # Processamento por página
                 for page_number, page in enumerate(pdf.pages, start=1):
-                    try:
-                        # Data e hora do processamento por página
-                        page_processing_time = datetime.now().isoformat()
-
-                        # Extrai o texto bruto sem imagens do PDF
-                        text = page.extract_text() or ""
-                        if not text.strip():
-                            print(f"A página {page_number} do arquivo {file_name} está vazia. Ignorando.")
-                            continue
-
-                        # Traduz o texto bruto para o inglês
-                        translated_text = GoogleTranslator(source='auto', target='en').translate(text)
-
-                        # Verifica se o texto traduzido está vazio
-                        if not translated_text.strip():
-                            print(f"Texto traduzido vazio na página {page_number} do arquivo {file_name}. Ignorando.")
-                            continue
-
-                        # Envia o texto traduzido para ser limpo
-                        cleaned_text = clean_text(translated_text)
-                        if not cleaned_text.strip():
-                            print(f"Texto limpo na página {page_number} do arquivo {file_name} está vazio. Ignorando.")
-                            continue
-
-                        print(f"Processando página {page_number}/{total_pages} do arquivo {file_name}...")
-
-                        # Envia o texto limpo para a IA interpretar
-                        summarized_text = summarize(cleaned_text)
-                        ia_requests_count += 1  # Incrementa a contagem para summarize
-                        if not summarized_text.strip():
-                            print(f"Resumo gerado vazio na página {page_number} do arquivo {file_name}. Ignorando.")
-                            continue
-
-                        # Repetição começa na formatação para JSON
-                        page_processed = False
-                        while not page_processed:
-                            try:
-                                # Envia o texto interpretado para a IA formatar para JSON
-                                formatted_text = format_to_json(summarized_text)
-                                ia_requests_count += 1  # Incrementa a contagem para format_to_json
-
-                                # Remove caracteres especiais indesejados e mantém apenas os válidos para JSON
-                                formatted_text = re.sub(r'[^a-zA-Z0-9,\[\]{}:\-\"\s_.!]', '', formatted_text)
-
-                                # Usando expressão regular pra capturar tudo entre colchetes []
-                                match = re.search(r'\[(.*)]$', formatted_text, re.DOTALL)
-                                if not match:
-                                    print(f"JSON válido não encontrado na página {page_number} do arquivo {file_name}.")
-                                    print(f"Texto retornado pela IA: {formatted_text}")
-                                    raise ValueError("JSON inválido gerado pela IA.")
-
-                                json_text = match.group(1)  # Pega o conteúdo do JSON sem os colchetes
-
-                                # Converte o texto JSON em um dicionário Python
-                                json_dict = json.loads(f"[{json_text}]")  # Certifica que o texto seja interpretado como JSON válido
-
-                                # Adiciona os campos adicionais necessários
-                                for element in json_dict:
-                                    element["metadata"]["id"] = str(uuid.uuid4())  # Gera um ID único
-                                    element["metadata"]["source"]["file_name"] = file_name  # Adiciona o nome do arquivo
-                                    element["metadata"]["source"]["page_number"] = page_number  # Adiciona o número da página
-                                    element["metadata"]["created_at"] = page_processing_time  # Adiciona a data e hora por página
-
-                                consolidated_data.extend(json_dict)  # Adiciona cada objeto à lista consolidada
-                                page_processed = True  # Marca a página como processada com sucesso
-                            except Exception as e:
-                                print(f"Erro ao processar JSON na página {page_number} do arquivo {file_name}: {e}")
-                                print("Tentando novamente...")
-                                print(f"Processando página {page_number}/{total_pages} do arquivo {file_name}...")
-                                # A execução continuará repetindo até que seja bem-sucedida
-
-                    except Exception as e:
-                        print(f"Erro geral ao processar a página {page_number} do arquivo {file_name}: {e}")
+                    if (hash_, page_number) in checkpoint or (hash_, page_number) in failed_pages:
+                        skipped_pages += 1
+                        continue
+
+                    # Extrai o texto bruto sem imagens do PDF
+                    text = page.extract_text() or ""
+                    if not text.strip():
+                        print(f"A página {page_number} do arquivo {file_name} está vazia. Ignorando.")
+                        checkpoint.add(hash_, file_name, page_number, [])
+                        continue
+
+                    # As páginas são traduzidas em lotes, cada lote em uma chamada ao tradutor
+                    pending_pages.append((page_number, text))
+                    if len(pending_pages) == TRANSLATE_BATCH_PAGES:
+                        batch_futures.append(executor.submit(
+                            translate_page_batch, executor, checkpoint, hash_, file_name, total_pages,
+                            pending_pages, stages, mode
+                        ))
+                        pending_pages = []
+
+                if pending_pages:
+                    batch_futures.append(executor.submit(
+                        translate_page_batch, executor, checkpoint, hash_, file_name, total_pages,
+                        pending_pages, stages, mode
+                    ))
+
+        # Propaga erros inesperados dos lotes e das páginas
+        for batch_future in batch_futures:
+            for page_future in batch_future.result():
+                page_future.result()
+
+    if skipped_pages:
+        print(f"Páginas puladas por já terem sido processadas: {skipped_pages}")
 
     # Salva o JSON consolidado
-    with open(consolidated_output, "w", encoding="utf-8") as consolidated_file:
-        json.dump(consolidated_data, consolidated_file, indent=4, ensure_ascii=False)
+    write_consolidated(consolidated_output, checkpoint.consolidate(input_files))
+
+    print_report(start_time, stages, consolidated_output)
+
+
+def retry_failed_pages(stages, output_format=OUTPUT_FORMAT):
+    """
+    Reprocessa apenas as páginas do arquivo de falhas, a partir do resumo já gerado.
+
+    As páginas recuperadas vão para o checkpoint e o JSON consolidado é reconstruído;
+    as que falharem de novo voltam para o arquivo de falhas.
+    """
+    input_dir = "input_files"
+    output_dir = "output_files"
+    consolidated_output = record_path(os.path.join(output_dir, CONSOLIDATED_FILE), output_format)
+    failed_pages_path = os.path.join(output_dir, FAILED_PAGES_FILE)
+
+    failed_pages = read_failed_pages()
+    if not failed_pages:
+        print(f"Nenhuma página em {failed_pages_path}. Nada a reprocessar.")
+        return
+
+    os.remove(failed_pages_path)
+    print(f"Reprocessando {len(failed_pages)} páginas com falha...")
+
+    start_time = datetime.now()
+    checkpoint = PageCheckpoint(os.path.join(output_dir, CHECKPOINT_FILE))
+
+    with ThreadPoolExecutor(max_workers=pool_size(stages)) as executor:
+        page_futures = [
+            executor.submit(
+                structure_page if page.get("mode") == "combinado" else format_page,
+                page["file_hash"], page["file_name"], page["page_number"], page["total_pages"],
+                page["summarized_text"], page["created_at"], stages
+            )
+            for page in failed_pages
+        ]
+
+        recovered_pages = 0
+        for page, future in zip(failed_pages, page_futures):
+            elements = future.result()
+            if elements is not None:
+                checkpoint.add(page["file_hash"], page["file_name"], page["page_number"], elements)
+                recovered_pages += 1
+
+    write_consolidated(consolidated_output, checkpoint.consolidate(list_input_files(input_dir)))
+
+    print(f"Páginas recuperadas: {recovered_pages}/{len(failed_pages)}")
+    print_report(start_time, stages, consolidated_output)
+
+
+def write_consolidated(consolidated_output, consolidated_data):
+    # Grava objeto a objeto em um arquivo temporário e substitui, para não deixar o resumo consolidado pela metade
+    with RecordWriter(consolidated_output) as writer:
+        writer.write_all(consolidated_data)
+
+
+def print_report(start_time, stages, consolidated_output):
+    # Variável para contar as chamadas à IA
+    # A recusa do esquema custa uma requisição a mais, feita dentro da mesma chamada da etapa
+    ia_requests_count = (stages["summarize"].calls + stages["format"].calls + stages["structured"].calls
+                         + llm_usage.fallbacks)
 
     # Tempo total de execução
     end_time = datetime.now()
@@ -364,9 +985,62 @@ def extract_text_from_pdfs():
 
     # Exibe o número total de requisições feitas à IA e o tempo total de execução
     print(f"Número total de requisições feitas à IA: {ia_requests_count}")
+    if llm_usage.pages:
+        print(f"Páginas enviadas à IA: {llm_usage.pages} ({ia_requests_count / llm_usage.pages:.2f} requisições por página)")
+    print(f"Respostas JSON corrigidas localmente: {llm_usage.repaired} (chamadas à IA economizadas); "
+          f"repetidas por saída irrecuperável: {llm_usage.retries}")
+    if llm_usage.fallbacks:
+        print(f"Requisições repetidas com json_object após a recusa do esquema: {llm_usage.fallbacks}")
     print(f"Tempo total de execução: {formatted_time}")
+    for stage in stages.values():
+        print(f"Etapa {stage.name}: {stage.calls} chamadas, {stage.busy_seconds:.2f} segundos somados entre as páginas")
+    translation_stats = get_translator().stats()
+    print(f"Traduções: {translation_stats['skipped_target_language']} páginas já em inglês (sem tradução), "
+          f"{translation_stats['hits'] + translation_stats['disk_hits']} do cache, "
+          f"{translation_stats['misses']} traduzidas em {translation_stats['backend_requests']} chamadas ao tradutor")
     print(f"Resumo consolidado salvo em: {consolidated_output}")
 
+    failed_pages_path = os.path.join("output_files", FAILED_PAGES_FILE)
+    if os.path.exists(failed_pages_path):
+        with open(failed_pages_path, "r", encoding="utf-8") as failed_file:
+            failed_count = sum(1 for line in failed_file if line.strip())
+        print(f"Páginas com falha: {failed_count} (reprocesse com --retry-failed)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resume e estrutura os PDFs de input_files em JSON.")
+    parser.add_argument("--traducao-simultanea", type=int, default=4, help="Páginas em tradução ao mesmo tempo.")
+    parser.add_argument("--resumo-simultaneo", type=int, default=4,
+                        help="Páginas em resumo (ou resumo + JSON, no modo combinado) ao mesmo tempo.")
+    parser.add_argument("--json-simultaneo", type=int, default=4, help="Páginas em formatação JSON ao mesmo tempo.")
+    parser.add_argument("--traducoes-por-minuto", type=float, default=60,
+                        help="Limite de chamadas ao tradutor por minuto (0 desativa).")
+    parser.add_argument("--ia-por-minuto", type=float, default=20,
+                        help="Limite de chamadas à IA por minuto, somando resumo e formatação (0 desativa).")
+    parser.add_argument("--modo", choices=PAGE_MODES, default=PAGE_MODE,
+                        help="combinado: uma chamada à IA por página com saída JSON estruturada; "
+                             "separado: resumo e formatação em duas chamadas.")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help=f"Reprocessa apenas as páginas de output_files/{FAILED_PAGES_FILE}.")
+    parser.add_argument("--formato", choices=OUTPUT_FORMATS, default=OUTPUT_FORMAT,
+                        help=f"Formato de output_files/{CONSOLIDATED_FILE}: json (lista) ou jsonl (um objeto por linha).")
+    parser.add_argument("--reiniciar", action="store_true",
+                        help=f"Descarta output_files/{CHECKPOINT_FILE} e as falhas anteriores e processa tudo de novo.")
+    args = parser.parse_args(argv)
+
+    stages = build_stages(
+        translate_in_flight=args.traducao_simultanea,
+        summarize_in_flight=args.resumo_simultaneo,
+        format_in_flight=args.json_simultaneo,
+        translate_per_minute=args.traducoes_por_minuto,
+        llm_per_minute=args.ia_por_minuto,
+    )
+
+    if args.retry_failed:
+        retry_failed_pages(stages, args.formato)
+    else:
+        extract_text_from_pdfs(stages, restart=args.reiniciar, output_format=args.formato, mode=args.modo)
+
 
 if __name__ == "__main__":
-    extract_text_from_pdfs()
+    main()
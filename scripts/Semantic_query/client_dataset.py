@@ -1,20 +1,49 @@
+import json
+import os
+import sys
 import requests
-from deep_translator import GoogleTranslator
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from instrit.translator import get_translator
 
 API_URL = "http://127.0.0.1:8000/consulta"
+CHAT_STREAM_URL = "http://127.0.0.1:8000/chat-stream"
+
+# Mostra a resposta do assistente conforme os trechos chegam pelo stream SSE
+def conversar(pergunta):
+    with requests.post(CHAT_STREAM_URL, json={"pergunta": pergunta, "top_k": 3}, stream=True) as response:
+        response.raise_for_status()
+        print("\nAssistente: ", end="", flush=True)
+        evento = None
+        for linha in response.iter_lines(decode_unicode=True):
+            if linha.startswith("event:"):
+                evento = linha[len("event:"):].strip()
+            elif linha.startswith("data:"):
+                dados = json.loads(linha[len("data:"):])
+                if evento == "done":
+                    print(f"\n\nTempo até o primeiro token: {dados['ttft_ms']} ms | Tempo total: {dados['total_ms']} ms")
+                elif evento == "error":
+                    print(f"\nErro no servidor: {dados['detail']}")
+                else:
+                    print(dados["token"], end="", flush=True)
+                evento = None
 
 def main():
+    # Tradutor único, com cache das traduções por hash do texto
+    translator = get_translator()
+
     print("Bem-vindo ao cliente de consulta ao dataset!")
     while True:
         print("\nMenu:")
         print("1. Fazer uma nova consulta")
         print("2. Sair")
+        print("3. Perguntar ao assistente (resposta em streaming)")
         escolha = input("Escolha uma opção: ")
 
         if escolha == "1":
             pergunta = input("\nDigite sua pergunta: ")
 
-            pergunta = GoogleTranslator(source='auto', target='en').translate(pergunta)
+            pergunta = translator.translate(pergunta)
 
             # Cria o payload
             payload = {"pergunta": pergunta}
@@ -35,6 +64,15 @@ def main():
             except requests.exceptions.RequestException as e:
                 print(f"Erro ao se conectar ao servidor: {e}")
 
+        elif escolha == "3":
+            pergunta = input("\nDigite sua pergunta: ")
+            pergunta = translator.translate(pergunta)
+
+            try:
+                conversar(pergunta)
+            except requests.exceptions.RequestException as e:
+                print(f"Erro ao se conectar ao servidor: {e}")
+
         elif escolha == "2":
             print("Saindo...")
             break
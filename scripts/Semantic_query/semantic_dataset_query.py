@@ -1,111 +1,161 @@
+import json
 import os
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-import requests
+import sys
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Optional
 from datasets import load_dataset
-import json
-
-app = FastAPI()
 
-# Caminho do arquivo de embeddings
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from instrit.context_builder import ContextBuilder
+from instrit.embedding_cache import EmbeddingCache
+from instrit.embedding_client import AsyncEmbeddingClient, EmbeddingClient
+from instrit.jsonl import iter_records
+from instrit.llm_client import AsyncChatClient, StreamStats
+from instrit.payload_filter import SearchFilter, filter_date
+from instrit.prompts import RAG_INSTRUCTIONS, load_system_prompt
+from instrit.retriever import Retriever
+from instrit.vector_file import VectorFile, convert_json, save_vector_file
+from instrit.ann_index import VECTOR_INDEX
+
+# Carrega variáveis de ambiente do arquivo .env
+load_dotenv()
+
+# Parâmetros do modelo usado em /chat-stream
+MODEL = os.getenv("MODEL", "meta-llama/llama-3.2-3b-instruct:free")
+MAX_TOKENS = int(os.getenv("MAX_TOKENS", 600))
+TEMPERATURE = float(os.getenv("TEMPERATURE", 0.3))
+
+# Cliente assíncrono compartilhado para a API local do Nomic, aberto e fechado junto com a aplicação,
+# com cache LRU de embeddings de consultas (tamanho, TTL e arquivo opcional configurados no .env),
+# e um pool de conexões compartilhado com a API de chat do OpenRouter
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.embedding_cache = EmbeddingCache()
+    app.state.embedding_client = AsyncEmbeddingClient(cache=app.state.embedding_cache)
+    app.state.chat_client = AsyncChatClient()
+    app.state.system_prompt = load_system_prompt()
+    yield
+    await app.state.embedding_client.aclose()
+    await app.state.chat_client.aclose()
+    app.state.embedding_cache.close()
+
+app = FastAPI(lifespan=lifespan)
+
+# Caminhos dos arquivos de embeddings: JSON antigo e formato binário mapeado em memória
 embedding_file_path = "documents_embeddings.json"
-
-# Função para obter embeddings do Nomic local
-def get_embedding(context: str, model: str = "nomic-embed-text"):
-    response = requests.post(
-        "http://localhost:11434/api/embeddings",
-        json={"model": model, "prompt": context}
-    )
-    if response.status_code == 200:
-        return response.json().get("embedding")
-    raise Exception(f"[ERROR] Failed to get embedding: {response.text}")
+vector_file_path = "documents_embeddings"
+
+# Resumo consolidado local (consolidated_summary.jsonl ou .json do semantic_chunk) usado no lugar
+# do dataset do Hugging Face; vazio mantém o dataset remoto
+dataset_file_path = os.getenv("DATASET_FILE", "")
+
+# Converte um registro do dataset (metadata/content/context) no documento indexado
+def converter_registro(record):
+    return {
+        "id": record["metadata"]["id"],
+        "title": record["metadata"]["title"],
+        "tags": record["metadata"]["tags"],
+        "created_at": record["metadata"]["created_at"],
+        "source": record["metadata"].get("source") or {},
+        "content": record["content"]["text"],
+        "summary": record["content"]["summary"],
+        "context": {
+            "preceding_text": record["context"]["preceding_text"],
+            "following_text": record["context"]["following_text"]
+        }
+    }
+
+# Registros do dataset; o arquivo JSONL é lido linha a linha a cada chamada, sem ficar inteiro em memória
+def iterar_registros():
+    if dataset_file_path:
+        return iter_records(dataset_file_path)
+    return iter(load_dataset("waitmandot/test", split="train"))
 
 # Função para carregar ou gerar embeddings
 def carregar_ou_gerar_embeddings():
-    if os.path.exists(embedding_file_path):
-        print(f"Arquivo '{embedding_file_path}' encontrado. Carregando documentos e embeddings existentes...")
-        with open(embedding_file_path, "r") as f:
-            data = json.load(f)
-            return data["documents"], data["embeddings"]
+    if VectorFile.exists(vector_file_path):
+        print(f"Diretório '{vector_file_path}' encontrado. Abrindo embeddings mapeados em memória...")
+        return VectorFile(vector_file_path)
+    elif os.path.exists(embedding_file_path):
+        print(f"Arquivo '{embedding_file_path}' encontrado. Convertendo para o formato binário...")
+        convert_json(embedding_file_path, vector_file_path)
+        return VectorFile(vector_file_path)
     else:
         print("Arquivo de embeddings não encontrado. Gerando novos embeddings...")
 
-        # Carregar dataset e pré-processar
-        print("Carregando e processando dataset...")
-        dataset = load_dataset("waitmandot/test", split="train")
-
-        # Processar e converter a nova estrutura do dataset
-        documents = []
-        for idx, record in enumerate(dataset):
-            document = {
-                "id": record["metadata"]["id"],
-                "title": record["metadata"]["title"],
-                "tags": record["metadata"]["tags"],
-                "created_at": record["metadata"]["created_at"],
-                "content": record["content"]["text"],
-                "summary": record["content"]["summary"],
-                "context": {
-                    "preceding_text": record["context"]["preceding_text"],
-                    "following_text": record["context"]["following_text"]
-                }
-            }
-            documents.append(document)
-
-        print(f"{len(documents)} documentos carregados e processados.")
+        # Carregar dataset: os documentos são percorridos duas vezes (textos para o embedding e
+        # payloads para o arquivo binário) em vez de ficarem todos em uma lista
+        print(f"Carregando e processando dataset {dataset_file_path or 'waitmandot/test'}...")
 
-        # Gerar embeddings para cada documento
+        # Gerar embeddings para todos os documentos em lotes concorrentes
         print("Gerando embeddings para os documentos...")
-        document_embeddings = []
-        for doc in documents:
-            embedding = get_embedding(doc["content"])
-            document_embeddings.append({
-                "id": doc["id"],
-                "embedding": embedding,
-                "payload": doc
-            })
-
-        # Salvar documentos e embeddings em arquivo
-        with open(embedding_file_path, "w") as f:
-            json.dump({"documents": documents, "embeddings": document_embeddings}, f)
-        print(f"Documentos e embeddings salvos em '{embedding_file_path}'.")
-
-        return documents, document_embeddings
-
-# Carregar ou gerar os embeddings
-documents, document_embeddings = carregar_ou_gerar_embeddings()
-
-# API para consulta
+        embedding_client = EmbeddingClient()
+        embeddings = embedding_client.embed_many([record["content"]["text"] for record in iterar_registros()])
+        print(f"{len(embeddings)} documentos carregados e processados.")
+
+        # Salvar embeddings (float32) e documentos (um por linha) no formato binário
+        documentos = (converter_registro(record) for record in iterar_registros())
+        save_vector_file(vector_file_path, embeddings, documentos, model=embedding_client.model)
+        embedding_client.close()
+        print(f"Documentos e embeddings salvos em '{vector_file_path}'.")
+
+        return VectorFile(vector_file_path)
+
+# Carregar ou gerar os embeddings; as linhas da matriz já estão normalizadas e ficam mapeadas em memória
+vector_file = carregar_ou_gerar_embeddings()
+document_matrix = vector_file.vectors
+print(f"Matriz de embeddings pronta: {document_matrix.shape[0]} documentos x {document_matrix.shape[1]} dimensões.")
+
+# Índice vetorial escolhido por VECTOR_INDEX, índice BM25 e índices de tags/arquivo/data, salvos junto dos embeddings
+retriever = Retriever.open(vector_file, VECTOR_INDEX)
+print(f"Índice de busca: {VECTOR_INDEX}, modo {retriever.mode}.")
+
+# API para consulta; tags, arquivo e datas (ISO, inclusivas) restringem os documentos antes da busca
 class Consulta(BaseModel):
     pergunta: str
+    top_k: int = Field(default=5, ge=1, le=100)
+    tags: List[str] = []
+    arquivo: Optional[str] = None
+    desde: Optional[str] = None
+    ate: Optional[str] = None
+
+    # Datas inválidas viram 422 aqui, em vez de falhar (ou filtrar errado) na busca
+    @field_validator("desde", "ate")
+    @classmethod
+    def validar_data(cls, valor: Optional[str], info):
+        if valor:
+            filter_date(valor, info.field_name)
+        return valor
 
 class Resposta(BaseModel):
     resultados: List[dict]
 
+# Consultas só com códigos ("ISO VG 68", "WEG") são respondidas pelo índice BM25, sem gerar embedding;
+# as demais fundem a busca vetorial e a BM25. Sem similaridade (None) nas respostas exatas.
+async def recuperar(dados: Consulta, request: Request):
+    filtro = SearchFilter(dados.tags, dados.arquivo, dados.desde, dados.ate)
+    linhas = retriever.exact(dados.pergunta, dados.top_k, filtro)
+    if linhas is not None:
+        return linhas, [None] * len(linhas)
+    pergunta_embedding = await request.app.state.embedding_client.embed(dados.pergunta)
+    return retriever.search(dados.pergunta, pergunta_embedding, dados.top_k, filtro)
+
 @app.post("/consulta", response_model=Resposta)
-async def consultar(dados: Consulta):
+async def consultar(dados: Consulta, request: Request):
     try:
-        # Converter embeddings carregados em array NumPy
-        embeddings = np.array([doc["embedding"] for doc in document_embeddings])
-
-        # Obter embedding da pergunta
-        pergunta_embedding = np.array(get_embedding(dados.pergunta))
-
-        # Calcular similaridades (usando similaridade cosseno)
-        similarities = cosine_similarity([pergunta_embedding], embeddings)[0]
-
-        # Obter os 5 documentos mais similares
-        top_indices = similarities.argsort()[-5:][::-1]
+        top_indices, similarities = await recuperar(dados, request)
 
         # Combinar documentos e notas de similaridade
         resultados = [
             {
-                "similarity_score": round(float(similarities[i]), 2),
-                "document": documents[i]
+                "similarity_score": None if score is None else round(float(score), 2),
+                "document": vector_file.payload(i)
             }
-            for i in top_indices
+            for i, score in zip(top_indices, similarities)
         ]
 
         return {"resultados": resultados}
@@ -113,6 +163,44 @@ async def consultar(dados: Consulta):
         print(f"[ERROR] {e}")
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
+# Evento SSE no formato "event: <nome>" / "data: <json>"
+def evento_sse(dados: dict, evento: str = None) -> str:
+    linhas = f"event: {evento}\n" if evento else ""
+    return linhas + f"data: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+@app.post("/chat-stream")
+async def chat_stream(dados: Consulta, request: Request):
+    # Recupera os documentos antes de abrir o stream, para que erros virem um status HTTP normal
+    try:
+        top_indices, _ = await recuperar(dados, request)
+        documentos = [vector_file.payload(i)["content"] for i in top_indices]
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
+
+    mensagens = ContextBuilder(request.app.state.system_prompt).build(dados.pergunta, RAG_INSTRUCTIONS, documentos)
+    payload = {"model": MODEL, "messages": mensagens, "max_tokens": MAX_TOKENS, "temperature": TEMPERATURE}
+
+    # Repassa cada trecho da resposta assim que chega; o tempo até o primeiro token
+    # e a latência total vão no evento final "done"
+    async def gerar():
+        stats = StreamStats()
+        try:
+            async for trecho in request.app.state.chat_client.stream(payload, stats):
+                yield evento_sse({"token": trecho})
+        except Exception as e:
+            print(f"[ERROR] {e}")
+            yield evento_sse({"detail": str(e)}, "error")
+            return
+        stats.log()
+        yield evento_sse(stats.as_dict(), "done")
+
+    return StreamingResponse(gerar(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/cache-stats")
+async def cache_stats(request: Request):
+    return request.app.state.embedding_cache.stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
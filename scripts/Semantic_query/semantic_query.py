@@ -1,20 +1,27 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import os
+import sys
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel
 from typing import List
-import requests
+import numpy as np
 
-app = FastAPI()
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from instrit.embedding_cache import EmbeddingCache
+from instrit.embedding_client import AsyncEmbeddingClient
 
-# Função para obter embeddings do Nomic local
-def get_embedding(context: str, model: str = "nomic-embed-text"):
-    """Obtém embeddings usando a API local do Nomic."""
-    response = requests.post(
-        "http://localhost:11434/api/embeddings",
-        json={"model": model, "prompt": context}
-    )
-    if response.status_code == 200:
-        return response.json().get("embedding")
-    raise Exception(f"[ERROR] Failed to get embedding: {response.text}")
+# Cliente assíncrono compartilhado para a API local do Nomic, aberto e fechado junto com a aplicação,
+# com cache LRU de embeddings de consultas (tamanho, TTL e arquivo opcional configurados no .env)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.embedding_cache = EmbeddingCache()
+    app.state.embedding_client = AsyncEmbeddingClient(cache=app.state.embedding_cache)
+    yield
+    await app.state.embedding_client.aclose()
+    app.state.embedding_cache.close()
+
+app = FastAPI(lifespan=lifespan)
 
 class Consulta(BaseModel):
     consultas: List[str]
@@ -24,14 +31,17 @@ class Resposta(BaseModel):
     pontuacoes: List[List[float]]
 
 @app.post("/calcular-similaridades", response_model=Resposta)
-async def calcular_similaridades(dados: Consulta):
+async def calcular_similaridades(dados: Consulta, request: Request):
     try:
-        # Obter embeddings para consultas e passagens
-        embeddings_consultas = [get_embedding(c) for c in dados.consultas]
-        embeddings_passagens = [get_embedding(p) for p in dados.passagens]
+        # Obter embeddings para consultas e passagens concorrentemente, sem bloquear o event loop
+        embedding_client = request.app.state.embedding_client
+        embeddings_consultas, embeddings_passagens = await asyncio.gather(
+            embedding_client.embed_many(dados.consultas, report=False, use_cache=True),
+            # Passagens são textos longos e raramente repetidos: só as consultas passam pelo cache
+            embedding_client.embed_many(dados.passagens, report=False, use_cache=False),
+        )
 
         # Normalizar os embeddings (usando numpy para simplificação)
-        import numpy as np
         embeddings_consultas = np.array(embeddings_consultas)
         embeddings_passagens = np.array(embeddings_passagens)
 
@@ -45,6 +55,10 @@ async def calcular_similaridades(dados: Consulta):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/cache-stats")
+async def cache_stats(request: Request):
+    return request.app.state.embedding_cache.stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
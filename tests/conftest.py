@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Same import path the scripts use: the repository root, so "instrit" resolves without installing it
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
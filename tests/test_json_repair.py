@@ -0,0 +1,54 @@
+import pytest
+
+from instrit.json_repair import TruncatedJSONError, loads_tolerant
+
+RECORDS = [{"title": "Bearing", "tags": ["grease"]}, {"title": "Pump", "tags": []}]
+
+
+def test_valid_json_is_not_marked_repaired():
+    assert loads_tolerant('[{"title": "Bearing", "tags": ["grease"]}, {"title": "Pump", "tags": []}]') == (RECORDS, False)
+
+
+@pytest.mark.parametrize("text", [
+    # Trailing and doubled commas
+    '[{"title": "Bearing", "tags": ["grease",],}, {"title": "Pump", "tags": []},]',
+    '[{"title": "Bearing",, "tags": ["grease"]},, {"title": "Pump", "tags": []}]',
+    # Code fence and prose around the JSON
+    'Here is the JSON:\n```json\n[{"title": "Bearing", "tags": ["grease"]}, {"title": "Pump", "tags": []}]\n```\nDone.',
+    # Comments copied from the prompt template
+    '[{"title": "Bearing", // section title\n "tags": ["grease"]}, /* empty */ {"title": "Pump", "tags": []}]',
+    # A bracket in the prose before the JSON
+    'See [1] for details: [{"title": "Bearing", "tags": ["grease"]}, {"title": "Pump", "tags": [],}]',
+])
+def test_near_miss_json_is_repaired(text):
+    assert loads_tolerant(text) == (RECORDS, True)
+
+
+def test_line_breaks_inside_strings_are_escaped():
+    assert loads_tolerant('{"text": "line one\nline two",}') == ({"text": "line one\nline two"}, True)
+
+
+def test_commas_and_comment_markers_inside_strings_are_kept():
+    text = '{"text": "1,5 kW, // not a comment",}'
+
+    assert loads_tolerant(text) == ({"text": "1,5 kW, // not a comment"}, True)
+
+
+def test_bare_value_is_returned_when_nothing_else_parses():
+    assert loads_tolerant("Scores: [1, 2,]") == ([1, 2], True)
+
+
+@pytest.mark.parametrize("text", [
+    '[{"title": "Bearing", "tags": ["grease"]}, {"title": "Pu',
+    '[{"title": "Bearing", "tags": ["grease"]}, {"title": "Pump", "tags": [',
+    'See [1] for details: [{"title": "Bearing", "tags": ["grease"]},',
+])
+def test_truncated_output_is_not_patched_up(text):
+    with pytest.raises(TruncatedJSONError):
+        loads_tolerant(text)
+
+
+@pytest.mark.parametrize("text", ["I'm sorry, I can't format this page.", '{"title": Bearing}'])
+def test_unrecoverable_output_raises(text):
+    with pytest.raises(ValueError):
+        loads_tolerant(text)
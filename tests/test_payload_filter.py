@@ -0,0 +1,58 @@
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, PointStruct, VectorParams
+
+from instrit.payload_filter import PayloadIndex, SearchFilter, parse_filter
+
+PAYLOADS = [
+    {"tags": ["bearing"], "source": {"file_name": "manual.pdf"}, "created_at": "2025-01-10T08:00:00"},
+    {"tags": ["bearing", "grease"], "source": {"file_name": "manual.pdf"}, "created_at": "2025-01-11T12:51:00"},
+    {"tags": ["pump"], "source": {"file_name": "pump.pdf"}, "created_at": "2025-01-12T00:00:00"},
+    {"tags": ["pump"], "source": {"file_name": "pump.pdf"}},
+]
+
+
+@pytest.fixture(scope="module")
+def client():
+    client = QdrantClient(":memory:")
+    client.create_collection("documents", vectors_config=VectorParams(size=2, distance=Distance.COSINE))
+    client.upsert("documents", [PointStruct(id=row, vector=[1.0, 0.0], payload=payload)
+                                for row, payload in enumerate(PAYLOADS)])
+    yield client
+    client.close()
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("tags=grease,pump", [1, 2, 3]),
+    ("source=manual.pdf", [0, 1]),
+    ("tags=pump source=manual.pdf", []),
+    ("from=2025-01-11", [1, 2]),
+    # A date without a time covers the whole day, month or year
+    ("to=2025-01-11", [0, 1]),
+    ("from=2025-01-11 to=2025-01-11", [1]),
+    ("to=2025-01", [0, 1, 2]),
+    ("to=2025-01-11T12:51", [0, 1]),
+    ("from=2025-01-11T12:51:00.5", [2]),
+])
+def test_numpy_and_qdrant_paths_agree(client, text, expected):
+    search_filter = parse_filter(text)
+    rows = PayloadIndex.build(PAYLOADS).rows(search_filter)
+    points, _ = client.scroll("documents", scroll_filter=search_filter.to_qdrant(), limit=10)
+
+    assert rows.tolist() == expected
+    assert sorted(point.id for point in points) == expected
+
+
+@pytest.mark.parametrize("text", ["to=garbage", "from=2025-13-01", "from=NaT", "colour=red"])
+def test_invalid_filters_are_rejected_when_parsed(text):
+    with pytest.raises(ValueError):
+        parse_filter(text)
+
+
+def test_empty_filter_matches_everything():
+    search_filter = parse_filter("")
+
+    assert search_filter.is_empty()
+    assert search_filter.to_qdrant() is None
+    assert PayloadIndex.build(PAYLOADS).rows(search_filter) is None
+    assert SearchFilter(tags=[""]).is_empty()
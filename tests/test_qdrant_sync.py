@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, PointStruct, VectorParams
+
+from instrit.qdrant_sync import HASH_FIELD, batched, point_hash, upload_points
+
+COLLECTION = "documents"
+DIMENSION = 8
+
+
+@pytest.fixture
+def client():
+    client = QdrantClient(":memory:")
+    client.create_collection(COLLECTION, vectors_config=VectorParams(size=DIMENSION, distance=Distance.COSINE))
+    yield client
+    client.close()
+
+
+def make_points(count: int, changed=()):
+    """Points 0..count-1; the rows in ``changed`` get a different payload than the first run."""
+    vectors = np.random.default_rng(0).standard_normal((count, DIMENSION)).astype(np.float32)
+    for row in range(count):
+        content = f"document {row}" + (" (revised)" if row in changed else "")
+        yield PointStruct(id=row, vector=vectors[row].tolist(), payload={"title": f"doc {row}", "content": content})
+
+
+def upload(client, points, **kwargs):
+    return upload_points(client, COLLECTION, points, batch_size=16, report=False, **kwargs)
+
+
+def test_first_upload_sends_every_point(client):
+    stats = upload(client, make_points(50))
+
+    assert (stats["points"], stats["uploaded"], stats["skipped"], stats["batches"]) == (50, 50, 0, 4)
+    assert client.count(COLLECTION).count == 50
+    # The hash covers the vector as sent; a cosine collection stores it normalized
+    first = next(make_points(1))
+    stored = client.retrieve(COLLECTION, ids=[0], with_payload=True)[0]
+    assert stored.payload[HASH_FIELD] == point_hash(first.vector, first.payload)
+
+
+def test_unchanged_points_are_skipped(client):
+    upload(client, make_points(50))
+    stats = upload(client, make_points(50))
+
+    assert (stats["uploaded"], stats["skipped"]) == (0, 50)
+
+
+def test_changed_and_new_points_are_uploaded(client):
+    upload(client, make_points(50))
+    stats = upload(client, make_points(60, changed={3, 41}))
+
+    assert (stats["uploaded"], stats["skipped"]) == (12, 48)
+    assert client.count(COLLECTION).count == 60
+    revised = client.retrieve(COLLECTION, ids=[41], with_payload=True)[0]
+    assert revised.payload["content"] == "document 41 (revised)"
+
+
+def test_skip_unchanged_can_be_disabled(client):
+    upload(client, make_points(20))
+    stats = upload(client, make_points(20), skip_unchanged=False)
+
+    assert (stats["uploaded"], stats["skipped"]) == (20, 0)
+
+
+def test_point_hash_ignores_the_hash_field():
+    vector, payload = [0.1, 0.2], {"content": "texto"}
+
+    assert point_hash(vector, payload) == point_hash(vector, {**payload, HASH_FIELD: "old"})
+    assert point_hash(vector, payload) != point_hash(vector, {"content": "outro texto"})
+    assert point_hash(vector, payload) != point_hash([0.1, 0.3], payload)
+
+
+def test_batched_keeps_the_remainder():
+    assert [len(batch) for batch in batched(range(10), 4)] == [4, 4, 2]
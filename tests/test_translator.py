@@ -0,0 +1,156 @@
+import threading
+import time
+
+from instrit.language_detector import LanguageDetector
+from instrit.translator import BATCH_SEPARATOR, GoogleBackend, OfflineBackend, Translator
+
+PORTUGUESE = {
+    "O rolamento deve ser lubrificado a cada duas mil horas.": "The bearing must be greased every two thousand hours.",
+    "Verifique o nível do óleo antes de ligar o motor.": "Check the oil level before starting the motor.",
+}
+
+
+class FakeGoogleTranslator:
+    """Mimics ``GoogleTranslator``: the text is kept on the instance between setting it and sending it."""
+
+    def __init__(self, source, target):
+        self.text = None
+
+    def translate(self, text):
+        self.text = text
+        time.sleep(0.001)
+        return self.text.upper()
+
+
+class SeparatorDroppingTranslator(FakeGoogleTranslator):
+    def translate(self, text):
+        return text.replace(BATCH_SEPARATOR.strip(), "").upper()
+
+
+def offline_translator(**kwargs) -> Translator:
+    return Translator(OfflineBackend(PORTUGUESE), cache_path=None, detect_language=False, **kwargs)
+
+
+def google_backend(translator_class=FakeGoogleTranslator, max_chars=100) -> GoogleBackend:
+    backend = GoogleBackend(max_chars=max_chars)
+    backend.translator_class = translator_class
+    return backend
+
+
+def test_memory_cache_hits():
+    translator = offline_translator()
+    text = next(iter(PORTUGUESE))
+
+    assert translator.translate(text) == PORTUGUESE[text]
+    assert translator.translate(text) == PORTUGUESE[text]
+
+    stats = translator.stats()
+    assert (stats["hits"], stats["misses"], stats["backend_requests"]) == (1, 1, 1)
+
+
+def test_repeated_texts_are_translated_once():
+    translator = offline_translator()
+    texts = list(PORTUGUESE) * 3
+
+    assert translator.translate_many(texts) == [PORTUGUESE[text] for text in texts]
+    assert translator.stats()["backend_requests"] == 1
+
+
+def test_sqlite_cache_survives_restart(tmp_path):
+    cache_path = str(tmp_path / "translations.sqlite")
+    texts = list(PORTUGUESE)
+    first = Translator(OfflineBackend(PORTUGUESE), cache_path=cache_path, detect_language=False)
+    first.translate_many(texts)
+    first.close()
+
+    # The new backend has no translations: every result must come from the disk cache
+    second = Translator(OfflineBackend(), cache_path=cache_path, detect_language=False)
+    assert second.translate_many(texts) == [PORTUGUESE[text] for text in texts]
+    stats = second.stats()
+    assert (stats["disk_hits"], stats["backend_requests"]) == (2, 0)
+    second.close()
+
+
+def test_lru_evicts_oldest_entry():
+    translator = offline_translator(max_size=1)
+    first, second = PORTUGUESE
+    translator.translate(first)
+    translator.translate(second)
+    translator.translate(first)
+
+    assert translator.stats()["misses"] == 3
+
+
+def test_text_in_target_language_is_skipped():
+    backend = OfflineBackend(PORTUGUESE)
+    translator = Translator(backend, cache_path=None, detector=LanguageDetector.from_file())
+    english = "The pump must be primed before the first start."
+    portuguese = next(iter(PORTUGUESE))
+
+    assert translator.translate_many([english, portuguese]) == [english, PORTUGUESE[portuguese]]
+    stats = translator.stats()
+    assert (stats["skipped_target_language"], stats["misses"]) == (1, 1)
+
+
+def test_batch_packs_texts_up_to_the_request_limit():
+    backend = google_backend()
+    texts = [" ".join([f"texto {index:02d}"] * 3) for index in range(10)]
+
+    assert backend.translate_batch(texts) == [text.upper() for text in texts]
+    # 26-character texts joined by the 5-character separator: three per 100-character request
+    assert backend.requests == 4
+
+
+def test_batch_splits_long_texts_and_joins_them_again():
+    backend = google_backend(max_chars=20)
+    text = "\n".join(f"linha {index}" for index in range(6))
+
+    assert backend.translate_batch([text, "curto"]) == [text.upper(), "CURTO"]
+
+
+def test_batch_falls_back_to_one_request_per_piece_without_separator():
+    backend = google_backend(SeparatorDroppingTranslator)
+    texts = ["um", "dois", "três"]
+
+    assert backend.translate_batch(texts) == ["UM", "DOIS", "TRÊS"]
+    assert backend.requests == 1 + len(texts)
+
+
+def test_google_backend_is_safe_across_threads():
+    backend = google_backend()
+    texts = [f"texto {index}" for index in range(200)]
+    results = {}
+
+    def worker(offset):
+        for text in texts[offset::8]:
+            results[text] = backend.translate(text)
+
+    threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {text: text.upper() for text in texts}
+    assert backend.requests == len(texts)
+
+
+def test_translator_is_safe_across_threads():
+    translator = offline_translator()
+    texts = list(PORTUGUESE)
+    errors = []
+
+    def worker():
+        for _ in range(200):
+            if translator.translate_many(texts) != [PORTUGUESE[text] for text in texts]:
+                errors.append("wrong translation")
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = translator.stats()
+    assert not errors
+    assert stats["hits"] + stats["misses"] == 8 * 200 * len(texts)
@@ -110,11 +110,11 @@ def search_query_in_qdrant(search_query, qdrant_client, top_k=3):
         print("[ERRO] Falha ao gerar embedding para a consulta.")
         return []
     print("[LOG] Buscando no Qdrant...")
-    search_result = qdrant_client.search(
+    search_result = qdrant_client.query_points(
         collection_name="chatbot",
-        query_vector=embedding,
+        query=embedding,
         limit=top_k,
-    )
+    ).points
     print("[LOG] Retornando resposta...")
     return [result.payload["content"] for result in search_result]
 
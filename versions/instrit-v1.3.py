@@ -122,11 +122,11 @@ class EnhancedChatbot:
         if not embedding:
             return []
 
-        results = self.qdrant_client.search(
+        results = self.qdrant_client.query_points(
             collection_name="chatbot",
-            query_vector=embedding,
+            query=embedding,
             limit=top_k,
-        )
+        ).points
         return [result.payload["content"] for result in results]
 
     def query_classification(self, query: str):
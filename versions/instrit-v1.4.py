@@ -3,14 +3,26 @@ import json
 import uuid
 from dotenv import load_dotenv
 import os
+import sys
+import time
 from datasets import load_dataset
 from langchain_community.document_loaders import DataFrameLoader
-from qdrant_client import QdrantClient
-from qdrant_client.models import VectorParams, Distance, PointStruct
-from langchain.memory import ConversationBufferWindowMemory
-from langchain.schema import HumanMessage, AIMessage
-from typing import List, Any
-from deep_translator import GoogleTranslator
+from qdrant_client.models import PointStruct
+from typing import Any, Iterator, List
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from instrit.context_builder import ContextBuilder
+from instrit.embedding_cache import EmbeddingCache
+from instrit.embedding_client import EmbeddingClient, EmbeddingError
+from instrit.embedding_store import EmbeddingStore
+from instrit.lexical_index import BM25Index, is_exact_query, reciprocal_rank_fusion
+from instrit.llm_client import ChatClient, LLMError, StreamStats
+from instrit.payload_filter import PayloadIndex, SearchFilter, parse_filter
+from instrit.prompts import CHAT_INSTRUCTIONS, RAG_INSTRUCTIONS
+from instrit.qdrant_collection import PersistentCollection, connect, dataset_revision
+from instrit.query_classifier import QueryClassifier, classify_with_llm
+from instrit.retriever import RETRIEVAL_MODE, RRF_CANDIDATES
+from instrit.translator import get_translator
 
 # Load environment variables
 load_dotenv()
@@ -34,9 +46,20 @@ REPETITION_PENALTY = float(os.getenv("REPETITION_PENALTY", 1.10))
 MIN_P = float(os.getenv("MIN_P", 0))
 TOP_A = float(os.getenv("TOP_A", 0))
 
-# Memory Configuration
-MEMORY_KEY = "chat_history"
-MAX_WINDOW_SIZE = 5  # Number of conversations to remember
+# Embedding Configuration
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
+EMBEDDING_STORE_PATH = os.getenv("EMBEDDING_STORE_PATH", "embeddings_store.json")
+
+# Query Classification Configuration
+CLASSIFIER_MODE = os.getenv("CLASSIFIER_MODE", "local")  # "local" (LLM fallback) or "llm"
+CLASSIFIER_PATH = os.getenv("CLASSIFIER_PATH", "query_classifier.npz")
+
+# Retrieval Configuration
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "lexical_index")  # BM25 index of the loaded documents
+
+# Prompt Configuration
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))  # Prompt tokens per request
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() == "true"  # Print the answer as it is generated
 
 
 class EnhancedChatbot:
@@ -45,30 +68,41 @@ class EnhancedChatbot:
         with open("../system_prompt.json", "r") as file:
             self.system_prompt = json.load(file)
 
-        # Initialize conversation memory
-        self.memory = ConversationBufferWindowMemory(
-            memory_key=MEMORY_KEY,
-            k=MAX_WINDOW_SIZE,
-            return_messages=True
-        )
+        # Initialize conversation memory (raw turns only, sent within a token budget)
+        self.context = ContextBuilder(self.system_prompt, CONTEXT_TOKEN_BUDGET)
 
-        # Initialize conversation history with system prompt
-        self.conversation_history = [self.system_prompt]
+        # Initialize chat completions client (keep-alive session)
+        self.chat_client = ChatClient(API_URL, OPENROUTER_KEY)
 
-        # Initialize Qdrant client
+        # Initialize Qdrant client (persistent collection, opened in run)
         self.qdrant_client = None
+        self.qdrant_collection = None
 
-    @staticmethod
-    def get_embedding(context: str, model: str = "nomic-embed-text") -> Any | None:
+        # Initialize persistent embedding store and embedding client with a query cache
+        self.embedding_store = EmbeddingStore(EMBEDDING_STORE_PATH, EMBEDDING_MODEL)
+        self.embedding_cache = EmbeddingCache()
+        self.embedding_client = EmbeddingClient(model=EMBEDDING_MODEL, cache=self.embedding_cache)
+
+        # Initialize shared translator (cached by content hash)
+        self.translator = get_translator()
+
+        # Initialize query classifier (loaded in run)
+        self.query_classifier = None
+
+        # Initialize loaded documents with their BM25 and payload indexes (built in run)
+        self.documents = []
+        self.document_rows = {}
+        self.lexical_index = None
+        self.payload_index = None
+        self.search_filter = SearchFilter()
+
+    def get_embedding(self, context: str) -> Any | None:
         """Get embeddings using the Nomic API."""
-        response = requests.post(
-            "http://localhost:11434/api/embeddings",
-            json={"model": model, "prompt": context}
-        )
-        if response.status_code == 200:
-            return response.json().get("embedding")
-        print(f"[ERROR] Failed to get embedding: {response.text}")
-        return None
+        try:
+            return self.embedding_client.embed(context)
+        except EmbeddingError as e:
+            print(f"[ERROR] {e}")
+            return None
 
     @staticmethod
     def load_and_prepare_data():
@@ -87,6 +121,7 @@ class EnhancedChatbot:
                 "title": record["metadata"]["title"],
                 "tags": record["metadata"]["tags"],
                 "created_at": record["metadata"]["created_at"],
+                "source": record["metadata"].get("source") or {},
                 "content": record["content"]["text"],
                 "summary": record["content"]["summary"],
                 "context": {
@@ -99,143 +134,140 @@ class EnhancedChatbot:
         return documents
 
     def generate_embeddings(self, documents_list):
-        """Generate embeddings sequentially."""
+        """Generate embeddings, reusing stored vectors for unchanged documents."""
         print("[LOG] Starting embeddings generation...")
+        vectors = {}
+        pending_docs = []
+        new_embeddings = []
+        for doc in documents_list:
+            embedding = self.embedding_store.get(doc["id"], doc["content"])
+            if embedding:
+                vectors[doc["id"]] = embedding
+            else:
+                pending_docs.append(doc)
+
+        if pending_docs:
+            print(f"[LOG] Generating embeddings for {len(pending_docs)} new or changed documents...")
+            try:
+                new_embeddings = self.embedding_client.embed_many([doc["content"] for doc in pending_docs])
+            except EmbeddingError as e:
+                print(f"[ERROR] {e}")
+            for doc, embedding in zip(pending_docs, new_embeddings):
+                vectors[doc["id"]] = embedding
+                self.embedding_store.put(doc["id"], doc["content"], embedding)
+
         embeddings_list = []
         total_docs = len(documents_list)
         for idx, doc in enumerate(documents_list, 1):
-            embedding = self.get_embedding(doc["content"])
-            if embedding:
+            if doc["id"] in vectors:
                 embeddings_list.append({
                     "id": doc["id"],
-                    "vector": embedding,
+                    "vector": vectors[doc["id"]],
                     "payload": doc
                 })
             else:
                 print(f"[ERROR] Failed to generate embedding for document {idx}/{total_docs}.")
-            print(f"[LOG] Progress: {idx}/{total_docs} documents processed.")
-        return embeddings_list
 
-    def initialize_qdrant(self, embed_list):
-        """Initialize and configure Qdrant."""
-        print("[LOG] Configuring Qdrant...")
-        self.qdrant_client = QdrantClient(":memory:")
+        removed_count = self.embedding_store.prune(doc["id"] for doc in documents_list)
+        self.embedding_store.save()
+        print(f"[LOG] Embeddings ready: {total_docs - len(pending_docs)} loaded from store, "
+              f"{len(new_embeddings)} generated, "
+              f"{removed_count} stale entries removed.")
+        return embeddings_list
 
-        if not self.qdrant_client.collection_exists(collection_name="chatbot"):
-            self.qdrant_client.create_collection(
-                collection_name="chatbot",
-                vectors_config=VectorParams(size=len(embed_list[0]["vector"]), distance=Distance.COSINE)
-            )
+    def open_qdrant(self):
+        """Open the persistent Qdrant collection."""
+        print("[LOG] Opening Qdrant...")
+        self.qdrant_collection = PersistentCollection(connect())
+        self.qdrant_client = self.qdrant_collection.client
 
-        points = [
+    def initialize_qdrant(self, embed_list, revision):
+        """Upsert changed documents into Qdrant and stamp the collection with the dataset revision."""
+        print("[LOG] Configuring Qdrant...")
+        points = (
             PointStruct(
                 id=doc["id"],
                 vector=doc["vector"],
                 payload=doc["payload"]
             )
             for doc in embed_list
-        ]
-
-        self.qdrant_client.upsert(collection_name="chatbot", points=points)
-        print("[LOG] Documents successfully added to Qdrant.")
+        )
+        stats = self.qdrant_collection.sync(points, [doc["id"] for doc in embed_list],
+                                            len(embed_list[0]["vector"]), revision)
+        print(f"[LOG] Documents successfully added to Qdrant ({stats['uploaded']} upserted, "
+              f"{stats['skipped']} unchanged, {stats['deleted']} removed).")
+
+    def load_search_indexes(self, documents, revision):
+        """Build (or reopen) the BM25 and payload indexes of the loaded documents."""
+        self.documents = documents
+        self.document_rows = {doc["id"]: row for row, doc in enumerate(documents)}
+        self.lexical_index = BM25Index.open(LEXICAL_INDEX_PATH, lambda: documents, len(documents), revision)
+        self.payload_index = PayloadIndex.build(documents)
 
     def search_qdrant(self, query: str, top_k: int = 3) -> List[str]:
-        """Search for relevant documents in Qdrant."""
+        """Search for relevant documents in Qdrant, fused with BM25 and restricted by the active filter."""
+        hybrid = RETRIEVAL_MODE == "hybrid"
+        filter_rows = self.payload_index.rows(self.search_filter)
+        if filter_rows is not None and not len(filter_rows):
+            return []
+
+        # Queries made only of codes ("ISO VG 68", "WEG") skip the embedding when some document has them all
+        if hybrid and is_exact_query(query):
+            rows, _ = self.lexical_index.search_all_terms(query, top_k, filter_rows)
+            if len(rows):
+                print("[LOG] Exact match found, skipping the query embedding.")
+                return [self.documents[row]["content"] for row in rows]
+
         print("[LOG] Generating query embedding...")
         embedding = self.get_embedding(query)
         if not embedding:
             return []
 
-        results = self.qdrant_client.search(
-            collection_name="chatbot",
-            query_vector=embedding,
-            limit=top_k,
-        )
-        return [result.payload["content"] for result in results]
-
-    @staticmethod
-    def query_classification(query: str):
-        prompt = f"""
-        You are an advanced technical AI assistant specialized in industrial machinery, maintenance practices, and operational standards. Your primary task is to determine whether a question requires consulting technical documentation, manuals, or detailed records (referred to as RAG). Respond with "y" (yes) or "n" (no), strictly following the guidelines below.
-
-        ### Guidelines:
-
-        #### Respond "y" if:
-        1. The question requires any form of technical, detailed, or specific information, including but not limited to:
-           - Definitions of machinery components or their functions (e.g., "What are the parts of a lathe?").
-           - Maintenance practices or guidelines (e.g., "How to perform preventive maintenance on a milling machine?").
-           - Lubricants, fluids, or material specifications (e.g., "What oil should be used for a refrigerator?").
-           - Operational, assembly, or disassembly instructions.
-           - Any information about a specific machine model, brand, or type (e.g., "Parts of an industrial fan," "How to troubleshoot an XYZ Model 500?").
-           - Descriptions or classifications of machines or their functions.
-
-        #### Respond "n" if:
-        1. The question involves superficial or conversational inputs (e.g., "Hello," "Who are you?").
-        2. It reflects a continuation or exploration of a symptom or issue without requiring documentation (e.g., "It is making noise," "The machine stopped working.").
-        3. It is explicitly not technical or specific enough to require reference materials.
-
-        ### Examples:
-        - "What are the parts of a lathe?" → y
-        - "How to perform preventive maintenance on a milling machine?" → y
-        - "What oil should be used for a refrigerator?" → y
-        - "Parts of an industrial fan?" → y
-        - "Hello, who are you?" → n
-        - "It is making noise." → n
-        - "What are the main types of lubrication?" → y
-        - "What is a lathe?" → y
-        - "The machine stopped working." → n
-        - "What are the benefits of using hydraulic systems in heavy machinery?" → y
-
-        ### Rules for Output:
-        1. Respond **only** with "y" or "n".
-        2. Do not include any additional text, punctuation, or spaces.
-        3. Maintain a consistent response format for every query.
-
-        ### Decision Process:
-        1. **Keyword Identification**: Identify terms that indicate a need for technical details, machine parts, or operational information.
-        2. **Context Evaluation**: Assess whether the question involves a technical inquiry or a continuation of a previously described issue.
-        3. **Apply the Guidelines**: Classify the query based on the provided rules and respond accordingly.
-
-        Question: {query}
-        Answer:
-        """
-
-        payload = {
-            "model": MODEL,
-            "prompt": prompt.strip(),
-            "max_tokens": 2,
-            "temperature": 0.0,
-        }
-        headers = {
-            "Authorization": f"Bearer {OPENROUTER_KEY}",
-            "Content-Type": "application/json",
-        }
-
-        response = requests.post(API_URL, headers=headers, json=payload)
-        print("Debug: API response JSON:", response.json())
-        response.raise_for_status()
-        result = response.json().get("choices", [{}])[0].get("text", "").strip()
-
-        if result.lower() == "y":
-            return True
-        else:
-            return False
-
-    def format_chat_history(self) -> str:
-        """Format chat history for context."""
-        messages = self.memory.chat_memory.messages
-        formatted_history = ""
-        for msg in messages:
-            if isinstance(msg, HumanMessage):
-                formatted_history += f"Human: {msg.content}\n"
-            elif isinstance(msg, AIMessage):
-                formatted_history += f"Assistant: {msg.content}\n"
-        return formatted_history
-
-    def generate_response(self, query: str) -> str:
-        """Generate response using the model."""
+        # The filter is applied by Qdrant before scoring, through the payload indexes
+        results = self.qdrant_client.query_points(
+            collection_name=self.qdrant_collection.name,
+            query=embedding,
+            query_filter=self.search_filter.to_qdrant(),
+            limit=RRF_CANDIDATES if hybrid else top_k,
+        ).points
+        if not hybrid:
+            return [result.payload["content"] for result in results]
+
+        vector_rows = [self.document_rows[result.payload["id"]] for result in results
+                       if result.payload["id"] in self.document_rows]
+        lexical_rows, _ = self.lexical_index.search(query, RRF_CANDIDATES, filter_rows)
+        fused, _ = reciprocal_rank_fusion([vector_rows, lexical_rows], top_k)
+        return [self.documents[row]["content"] for row in fused]
+
+    def load_query_classifier(self):
+        """Load (or train) the local query classifier unless the LLM-only mode is configured."""
+        if CLASSIFIER_MODE != "local":
+            return None
+        try:
+            return QueryClassifier.load_or_train(CLASSIFIER_PATH, self.embedding_client)
+        except (EmbeddingError, OSError, ValueError) as e:
+            print(f"[ERROR] Failed to load local query classifier: {e}. Using the LLM classifier.")
+            return None
+
+    def query_classification(self, query: str) -> bool:
+        """Decide whether the query needs the knowledge base."""
+        if self.query_classifier:
+            # The query embedding is cached, so retrieval reuses it afterwards
+            embedding = self.get_embedding(query)
+            if embedding:
+                start_time = time.perf_counter()
+                needs_context = self.query_classifier.classify(embedding)
+                elapsed_ms = (time.perf_counter() - start_time) * 1000
+                if needs_context is not None:
+                    print(f"[LOG] Local classifier: {'y' if needs_context else 'n'} ({elapsed_ms:.3f} ms)")
+                    return needs_context
+                print("[LOG] Local classifier is not confident. Falling back to the LLM classifier...")
+
+        return classify_with_llm(query, OPENROUTER_KEY, MODEL, API_URL)
+
+    def build_messages(self, query: str) -> List[dict]:
+        """Classify the query, retrieve documents if needed and assemble the messages."""
         needs_context = self.query_classification(query)
-        chat_history = self.format_chat_history()
 
         if needs_context:
             print("[DATABASE] 🔍 Searching knowledge base for relevant information...")
@@ -246,54 +278,21 @@ class EnhancedChatbot:
             else:
                 print("[DATABASE] ❌ No relevant information found in knowledge base")
 
-            source_knowledge = "\n".join(results)
-
-            prompt = f"""
-            You are Instrit, an assistant specialized in industrial machinery. Use the documents below to answer the question. If the question is not related to the content of the documents, provide a generic response.
-
-            ### Chat History
-            {chat_history}
-
-            ### Context
-            {source_knowledge}
-
-            ### Current Question
-            {query}
-
-            ### Response Instructions
-            1. Provide a **clear, concise, and technically sound answer** in Portuguese (Brazil).  
-            2. Use natural, conversational language, avoiding overly formal or mechanical expressions. Aim for the tone of a knowledgeable technician helping a colleague.  
-            3. Keep the response brief and to the point, but include enough detail to be practically useful.  
-            4. If additional context or elaboration is needed, provide it only in response to follow-up questions.  
-            5. If the information is not in the provided documents, politely suggest checking a manual or consulting a specialist.  
-            6. Maintain a professional, approachable, and safety-focused tone throughout the response.  
-            """
+            # Retrieved documents go into the current turn only
+            messages = self.context.build(query, RAG_INSTRUCTIONS, results)
         else:
             print("[CHAT] 💬 Using conversation mode without database search")
-            prompt = f"""
-            You are Instrit, an assistant specialized in industrial machinery. Answer the question directly, based on your general knowledge.
-
-            ### Chat History
-            {chat_history}
-
-            ### Current Question
-            {query}
+            messages = self.context.build(query, CHAT_INSTRUCTIONS)
 
-            ### Response Instructions
-            1. Answer **clearly, concisely, objectively, and briefly** in Portuguese (Brazil). Avoid over-explaining unless explicitly requested.
-            2. Use simple, conversational language, focusing on practical and actionable information.
-            3. If the question requires elaboration, wait for follow-up questions before providing more details.
-            4. Maintain consistency with previous responses to avoid conflicting information.
-            5. Be polite, maintain a professional tone, and prioritize safety. Keep the tone friendly and approachable.
-            """
+        self.context.log_stats()
+        return messages
 
-        # Update conversation history
-        self.conversation_history.append({"role": "user", "content": prompt})
-
-        # Prepare API request
-        payload = {
+    @staticmethod
+    def build_payload(messages: List[dict]) -> dict:
+        """Prepare the API request."""
+        return {
             "model": MODEL,
-            "messages": self.conversation_history,
+            "messages": messages,
             "max_tokens": MAX_TOKENS,
             "temperature": TEMPERATURE,
             "top_p": TOP_P,
@@ -306,65 +305,117 @@ class EnhancedChatbot:
             "transforms": ["middle-out"]
         }
 
-        headers = {
-            "Authorization": f"Bearer {OPENROUTER_KEY}",
-            "Content-Type": "application/json"
-        }
-
-        response = requests.post(API_URL, headers=headers, json=payload)
+    def generate_response(self, query: str) -> str:
+        """Generate response using the model."""
+        payload = self.build_payload(self.build_messages(query))
+        stats = StreamStats()
 
-        if response.status_code == 200:
-            response_content = response.json()["choices"][0]["message"]["content"]
+        try:
+            response_content = self.chat_client.complete(payload, stats)
+        except (LLMError, requests.RequestException) as e:
+            error_msg = f"[API ERROR] {e}"
+            print(error_msg)
+            return error_msg
 
-            # Update memory
-            self.memory.save_context(
-                {"input": query},
-                {"output": response_content}
-            )
+        stats.log()
+
+        # Update memory
+        self.context.add_turn(query, response_content)
+        return response_content
+
+    def stream_response(self, query: str) -> Iterator[str]:
+        """Generate response using the model, yielding it piece by piece as it arrives."""
+        payload = self.build_payload(self.build_messages(query))
+        stats = StreamStats()
+        pieces = []
+
+        try:
+            for piece in self.chat_client.stream(payload, stats):
+                pieces.append(piece)
+                yield piece
+        except (LLMError, requests.RequestException) as e:
+            yield f"[API ERROR] {e}"
+            print()
+            return
 
-            # Update conversation history
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": response_content
-            })
+        # Finish the streamed line before logging
+        print()
+        stats.log()
 
-            return response_content
-        else:
-            error_msg = f"[API ERROR] {response.status_code} - {response.text}"
-            print(error_msg)
-            return error_msg
+        # Update memory with the complete answer
+        self.context.add_turn(query, "".join(pieces))
 
     def run(self):
         """Run the chatbot interaction loop."""
         print("[LOG] Starting pipeline...")
+        startup_start = time.perf_counter()
 
         # Load and prepare initial data
         loaded_documents = self.load_and_prepare_data()
-        generated_embeddings = self.generate_embeddings(loaded_documents)
+        revision = dataset_revision(loaded_documents, EMBEDDING_MODEL)
+        self.load_search_indexes(loaded_documents, revision)
 
-        if not generated_embeddings:
-            print("[ERROR] No embeddings generated. Exiting program.")
-            return
+        # Reopen the stored collection as is unless the dataset changed
+        self.open_qdrant()
+        if self.qdrant_collection.is_current(revision):
+            print(f"[LOG] Qdrant collection is up to date ({self.qdrant_collection.count()} documents).")
+        else:
+            generated_embeddings = self.generate_embeddings(loaded_documents)
+
+            if not generated_embeddings:
+                print("[ERROR] No embeddings generated. Exiting program.")
+                return
 
-        # Initialize Qdrant
-        self.initialize_qdrant(generated_embeddings)
+            # Only a complete collection is stamped with the revision
+            complete = len(generated_embeddings) == len(loaded_documents)
+            self.initialize_qdrant(generated_embeddings, revision if complete else None)
 
-        print("[LOG] Chatbot initialized and ready.")
+        # Load local query classifier
+        self.query_classifier = self.load_query_classifier()
+
+        print(f"[LOG] Chatbot initialized and ready in {time.perf_counter() - startup_start:.2f}s.")
 
         while True:
             user_input = input("Você: ")
 
             if user_input.lower() in ["sair", "fechar", "close", "exit"]:
+                translation_stats = self.translator.stats()
+                print(f"[LOG] Translations avoided (input already in English): "
+                      f"{translation_stats['skipped_target_language']}, "
+                      f"translator requests: {translation_stats['backend_requests']}")
+                self.qdrant_collection.close()
                 print("Conversa encerrada.")
                 break
+            elif user_input.lower().startswith("/filter"):
+                # "/filter tags=lubrication source=manual.pdf from=2025-01-01 to=2025-12-31"; "/filter" clears it
+                try:
+                    self.search_filter = parse_filter(user_input[len("/filter"):])
+                except ValueError as e:
+                    print(f"[ERROR] {e}")
+                    continue
+                matching = self.payload_index.rows(self.search_filter)
+                count = len(self.documents) if matching is None else len(matching)
+                print(f"[LOG] Search filter: {self.search_filter} ({count} documents).")
+                continue
             elif user_input.lower() == "/json":
-                print(json.dumps(self.conversation_history, indent=4))
+                print(json.dumps(self.context.last_messages, indent=4))
+                continue
+            elif user_input.lower() == "/cache":
+                print(json.dumps({
+                    "embeddings": self.embedding_cache.stats(),
+                    "translations": self.translator.stats(),
+                }, indent=4))
                 continue
 
-            user_input = GoogleTranslator(source='auto', target='en').translate(user_input)
+            user_input = self.translator.translate(user_input)
 
-            response = self.generate_response(user_input)
-            print("Assistente:", response)
+            if STREAM_RESPONSES:
+                print("Assistente: ", end="", flush=True)
+                for piece in self.stream_response(user_input):
+                    print(piece, end="", flush=True)
+            else:
+                response = self.generate_response(user_input)
+                print("Assistente:", response)
 
 
 if __name__ == "__main__":